@@ -0,0 +1,40 @@
+"""Add inventory version
+
+Revision ID: 2f1d0ac27716
+Revises: c4371907b46c
+Create Date: 2026-10-17 17:21:05.637118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2f1d0ac27716'
+down_revision = 'c4371907b46c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('inventory', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+    # Bumped in the database so every write path, ORM or set-based, counts
+    op.execute("""
+        CREATE FUNCTION inventory_bump_version() RETURNS trigger AS $$
+        BEGIN
+            NEW.version := OLD.version + 1;
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER inventory_bump_version
+        BEFORE UPDATE ON inventory
+        FOR EACH ROW EXECUTE FUNCTION inventory_bump_version()
+    """)
+
+
+def downgrade():
+    op.execute("DROP TRIGGER inventory_bump_version ON inventory")
+    op.execute("DROP FUNCTION inventory_bump_version()")
+    op.drop_column('inventory', 'version')
@@ -0,0 +1,66 @@
+"""Add sales history and purchase orders
+
+Revision ID: 3b2fa78b4d14
+Revises: 4c7306530ba7
+Create Date: 2026-10-17 09:12:41.118203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b2fa78b4d14'
+down_revision = '4c7306530ba7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('sales_history',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=True),
+    sa.Column('store_id', sa.Integer(), nullable=True),
+    sa.Column('quantity_sold', sa.Integer(), nullable=False),
+    sa.Column('sale_date', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ),
+    sa.ForeignKeyConstraint(['store_id'], ['stores.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_sales_history_id'), 'sales_history', ['id'], unique=False)
+    op.create_table('purchase_orders',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('store_id', sa.Integer(), nullable=True),
+    sa.Column('status', sa.Enum('DRAFT', 'SUBMITTED', 'APPROVED', 'RECEIVED', 'CANCELLED', name='orderstatus'), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('submitted_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('approved_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('received_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['store_id'], ['stores.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_purchase_orders_id'), 'purchase_orders', ['id'], unique=False)
+    op.create_table('purchase_order_items',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('purchase_order_id', sa.Integer(), nullable=True),
+    sa.Column('product_id', sa.Integer(), nullable=True),
+    sa.Column('quantity', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ),
+    sa.ForeignKeyConstraint(['purchase_order_id'], ['purchase_orders.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_purchase_order_items_id'), 'purchase_order_items', ['id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_purchase_order_items_id'), table_name='purchase_order_items')
+    op.drop_table('purchase_order_items')
+    op.drop_index(op.f('ix_purchase_orders_id'), table_name='purchase_orders')
+    op.drop_table('purchase_orders')
+    op.drop_index(op.f('ix_sales_history_id'), table_name='sales_history')
+    op.drop_table('sales_history')
+    sa.Enum(name='orderstatus').drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,36 @@
+"""Add access path indexes
+
+Revision ID: 57222b1b9b68
+Revises: 63ad42e27033
+Create Date: 2026-10-17 13:41:52.806411
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '57222b1b9b68'
+down_revision = '63ad42e27033'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_inventory_store_id', 'inventory', ['store_id'], unique=False)
+    op.create_index('ix_inventory_low_stock', 'inventory', ['store_id', 'product_id'], unique=False, postgresql_where=sa.text('quantity <= reorder_point'))
+    op.create_index('ix_inventory_snapshots_store_date', 'inventory_snapshots', ['store_id', 'snapshot_date'], unique=False)
+    op.create_index('ix_sales_history_product_store_date', 'sales_history', ['product_id', 'store_id', 'sale_date'], unique=False, postgresql_include=['quantity_sold'])
+    op.create_index('ix_sales_history_sale_date', 'sales_history', ['sale_date'], unique=False, postgresql_using='brin')
+    op.create_index('ix_purchase_orders_store_status', 'purchase_orders', ['store_id', 'status'], unique=False)
+    op.create_index(op.f('ix_purchase_order_items_purchase_order_id'), 'purchase_order_items', ['purchase_order_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_purchase_order_items_purchase_order_id'), table_name='purchase_order_items')
+    op.drop_index('ix_purchase_orders_store_status', table_name='purchase_orders')
+    op.drop_index('ix_sales_history_sale_date', table_name='sales_history')
+    op.drop_index('ix_sales_history_product_store_date', table_name='sales_history')
+    op.drop_index('ix_inventory_snapshots_store_date', table_name='inventory_snapshots')
+    op.drop_index('ix_inventory_low_stock', table_name='inventory')
+    op.drop_index('ix_inventory_store_id', table_name='inventory')
@@ -0,0 +1,56 @@
+"""Add demand forecasts
+
+Revision ID: 583d464b3f77
+Revises: a539315923c3
+Create Date: 2026-10-17 15:08:44.392871
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '583d464b3f77'
+down_revision = 'a539315923c3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('forecast_runs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.Enum('RUNNING', 'COMPLETED', 'FAILED', name='forecastrunstatus'), nullable=False),
+    sa.Column('window_days', sa.Integer(), nullable=False),
+    sa.Column('holdout_days', sa.Integer(), nullable=False),
+    sa.Column('window_end', sa.Date(), nullable=False),
+    sa.Column('checkpoint_product_id', sa.Integer(), nullable=True),
+    sa.Column('checkpoint_store_id', sa.Integer(), nullable=True),
+    sa.Column('series_count', sa.BigInteger(), nullable=False),
+    sa.Column('started_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('demand_forecasts',
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('store_id', sa.Integer(), nullable=False),
+    sa.Column('model', sa.String(), nullable=False),
+    sa.Column('daily_demand', sa.Float(), nullable=False),
+    sa.Column('demand_std', sa.Float(), nullable=False),
+    sa.Column('mae', sa.Float(), nullable=True),
+    sa.Column('rmse', sa.Float(), nullable=True),
+    sa.Column('bias', sa.Float(), nullable=True),
+    sa.Column('demand_days', sa.Integer(), nullable=False),
+    sa.Column('window_end', sa.Date(), nullable=False),
+    sa.Column('run_id', sa.Integer(), nullable=True),
+    sa.Column('fitted_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['run_id'], ['forecast_runs.id'], ondelete='SET NULL'),
+    sa.ForeignKeyConstraint(['store_id'], ['stores.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('product_id', 'store_id')
+    )
+
+
+def downgrade():
+    op.drop_table('demand_forecasts')
+    op.drop_table('forecast_runs')
+    sa.Enum(name='forecastrunstatus').drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,28 @@
+"""Add sales natural key
+
+Revision ID: 63ad42e27033
+Revises: 82258060a99d
+Create Date: 2026-10-17 13:02:18.540117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '63ad42e27033'
+down_revision = '82258060a99d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('sales_history', sa.Column('transaction_id', sa.String(), nullable=True))
+    op.add_column('sales_history', sa.Column('line_number', sa.Integer(), nullable=True))
+    op.create_unique_constraint('uix_sales_store_transaction_line', 'sales_history', ['store_id', 'transaction_id', 'line_number'])
+
+
+def downgrade():
+    op.drop_constraint('uix_sales_store_transaction_line', 'sales_history', type_='unique')
+    op.drop_column('sales_history', 'line_number')
+    op.drop_column('sales_history', 'transaction_id')
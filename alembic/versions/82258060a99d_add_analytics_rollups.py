@@ -0,0 +1,93 @@
+"""Add analytics rollups
+
+Revision ID: 82258060a99d
+Revises: bc85c6f1dba5
+Create Date: 2026-10-17 11:26:05.207634
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '82258060a99d'
+down_revision = 'bc85c6f1dba5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('product_rollups',
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('store_count', sa.Integer(), nullable=False),
+    sa.Column('total_quantity', sa.BigInteger(), nullable=False),
+    sa.Column('low_stock_count', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('product_id')
+    )
+    op.create_table('store_rollups',
+    sa.Column('store_id', sa.Integer(), nullable=False),
+    sa.Column('total_products', sa.Integer(), nullable=False),
+    sa.Column('total_quantity', sa.BigInteger(), nullable=False),
+    sa.Column('low_stock_items', sa.Integer(), nullable=False),
+    sa.Column('restock_count', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['store_id'], ['stores.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('store_id')
+    )
+    op.create_table('region_rollups',
+    sa.Column('region', sa.String(), nullable=False),
+    sa.Column('store_count', sa.Integer(), nullable=False),
+    sa.Column('total_products', sa.Integer(), nullable=False),
+    sa.Column('total_quantity', sa.BigInteger(), nullable=False),
+    sa.Column('low_stock_count', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('region')
+    )
+    op.create_table('region_product_rollups',
+    sa.Column('region', sa.String(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('store_count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('region', 'product_id')
+    )
+
+    # Seed the rollups from the current inventory
+    op.execute("""
+        INSERT INTO product_rollups (product_id, store_count, total_quantity, low_stock_count)
+        SELECT product_id, count(*), coalesce(sum(quantity), 0),
+               sum(CASE WHEN quantity <= reorder_point THEN 1 ELSE 0 END)
+        FROM inventory WHERE product_id IS NOT NULL
+        GROUP BY product_id
+    """)
+    op.execute("""
+        INSERT INTO store_rollups (store_id, total_products, total_quantity, low_stock_items, restock_count)
+        SELECT store_id, count(*), coalesce(sum(quantity), 0),
+               sum(CASE WHEN quantity <= reorder_point THEN 1 ELSE 0 END),
+               count(last_restock_at)
+        FROM inventory WHERE store_id IS NOT NULL
+        GROUP BY store_id
+    """)
+    op.execute("""
+        INSERT INTO region_product_rollups (region, product_id, store_count)
+        SELECT coalesce(s.region, ''), i.product_id, count(*)
+        FROM inventory i JOIN stores s ON s.id = i.store_id
+        WHERE i.product_id IS NOT NULL
+        GROUP BY coalesce(s.region, ''), i.product_id
+    """)
+    op.execute("""
+        INSERT INTO region_rollups (region, store_count, total_products, total_quantity, low_stock_count)
+        SELECT coalesce(s.region, ''), count(DISTINCT i.store_id), count(DISTINCT i.product_id),
+               coalesce(sum(i.quantity), 0),
+               sum(CASE WHEN i.quantity <= i.reorder_point THEN 1 ELSE 0 END)
+        FROM inventory i JOIN stores s ON s.id = i.store_id
+        GROUP BY coalesce(s.region, '')
+    """)
+
+
+def downgrade():
+    op.drop_table('region_product_rollups')
+    op.drop_table('region_rollups')
+    op.drop_table('store_rollups')
+    op.drop_table('product_rollups')
@@ -0,0 +1,32 @@
+"""Track forecast high-water marks
+
+Revision ID: 9b11eeadae2c
+Revises: 583d464b3f77
+Create Date: 2026-10-17 16:02:19.514230
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9b11eeadae2c'
+down_revision = '583d464b3f77'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('demand_forecasts', sa.Column('sales_high_water', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('forecast_runs', sa.Column('incremental', sa.Boolean(), server_default=sa.false(), nullable=False))
+    op.add_column('forecast_runs', sa.Column('drift_threshold', sa.Float(), nullable=True))
+    op.add_column('forecast_runs', sa.Column('skipped_count', sa.BigInteger(), server_default='0', nullable=False))
+    op.create_index('ix_sales_history_created_at', 'sales_history', ['created_at'], unique=False, postgresql_using='brin')
+
+
+def downgrade():
+    op.drop_index('ix_sales_history_created_at', table_name='sales_history')
+    op.drop_column('forecast_runs', 'skipped_count')
+    op.drop_column('forecast_runs', 'drift_threshold')
+    op.drop_column('forecast_runs', 'incremental')
+    op.drop_column('demand_forecasts', 'sales_high_water')
@@ -0,0 +1,42 @@
+"""Add low stock state and events
+
+Revision ID: a539315923c3
+Revises: 57222b1b9b68
+Create Date: 2026-10-17 14:20:37.671925
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a539315923c3'
+down_revision = '57222b1b9b68'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.drop_index('ix_inventory_low_stock', table_name='inventory')
+    op.add_column('inventory', sa.Column('is_low_stock', sa.Boolean(), sa.Computed('coalesce(quantity <= reorder_point, false)', persisted=True), nullable=False))
+    op.create_index('ix_inventory_low_stock', 'inventory', ['store_id', 'product_id'], unique=False, postgresql_where=sa.text('is_low_stock'))
+    op.create_table('low_stock_events',
+    sa.Column('id', sa.BigInteger(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('store_id', sa.Integer(), nullable=False),
+    sa.Column('transition', sa.Enum('ENTERED', 'LEFT', name='lowstocktransition'), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['store_id'], ['stores.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_low_stock_events_store_id', 'low_stock_events', ['store_id', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_low_stock_events_store_id', table_name='low_stock_events')
+    op.drop_table('low_stock_events')
+    sa.Enum(name='lowstocktransition').drop(op.get_bind(), checkfirst=True)
+    op.drop_index('ix_inventory_low_stock', table_name='inventory')
+    op.drop_column('inventory', 'is_low_stock')
+    op.create_index('ix_inventory_low_stock', 'inventory', ['store_id', 'product_id'], unique=False, postgresql_where=sa.text('quantity <= reorder_point'))
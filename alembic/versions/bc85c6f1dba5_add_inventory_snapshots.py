@@ -0,0 +1,40 @@
+"""Add inventory snapshots
+
+Revision ID: bc85c6f1dba5
+Revises: 3b2fa78b4d14
+Create Date: 2026-10-17 10:03:27.540911
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'bc85c6f1dba5'
+down_revision = '3b2fa78b4d14'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Monthly partitions are created on demand by iaps.data.snapshots
+    op.create_table('inventory_snapshots',
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('store_id', sa.Integer(), nullable=False),
+    sa.Column('snapshot_date', sa.Date(), nullable=False),
+    sa.Column('quantity', sa.Integer(), nullable=True),
+    sa.Column('reorder_point', sa.Integer(), nullable=True),
+    sa.Column('reorder_quantity', sa.Integer(), nullable=True),
+    sa.Column('last_restock_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ),
+    sa.ForeignKeyConstraint(['store_id'], ['stores.id'], ),
+    sa.PrimaryKeyConstraint('product_id', 'store_id', 'snapshot_date'),
+    postgresql_partition_by='RANGE (snapshot_date)'
+    )
+    op.create_index('ix_inventory_snapshots_snapshot_date', 'inventory_snapshots', ['snapshot_date'], unique=False, postgresql_using='brin')
+
+
+def downgrade():
+    op.drop_index('ix_inventory_snapshots_snapshot_date', table_name='inventory_snapshots')
+    op.drop_table('inventory_snapshots')
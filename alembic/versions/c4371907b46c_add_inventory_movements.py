@@ -0,0 +1,39 @@
+"""Add inventory movements
+
+Revision ID: c4371907b46c
+Revises: 9b11eeadae2c
+Create Date: 2026-10-17 16:48:37.220915
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4371907b46c'
+down_revision = '9b11eeadae2c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('inventory_movements',
+    sa.Column('id', sa.BigInteger(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('store_id', sa.Integer(), nullable=False),
+    sa.Column('movement_type', sa.Enum('RECEIPT', name='movementtype'), nullable=False),
+    sa.Column('quantity_change', sa.Integer(), nullable=False),
+    sa.Column('purchase_order_id', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['purchase_order_id'], ['purchase_orders.id'], ondelete='SET NULL'),
+    sa.ForeignKeyConstraint(['store_id'], ['stores.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_inventory_movements_store_product', 'inventory_movements', ['store_id', 'product_id', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_inventory_movements_store_product', table_name='inventory_movements')
+    op.drop_table('inventory_movements')
+    sa.Enum(name='movementtype').drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,64 @@
+"""Add inventory ledger checkpoints
+
+Revision ID: d3635d4a54a7
+Revises: 2f1d0ac27716
+Create Date: 2026-10-17 18:02:44.913406
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd3635d4a54a7'
+down_revision = '2f1d0ac27716'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for value in ('RESTOCK', 'ADJUSTMENT', 'SALE', 'COUNT'):
+        op.execute(f"ALTER TYPE movementtype ADD VALUE IF NOT EXISTS '{value}'")
+    op.add_column('inventory_movements', sa.Column('reference', sa.String(), nullable=True))
+    op.create_index('ix_inventory_movements_created_at', 'inventory_movements', ['created_at'], unique=False, postgresql_using='brin')
+    op.create_table('inventory_checkpoints',
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('store_id', sa.Integer(), nullable=False),
+    sa.Column('movement_id', sa.BigInteger(), nullable=False),
+    sa.Column('quantity', sa.BigInteger(), nullable=False),
+    sa.Column('restock_count', sa.Integer(), nullable=False),
+    sa.Column('compacted_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['store_id'], ['stores.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('product_id', 'store_id')
+    )
+    # Existing quantities become the opening balance of the ledger, covering
+    # every movement logged so far. Pairs restocked before receipts were
+    # logged count one restock.
+    op.execute("""
+        INSERT INTO inventory_checkpoints (product_id, store_id, movement_id, quantity, restock_count)
+        SELECT i.product_id, i.store_id,
+               (SELECT coalesce(max(id), 0) FROM inventory_movements),
+               coalesce(i.quantity, 0),
+               greatest(coalesce(r.receipts, 0), CASE WHEN i.last_restock_at IS NULL THEN 0 ELSE 1 END)
+        FROM inventory i
+        LEFT JOIN (
+            SELECT product_id, store_id, count(*) AS receipts
+            FROM inventory_movements
+            GROUP BY product_id, store_id
+        ) r ON r.product_id = i.product_id AND r.store_id = i.store_id
+        WHERE i.product_id IS NOT NULL AND i.store_id IS NOT NULL
+    """)
+    op.execute("""
+        UPDATE store_rollups SET restock_count = coalesce(
+            (SELECT sum(c.restock_count) FROM inventory_checkpoints c WHERE c.store_id = store_rollups.store_id), 0
+        )
+    """)
+
+
+def downgrade():
+    op.drop_table('inventory_checkpoints')
+    op.drop_index('ix_inventory_movements_created_at', table_name='inventory_movements')
+    op.drop_column('inventory_movements', 'reference')
+    op.execute("DELETE FROM inventory_movements WHERE movement_type <> 'RECEIPT'")
+    # Postgres cannot drop enum values; the extra labels stay unused
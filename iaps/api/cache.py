@@ -0,0 +1,226 @@
+"""Response caching for expensive read endpoints.
+
+Responses are cached as serialized JSON under a key built from the request
+path, its query parameters and the current version of every table the
+endpoint reads. Committing a session that wrote to a table bumps that
+table's version (see the session hooks at the bottom), so stale entries are
+never looked up again and simply age out of the backend. Cached responses
+carry an ETag and conditional requests are answered with 304.
+
+Whether the response was read from the primary or a replica is part of the
+key. A replica may not have replayed a write yet when it fills the entry
+for that write's new versions, so clients whose reads are pinned to the
+primary after writing never see replica-filled entries, and those expire
+within the replica lag budget rather than the full TTL.
+
+The backend is an in-process LRU by default, where versions are per worker
+process and other workers only see a write once their entries expire. Set
+``CACHE_URL`` to a ``redis://`` URL to share entries and versions between
+workers; any client with Redis' get/set/mget/incr can stand in for it.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from itertools import chain
+from typing import Any, Awaitable, Callable, Hashable, List, Optional, Sequence
+
+from fastapi import Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from ..db.database import READ_REPLICA_STATE, REPLICA_MAX_LAG_SECONDS
+
+_MISSING = object()
+_PENDING_TABLES = "cache_pending_tables"
+
+
+class LRUCache:
+    """Thread-safe key/value cache with per-entry expiry and LRU eviction"""
+
+    def __init__(self, ttl: float, max_entries: int = 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is _MISSING:
+                return default
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class MemoryBackend:
+    """Entries and table versions held in this process"""
+    blocking = False
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.entries = LRUCache(ttl, max_entries)
+        self._versions = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.entries.get(key)
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        self.entries.set(key, value, ttl)
+
+    def versions(self, tables: Sequence[str]) -> List[int]:
+        with self._lock:
+            return [self._versions[table] for table in tables]
+
+    def bump(self, tables: Sequence[str]) -> None:
+        with self._lock:
+            for table in tables:
+                self._versions[table] += 1
+
+
+class RedisBackend:
+    """Entries and table versions shared through a Redis-compatible server"""
+    blocking = True
+
+    def __init__(self, client, prefix: str = "iaps:"):
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url: str) -> "RedisBackend":
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("CACHE_URL points at Redis but the redis package is not installed")
+        return cls(redis.Redis.from_url(url))
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(f"{self.prefix}cache:{key}")
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        self.client.set(f"{self.prefix}cache:{key}", value, ex=max(1, int(ttl)))
+
+    def versions(self, tables: Sequence[str]) -> List[int]:
+        values = self.client.mget([f"{self.prefix}version:{table}" for table in tables])
+        return [int(value or 0) for value in values]
+
+    def bump(self, tables: Sequence[str]) -> None:
+        for table in tables:
+            self.client.incr(f"{self.prefix}version:{table}")
+
+
+def _if_none_match(request: Request) -> List[str]:
+    header = request.headers.get("if-none-match", "")
+    return [tag.strip().lstrip("W/") for tag in header.split(",") if tag.strip()]
+
+
+class ResponseCache:
+    def __init__(self, backend, ttl: float, replica_ttl: Optional[float] = None):
+        self.backend = backend
+        self.ttl = ttl
+        self.replica_ttl = ttl if replica_ttl is None else min(ttl, replica_ttl)
+
+    async def _call(self, method, *args):
+        if self.backend.blocking:
+            return await run_in_threadpool(method, *args)
+        return method(*args)
+
+    async def respond(
+        self,
+        request: Request,
+        tables: Sequence[str],
+        build: Callable[[], Awaitable[Any]]
+    ) -> Response:
+        """Serve ``build()``'s result from the cache, computing it on a miss"""
+        from_replica = getattr(request.state, READ_REPLICA_STATE, None) is not None
+        versions = await self._call(self.backend.versions, tables)
+        key = hashlib.sha1(json.dumps([
+            request.url.path,
+            sorted(request.query_params.multi_items()),
+            list(tables),
+            versions,
+            "replica" if from_replica else "primary"
+        ]).encode()).hexdigest()
+
+        entry = await self._call(self.backend.get, key)
+        if entry is None:
+            body = json.dumps(jsonable_encoder(await build()), separators=(",", ":")).encode()
+            etag = f'"{hashlib.sha1(body).hexdigest()}"'
+            entry = etag.encode() + b"\n" + body
+            await self._call(self.backend.set, key, entry, self.replica_ttl if from_replica else self.ttl)
+
+        etag, body = entry.split(b"\n", 1)
+        headers = {"ETag": etag.decode(), "Cache-Control": "no-cache"}
+        matches = _if_none_match(request)
+        if "*" in matches or headers["ETag"] in matches:
+            return Response(status_code=304, headers=headers)
+        return Response(body, media_type="application/json", headers=headers)
+
+    def invalidate(self, tables: Sequence[str]) -> None:
+        self.backend.bump(sorted(tables))
+
+
+def _backend(ttl: float):
+    url = os.getenv("CACHE_URL")
+    if url:
+        return RedisBackend.from_url(url)
+    return MemoryBackend(ttl, int(os.getenv("CACHE_MAX_ENTRIES", "1024")))
+
+
+_ttl = float(os.getenv("ANALYTICS_CACHE_TTL", os.getenv("SUMMARY_CACHE_TTL", "30")))
+response_cache = ResponseCache(_backend(_ttl), _ttl, replica_ttl=REPLICA_MAX_LAG_SECONDS)
+
+
+# Every session write is recorded by table and turned into version bumps
+# once it commits; rolled back writes invalidate nothing.
+def _mark(session: Session, tables) -> None:
+    session.info.setdefault(_PENDING_TABLES, set()).update(tables)
+
+
+@event.listens_for(Session, "after_flush")
+def _track_flush(session, flush_context):
+    _mark(session, {
+        instance.__table__.name
+        for instance in chain(session.new, session.dirty, session.deleted)
+        if hasattr(instance, "__table__")
+    })
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _track_execute(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        table = getattr(orm_execute_state.statement, "table", None)
+        if table is not None:
+            _mark(orm_execute_state.session, {table.name})
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session):
+    tables = session.info.pop(_PENDING_TABLES, None)
+    if tables:
+        response_cache.invalidate(tables)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rolled_back(session):
+    session.info.pop(_PENDING_TABLES, None)
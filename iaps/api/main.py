@@ -1,6 +1,10 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from .routers import product, store, inventory, analytics
+import time
+from .routers import product, store, inventory, analytics, purchase_order, sales
+from .pagination import NEXT_CURSOR_HEADER
+from ..db.pool import render_pool_metrics
+from ..db.database import READ_YOUR_WRITES_COOKIE, READ_YOUR_WRITES_SECONDS, replicas
 
 app = FastAPI(
     title="Inventory Analytics & Prediction System",
@@ -15,13 +19,30 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag"],
 )
 
+@app.middleware("http")
+async def read_your_writes(request: Request, call_next):
+    """Pin a client's reads to the primary for a while after it writes"""
+    response = await call_next(request)
+    if replicas and request.method not in ("GET", "HEAD", "OPTIONS") and response.status_code < 400:
+        response.set_cookie(
+            READ_YOUR_WRITES_COOKIE,
+            str(time.time() + READ_YOUR_WRITES_SECONDS),
+            max_age=int(READ_YOUR_WRITES_SECONDS) + 1,
+            httponly=True,
+            samesite="lax"
+        )
+    return response
+
 # Include routers
 app.include_router(product.router)
 app.include_router(store.router)
 app.include_router(inventory.router)
 app.include_router(analytics.router)
+app.include_router(purchase_order.router)
+app.include_router(sales.router)
 
 @app.get("/")
 async def root():
@@ -35,4 +56,9 @@ async def health_check():
     return {
         "status": "healthy",
         "version": "1.0.0"
-    } 
\ No newline at end of file
+    } 
+
+@app.get("/metrics")
+async def metrics():
+    """Connection pool metrics in the Prometheus text format"""
+    return Response(render_pool_metrics(), media_type="text/plain; version=0.0.4")
\ No newline at end of file
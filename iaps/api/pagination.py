@@ -0,0 +1,68 @@
+"""Offset and keyset (cursor) pagination shared by the list endpoints.
+
+Without a ``cursor`` parameter a list endpoint keeps its original
+skip/limit behaviour. Passing ``cursor`` (empty for the first page) switches
+to keyset pagination on the primary key: pages are read with
+``WHERE id > :last_id ORDER BY id`` so deep pages cost the same as the first,
+and the cursor for the following page is returned in the ``X-Next-Cursor``
+response header (absent on the last page).
+"""
+import base64
+import binascii
+import json
+from typing import Callable, List, Optional
+
+from fastapi import HTTPException, Response
+
+MAX_PAGE_SIZE = 100
+MAX_CURSOR_PAGE_SIZE = 1000
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(last_id: int) -> str:
+    payload = json.dumps({"id": last_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Optional[int]:
+    """Last id seen by the client, or None for the first page"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        last_id = json.loads(base64.urlsafe_b64decode(padded))["id"]
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(last_id, int):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return last_id
+
+
+def paginate(
+    query,
+    id_column,
+    response: Response,
+    skip: int,
+    limit: int,
+    cursor: Optional[str],
+    row_id: Callable = lambda row: row.id
+) -> List:
+    """Apply offset or keyset pagination to ``query``, always ordered by id"""
+    if cursor is None:
+        if limit > MAX_PAGE_SIZE:
+            raise HTTPException(
+                status_code=400,
+                detail=f"limit cannot exceed {MAX_PAGE_SIZE} without a cursor"
+            )
+        return query.order_by(id_column).offset(skip).limit(limit).all()
+
+    last_id = decode_cursor(cursor)
+    if last_id is not None:
+        query = query.filter(id_column > last_id)
+
+    # One extra row tells whether another page exists
+    rows = query.order_by(id_column).limit(limit + 1).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(row_id(rows[-1]))
+    return rows
@@ -1,8 +1,9 @@
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, Request
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import func, case, desc, extract
+from sqlalchemy import func, case, extract
 from typing import List, Optional
-from datetime import datetime, timedelta
+from datetime import datetime, time, timedelta
 from ..schemas.analytics import (
     ProductPerformance,
     StorePerformance,
@@ -17,216 +18,204 @@ from ..schemas.analytics import (
     CategoryTrend,
     InventoryTrendPoint
 )
-from ...db.database import get_db
-from ...db.models import Product, Store, Inventory
+from ..cache import response_cache
+from ...db.database import get_async_read_db, get_read_db
+from ...db.models import Product, Store, InventorySnapshot, ProductRollup, StoreRollup, RegionRollup
+from ...data.rollups import summary_query
+from ...ml.demand import predict_stockouts
+from ...data.trends import SNAPSHOT_LOW_STOCK, SNAPSHOT_RESTOCKED, growth_rate, load_trend_aggregates
 
 router = APIRouter(
     prefix="/analytics",
     tags=["analytics"]
 )
 
+# Tables each cached endpoint reads; a committed write to any of them
+# invalidates the endpoint's cached responses
+SUMMARY_TABLES = (
+    Product.__tablename__,
+    Store.__tablename__,
+    ProductRollup.__tablename__,
+    StoreRollup.__tablename__
+)
+PRODUCT_PERFORMANCE_TABLES = (Product.__tablename__, ProductRollup.__tablename__)
+STORE_PERFORMANCE_TABLES = (Store.__tablename__, StoreRollup.__tablename__)
+REGIONAL_TRENDS_TABLES = (RegionRollup.__tablename__,)
+
 @router.get("/summary", response_model=AnalyticsSummary)
-def get_analytics_summary(db: Session = Depends(get_db)):
+async def get_analytics_summary(request: Request, db: AsyncSession = Depends(get_async_read_db)):
     """Get overall analytics summary"""
-    # Get basic counts
-    total_products = db.query(func.count(Product.id)).scalar()
-    total_stores = db.query(func.count(Store.id)).scalar()
-    total_inventory = db.query(func.sum(Inventory.quantity)).scalar() or 0
-    
-    # Get low stock items count
-    low_stock = db.query(func.count(Inventory.id))\
-        .filter(Inventory.quantity <= Inventory.reorder_point).scalar() or 0
-    
-    # Calculate inventory health score (example: ratio of healthy stock to total)
-    total_items = db.query(func.count(Inventory.id)).scalar() or 1  # Avoid division by zero
-    health_score = (total_items - low_stock) / total_items * 100
-    
-    # Get top performing stores (by inventory turnover)
-    top_stores = db.query(Store.name)\
-        .join(Inventory)\
-        .group_by(Store.id)\
-        .order_by(desc(func.sum(Inventory.quantity)))\
-        .limit(5)\
-        .all()
-    
-    # Get critical products (frequently low stock)
-    critical_products = db.query(Product.name)\
-        .join(Inventory)\
-        .filter(Inventory.quantity <= Inventory.reorder_point)\
-        .group_by(Product.id)\
-        .order_by(desc(func.count(Inventory.id)))\
-        .limit(5)\
-        .all()
-    
-    # Get regional distribution
-    regional_dist = dict(
-        db.query(Store.region, func.count(Store.id))
-        .group_by(Store.region)
-        .all()
-    )
-    
-    return AnalyticsSummary(
-        total_products=total_products,
-        total_stores=total_stores,
-        total_inventory=total_inventory,
-        low_stock_items=low_stock,
-        inventory_health_score=health_score,
-        top_performing_stores=[store[0] for store in top_stores],
-        critical_products=[prod[0] for prod in critical_products],
-        regional_distribution=regional_dist
-    )
+    async def build():
+        (
+            total_products,
+            total_stores,
+            total_inventory,
+            low_stock,
+            total_items,
+            top_stores,
+            critical_products,
+            regions,
+            region_counts
+        ) = await db.run_sync(lambda session: summary_query(session).one())
+        
+        # Calculate inventory health score (example: ratio of healthy stock to total)
+        total_items = total_items or 1  # Avoid division by zero
+        health_score = (total_items - low_stock) / total_items * 100
+        
+        return AnalyticsSummary(
+            total_products=total_products,
+            total_stores=total_stores,
+            total_inventory=total_inventory,
+            low_stock_items=low_stock,
+            inventory_health_score=health_score,
+            top_performing_stores=top_stores or [],
+            critical_products=critical_products or [],
+            regional_distribution=dict(zip(regions or [], region_counts or []))
+        )
+
+    return await response_cache.respond(request, SUMMARY_TABLES, build)
 
 @router.get("/products/performance", response_model=List[ProductPerformance])
-def get_product_performance(
+async def get_product_performance(
+    request: Request,
     category: Optional[str] = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """Get performance metrics for all products"""
-    query = db.query(
-        Product.id,
-        Product.name,
-        Product.sku,
-        func.sum(Inventory.quantity).label('total_quantity'),
-        func.count(func.distinct(Inventory.store_id)).label('store_count'),
-        func.sum(
-            case(
-                [(Inventory.quantity <= Inventory.reorder_point, 1)],
-                else_=0
+    def load(session):
+        query = session.query(
+            Product.id,
+            Product.name,
+            Product.sku,
+            ProductRollup.total_quantity,
+            ProductRollup.store_count,
+            ProductRollup.low_stock_count
+        ).join(ProductRollup, ProductRollup.product_id == Product.id)\
+        .filter(ProductRollup.store_count > 0)
+        
+        if category:
+            query = query.filter(Product.category == category)
+        
+        return query.order_by(Product.id).all()
+
+    async def build():
+        results = await db.run_sync(load)
+        return [
+            ProductPerformance(
+                product_id=r[0],
+                product_name=r[1],
+                product_sku=r[2],
+                total_quantity=r[3] or 0,
+                store_count=r[4] or 0,
+                low_stock_count=r[5] or 0,
+                avg_quantity=float(r[3] or 0) / r[4]
             )
-        ).label('low_stock_count'),
-        func.avg(Inventory.quantity).label('avg_quantity')
-    ).join(Inventory)
-    
-    if category:
-        query = query.filter(Product.category == category)
-    
-    results = query.group_by(Product.id).all()
-    
-    return [
-        ProductPerformance(
-            product_id=r[0],
-            product_name=r[1],
-            product_sku=r[2],
-            total_quantity=r[3] or 0,
-            store_count=r[4] or 0,
-            low_stock_count=r[5] or 0,
-            avg_quantity=float(r[6] or 0)
-        )
-        for r in results
-    ]
+            for r in results
+        ]
+
+    return await response_cache.respond(request, PRODUCT_PERFORMANCE_TABLES, build)
 
 @router.get("/stores/performance", response_model=List[StorePerformance])
-def get_store_performance(
+async def get_store_performance(
+    request: Request,
     region: Optional[str] = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """Get performance metrics for all stores"""
-    query = db.query(
-        Store.id,
-        Store.name,
-        Store.location,
-        Store.region,
-        func.count(func.distinct(Inventory.product_id)).label('total_products'),
-        func.sum(Inventory.quantity).label('total_quantity'),
-        func.sum(
-            case(
-                [(Inventory.quantity <= Inventory.reorder_point, 1)],
-                else_=0
+    def load(session):
+        query = session.query(
+            Store.id,
+            Store.name,
+            Store.location,
+            Store.region,
+            StoreRollup.total_products,
+            StoreRollup.total_quantity,
+            StoreRollup.low_stock_items,
+            StoreRollup.restock_count
+        ).join(StoreRollup, StoreRollup.store_id == Store.id)\
+        .filter(StoreRollup.total_products > 0)
+        
+        if region:
+            query = query.filter(Store.region == region)
+        
+        return query.order_by(Store.id).all()
+
+    async def build():
+        results = await db.run_sync(load)
+        return [
+            StorePerformance(
+                store_id=r[0],
+                store_name=r[1],
+                store_location=r[2],
+                region=r[3],
+                total_products=r[4] or 0,
+                total_quantity=r[5] or 0,
+                low_stock_items=r[6] or 0,
+                restock_count=r[7] or 0,
+                inventory_value=0.0  # Placeholder for future price implementation
             )
-        ).label('low_stock_items'),
-        func.count(Inventory.last_restock_at).label('restock_count')
-    ).join(Inventory)
-    
-    if region:
-        query = query.filter(Store.region == region)
-    
-    results = query.group_by(Store.id).all()
-    
-    return [
-        StorePerformance(
-            store_id=r[0],
-            store_name=r[1],
-            store_location=r[2],
-            region=r[3],
-            total_products=r[4] or 0,
-            total_quantity=r[5] or 0,
-            low_stock_items=r[6] or 0,
-            restock_count=r[7] or 0,
-            inventory_value=0.0  # Placeholder for future price implementation
-        )
-        for r in results
-    ]
+            for r in results
+        ]
+
+    return await response_cache.respond(request, STORE_PERFORMANCE_TABLES, build)
 
 @router.get("/regional/trends", response_model=List[RegionalTrends])
-def get_regional_trends(db: Session = Depends(get_db)):
+async def get_regional_trends(request: Request, db: AsyncSession = Depends(get_async_read_db)):
     """Get performance trends by region"""
-    results = db.query(
-        Store.region,
-        func.count(func.distinct(Store.id)).label('store_count'),
-        func.count(func.distinct(Inventory.product_id)).label('total_products'),
-        func.sum(Inventory.quantity).label('total_quantity'),
-        func.sum(
-            case(
-                [(Inventory.quantity <= Inventory.reorder_point, 1)],
-                else_=0
+    async def build():
+        results = await db.run_sync(lambda session: session.query(
+            RegionRollup.region,
+            RegionRollup.store_count,
+            RegionRollup.total_products,
+            RegionRollup.total_quantity,
+            RegionRollup.low_stock_count
+        ).filter(RegionRollup.store_count > 0)
+        .order_by(RegionRollup.region)
+        .all())
+        
+        return [
+            RegionalTrends(
+                region=r[0] or "Unspecified",
+                store_count=r[1] or 0,
+                total_products=r[2] or 0,
+                total_quantity=r[3] or 0,
+                avg_products_per_store=float(r[2] or 0) / float(r[1] or 1),
+                low_stock_percentage=float(r[4] or 0) / float(r[2] or 1) * 100
             )
-        ).label('low_stock_count')
-    ).join(Inventory)\
-    .group_by(Store.region)\
-    .all()
-    
-    return [
-        RegionalTrends(
-            region=r[0] or "Unspecified",
-            store_count=r[1] or 0,
-            total_products=r[2] or 0,
-            total_quantity=r[3] or 0,
-            avg_products_per_store=float(r[2] or 0) / float(r[1] or 1),
-            low_stock_percentage=float(r[4] or 0) / float(r[2] or 1) * 100
-        )
-        for r in results
-    ]
+            for r in results
+        ]
+
+    return await response_cache.respond(request, REGIONAL_TRENDS_TABLES, build)
 
+# The prediction routes do their numpy work in the threadpool so a
+# catalog-wide run never blocks the event loop
 @router.get("/products/{product_id}/predictions", response_model=List[LowStockPrediction])
 def get_product_predictions(
     product_id: int,
-    db: Session = Depends(get_db)
+    use_forecasts: bool = False,
+    db: Session = Depends(get_read_db)
 ):
     """Get low stock predictions for a product across all stores"""
-    # Get current inventory levels
-    inventories = db.query(
-        Inventory,
-        Product.name.label('product_name'),
-        Store.name.label('store_name')
-    ).join(Product)\
-    .join(Store)\
-    .filter(Inventory.product_id == product_id)\
-    .all()
-    
-    predictions = []
-    for inv, product_name, store_name in inventories:
-        # Simple prediction logic (to be replaced with ML model)
-        current_quantity = inv.quantity
-        reorder_point = inv.reorder_point or 10
-        daily_usage = 1  # Placeholder for actual usage calculation
-        
-        days_until_reorder = (current_quantity - reorder_point) / daily_usage if daily_usage > 0 else 30
-        
-        predictions.append(
-            LowStockPrediction(
-                product_id=product_id,
-                product_name=product_name,
-                store_id=inv.store_id,
-                store_name=store_name,
-                current_quantity=current_quantity,
-                predicted_days_until_reorder=max(0, days_until_reorder),
-                confidence_score=0.8,  # Placeholder for ML model confidence
-                recommended_restock_date=datetime.utcnow() + timedelta(days=int(days_until_reorder))
-            )
-        )
-    
-    return predictions
+    return [
+        LowStockPrediction(**prediction)
+        for prediction in predict_stockouts(db, product_id=product_id, use_forecasts=use_forecasts)
+    ]
 
+@router.get("/predictions", response_model=List[LowStockPrediction])
+def get_predictions(
+    store_id: Optional[int] = None,
+    limit: int = Query(100, ge=1, le=10000),
+    use_forecasts: bool = False,
+    db: Session = Depends(get_read_db)
+):
+    """Get low stock predictions across the catalog, most urgent first"""
+    return [
+        LowStockPrediction(**prediction)
+        for prediction in predict_stockouts(db, store_id=store_id, limit=limit, use_forecasts=use_forecasts)
+    ]
+
+# The trend routes fold and validate one model per bucket, which for a
+# large catalog is CPU-bound, so they stay in the threadpool as well
 @router.get("/trends", response_model=TrendAnalysis)
 def get_trend_analysis(
     time_range: TimeRange,
@@ -235,7 +224,7 @@ def get_trend_analysis(
     category: Optional[str] = None,
     store_id: Optional[int] = None,
     product_id: Optional[int] = None,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Get trend analysis for specified time range"""
     # Set default date range if not provided
@@ -249,160 +238,63 @@ def get_trend_analysis(
         else:  # MONTH
             start_date = end_date - timedelta(days=365)  # Last 12 months
 
-    # Base query for inventory changes
-    base_query = db.query(
-        Inventory,
-        Product.name.label('product_name'),
-        Product.category,
-        Store.name.label('store_name')
-    ).join(Product).join(Store)
+    aggregates = load_trend_aggregates(db, time_range.value, start_date, end_date, category, store_id, product_id)
 
-    # Apply filters
-    if category:
-        base_query = base_query.filter(Product.category == category)
-    if store_id:
-        base_query = base_query.filter(Store.id == store_id)
-    if product_id:
-        base_query = base_query.filter(Product.id == product_id)
-
-    # Get all inventory records within date range
-    inventory_records = base_query.filter(
-        Inventory.updated_at.between(start_date, end_date)
-    ).order_by(Inventory.updated_at).all()
-
-    # Process product trends
-    product_trends = []
-    products = {}
-    for record in inventory_records:
-        inv, prod_name, category, store_name = record
-        if inv.product_id not in products:
-            products[inv.product_id] = {
-                'name': prod_name,
-                'trend_data': [],
-                'total_quantity': 0,
-                'restock_count': 0,
-                'stock_out_count': 0
-            }
-        
-        products[inv.product_id]['trend_data'].append(
+    def trend_points(points):
+        # One point per bucket; quantity is the level at the end of the bucket
+        return [
             InventoryTrendPoint(
-                timestamp=inv.updated_at,
-                quantity=inv.quantity,
-                restock_count=1 if inv.last_restock_at else 0,
-                low_stock_count=1 if inv.quantity <= inv.reorder_point else 0
+                timestamp=bucket,
+                quantity=last,
+                restock_count=restocks,
+                low_stock_count=lows,
+                sum_quantity=total,
+                min_quantity=minimum,
+                max_quantity=maximum
             )
-        )
-        products[inv.product_id]['total_quantity'] += inv.quantity
-        if inv.last_restock_at:
-            products[inv.product_id]['restock_count'] += 1
-        if inv.quantity == 0:
-            products[inv.product_id]['stock_out_count'] += 1
+            for bucket, last, restocks, lows, total, minimum, maximum in points
+        ]
 
-    for prod_id, data in products.items():
-        num_periods = len(data['trend_data'])
-        product_trends.append(
-            ProductTrend(
-                product_id=prod_id,
-                product_name=data['name'],
-                trend_data=data['trend_data'],
-                average_quantity=data['total_quantity'] / num_periods if num_periods > 0 else 0,
-                restock_frequency=data['restock_count'] / num_periods if num_periods > 0 else 0,
-                stock_out_frequency=data['stock_out_count'] / num_periods if num_periods > 0 else 0
-            )
-        )
-
-    # Process store trends
-    store_trends = []
-    stores = {}
-    for record in inventory_records:
-        inv, prod_name, category, store_name = record
-        if inv.store_id not in stores:
-            stores[inv.store_id] = {
-                'name': store_name,
-                'trend_data': [],
-                'total_quantity': 0,
-                'quantities': []
-            }
-        
-        stores[inv.store_id]['trend_data'].append(
-            InventoryTrendPoint(
-                timestamp=inv.updated_at,
-                quantity=inv.quantity,
-                restock_count=1 if inv.last_restock_at else 0,
-                low_stock_count=1 if inv.quantity <= inv.reorder_point else 0
-            )
-        )
-        stores[inv.store_id]['quantities'].append((inv.updated_at, inv.quantity))
-
-    for store_id, data in stores.items():
-        quantities = sorted(data['quantities'], key=lambda x: x[1])
-        store_trends.append(
-            StoreTrend(
-                store_id=store_id,
-                store_name=data['name'],
-                trend_data=data['trend_data'],
-                average_inventory_level=sum(q[1] for q in quantities) / len(quantities) if quantities else 0,
-                peak_inventory_date=quantities[-1][0] if quantities else start_date,
-                low_inventory_date=quantities[0][0] if quantities else start_date
-            )
+    product_trends = [
+        ProductTrend(
+            product_id=prod_id,
+            product_name=data['name'],
+            trend_data=trend_points(data['points']),
+            average_quantity=data['total_quantity'] / data['row_count'],
+            restock_frequency=data['restock_count'] / data['row_count'],
+            stock_out_frequency=data['stock_out_count'] / data['row_count']
         )
+        for prod_id, data in aggregates['products'].items()
+    ]
 
-    # Process category trends
-    category_trends = []
-    categories = {}
-    for record in inventory_records:
-        inv, prod_name, category, store_name = record
-        if not category:
-            category = "Uncategorized"
-        
-        if category not in categories:
-            categories[category] = {
-                'trend_data': [],
-                'quantities': []
-            }
-        
-        categories[category]['trend_data'].append(
-            InventoryTrendPoint(
-                timestamp=inv.updated_at,
-                quantity=inv.quantity,
-                restock_count=1 if inv.last_restock_at else 0,
-                low_stock_count=1 if inv.quantity <= inv.reorder_point else 0
-            )
+    store_trends = [
+        StoreTrend(
+            store_id=store_key,
+            store_name=data['name'],
+            trend_data=trend_points(data['points']),
+            average_inventory_level=data['total_quantity'] / data['row_count'],
+            peak_inventory_date=data['peak'][0],
+            low_inventory_date=data['low'][0]
         )
-        categories[category]['quantities'].append((inv.updated_at, inv.quantity))
-
-    for cat_name, data in categories.items():
-        quantities = sorted(data['quantities'], key=lambda x: x[0])
-        if len(quantities) >= 2:
-            start_qty = quantities[0][1]
-            end_qty = quantities[-1][1]
-            growth_rate = ((end_qty - start_qty) / start_qty) * 100 if start_qty > 0 else 0
-        else:
-            growth_rate = 0
+        for store_key, data in aggregates['stores'].items()
+    ]
 
-        category_trends.append(
-            CategoryTrend(
-                category=cat_name,
-                trend_data=data['trend_data'],
-                growth_rate=growth_rate,
-                seasonal_pattern=None  # Would require more sophisticated analysis
-            )
+    category_trends = [
+        CategoryTrend(
+            category=cat_name,
+            trend_data=trend_points(data['points']),
+            growth_rate=growth_rate(data['first'], data['last'], len(data['points'])),
+            seasonal_pattern=None  # Would require more sophisticated analysis
         )
+        for cat_name, data in aggregates['categories'].items()
+    ]
 
     # Calculate overall metrics
-    all_quantities = [(r[0].updated_at, r[0].quantity) for r in inventory_records]
-    if all_quantities:
-        all_quantities.sort(key=lambda x: x[1])
-        peak_period = all_quantities[-1][0]
-        low_period = all_quantities[0][0]
-        
-        all_quantities.sort(key=lambda x: x[0])
-        if len(all_quantities) >= 2:
-            start_qty = all_quantities[0][1]
-            end_qty = all_quantities[-1][1]
-            overall_growth_rate = ((end_qty - start_qty) / start_qty) * 100 if start_qty > 0 else 0
-        else:
-            overall_growth_rate = 0
+    overall = aggregates['overall']
+    if overall['points']:
+        peak_period = overall['peak'][0]
+        low_period = overall['low'][0]
+        overall_growth_rate = growth_rate(overall['first'], overall['last'], len(overall['points']))
     else:
         peak_period = end_date
         low_period = start_date
@@ -439,7 +331,7 @@ def get_daily_summary(
     end_date: Optional[datetime] = None,
     store_id: Optional[int] = None,
     product_id: Optional[int] = None,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Get daily summary of inventory changes"""
     if not end_date:
@@ -448,31 +340,31 @@ def get_daily_summary(
         start_date = end_date - timedelta(days=30)
 
     query = db.query(
-        func.date_trunc('day', Inventory.updated_at).label('day'),
-        func.sum(Inventory.quantity).label('quantity'),
-        func.count(Inventory.last_restock_at).label('restock_count'),
-        func.sum(case([(Inventory.quantity <= Inventory.reorder_point, 1)], else_=0)).label('low_stock_count')
+        InventorySnapshot.snapshot_date,
+        func.sum(InventorySnapshot.quantity).label('quantity'),
+        func.sum(case([(SNAPSHOT_RESTOCKED, 1)], else_=0)).label('restock_count'),
+        func.sum(case([(SNAPSHOT_LOW_STOCK, 1)], else_=0)).label('low_stock_count')
     )
 
     if store_id:
-        query = query.filter(Inventory.store_id == store_id)
+        query = query.filter(InventorySnapshot.store_id == store_id)
     if product_id:
-        query = query.filter(Inventory.product_id == product_id)
+        query = query.filter(InventorySnapshot.product_id == product_id)
 
     results = query.filter(
-        Inventory.updated_at.between(start_date, end_date)
+        InventorySnapshot.snapshot_date.between(start_date.date(), end_date.date())
     ).group_by(
-        func.date_trunc('day', Inventory.updated_at)
+        InventorySnapshot.snapshot_date
     ).order_by(
-        func.date_trunc('day', Inventory.updated_at)
+        InventorySnapshot.snapshot_date
     ).all()
 
     return [
         InventoryTrendPoint(
-            timestamp=day,
+            timestamp=datetime.combine(day, time.min),
             quantity=quantity or 0,
             restock_count=restock_count or 0,
             low_stock_count=low_stock_count or 0
         )
         for day, quantity, restock_count, low_stock_count in results
-    ] 
\ No newline at end of file
+    ]
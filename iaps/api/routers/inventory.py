@@ -1,16 +1,33 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 from typing import List, Optional
 from datetime import datetime
+import csv
+import io
+import json
 from ..schemas.inventory import (
     InventoryCreate,
     InventoryUpdate,
     InventoryResponse,
-    InventoryWithDetails
+    InventoryWithDetails,
+    InventoryBulkUpsert,
+    InventoryBulkUpsertResult,
+    LowStockEventResponse,
+    InventoryMovementResponse,
+    InventoryAdjustmentBatch,
+    InventoryAdjustmentBatchResult,
+    ExportFormat,
+    MovementType
 )
-from ...db.database import get_db
-from ...db.models import Inventory, Product, Store
+from ..pagination import MAX_CURSOR_PAGE_SIZE, paginate
+from ...db.database import get_db, get_read_db
+from ...db.models import Inventory, InventoryMovement, LowStockEvent, Product, Store
+from ...data.adjustments import APPLIED, NOT_FOUND, adjust_inventory
+from ...data.inventory_ingest import ERROR, INSERTED, SKIPPED, UPDATED, bulk_upsert_inventory
+from ...data.ledger import record_movements
+from ...data.rollups import apply_inventory_deltas, inventory_delta, inventory_state
 from sqlalchemy.exc import IntegrityError
 
 router = APIRouter(
@@ -18,6 +35,33 @@ router = APIRouter(
     tags=["inventory"]
 )
 
+EXPORT_BATCH_SIZE = 5000
+EXPORT_COLUMNS = (
+    Inventory.id,
+    Inventory.product_id,
+    Product.name.label('product_name'),
+    Product.sku.label('product_sku'),
+    Inventory.store_id,
+    Store.name.label('store_name'),
+    Store.location.label('store_location'),
+    Inventory.quantity,
+    Inventory.reorder_point,
+    Inventory.reorder_quantity,
+    Inventory.last_restock_at,
+    Inventory.created_at,
+    Inventory.updated_at
+)
+EXPORT_FIELDS = [column.key for column in EXPORT_COLUMNS]
+
+def _count_movement(inventory: Inventory, quantity_change: int) -> dict:
+    """Ledger movement for a quantity set directly rather than adjusted"""
+    return {
+        'product_id': inventory.product_id,
+        'store_id': inventory.store_id,
+        'movement_type': MovementType.COUNT,
+        'quantity_change': quantity_change
+    }
+
 @router.post("/", response_model=InventoryResponse, status_code=201)
 def create_inventory(inventory: InventoryCreate, db: Session = Depends(get_db)):
     """Create a new inventory record"""
@@ -33,6 +77,11 @@ def create_inventory(inventory: InventoryCreate, db: Session = Depends(get_db)):
     db_inventory = Inventory(**inventory.dict())
     try:
         db.add(db_inventory)
+        db.flush()
+        apply_inventory_deltas(db, [inventory_delta(
+            db_inventory.product_id, db_inventory.store_id, None, inventory_state(db_inventory)
+        )])
+        record_movements(db, [_count_movement(db_inventory, db_inventory.quantity or 0)])
         db.commit()
         db.refresh(db_inventory)
         return db_inventory
@@ -43,16 +92,35 @@ def create_inventory(inventory: InventoryCreate, db: Session = Depends(get_db)):
             detail="Inventory record already exists for this product and store"
         )
 
+@router.post("/bulk", response_model=InventoryBulkUpsertResult)
+def bulk_upsert_inventory_rows(payload: InventoryBulkUpsert, db: Session = Depends(get_db)):
+    """Insert or update many inventory rows keyed by SKU and store name"""
+    results = bulk_upsert_inventory(db, [row.dict() for row in payload.rows])
+    db.commit()
+
+    counts = {status: 0 for status in (INSERTED, UPDATED, SKIPPED, ERROR)}
+    for result in results:
+        counts[result['status']] += 1
+    return {
+        'inserted': counts[INSERTED],
+        'updated': counts[UPDATED],
+        'skipped': counts[SKIPPED],
+        'failed': counts[ERROR],
+        'results': results
+    }
+
 @router.get("/", response_model=List[InventoryWithDetails])
 def list_inventory(
+    response: Response,
     skip: int = Query(0, ge=0),
-    limit: int = Query(100, ge=1, le=100),
+    limit: int = Query(100, ge=1, le=MAX_CURSOR_PAGE_SIZE),
+    cursor: Optional[str] = None,
     store_id: Optional[int] = None,
     product_id: Optional[int] = None,
     low_stock: Optional[bool] = None,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
-    """List inventory with optional filtering and pagination"""
+    """List inventory with optional filtering and offset or cursor pagination"""
     query = db.query(
         Inventory,
         Product.name.label('product_name'),
@@ -66,11 +134,12 @@ def list_inventory(
     if product_id:
         query = query.filter(Inventory.product_id == product_id)
     if low_stock:
-        query = query.filter(
-            Inventory.quantity <= Inventory.reorder_point
-        )
+        query = query.filter(Inventory.is_low_stock)
     
-    results = query.offset(skip).limit(limit).all()
+    results = paginate(
+        query, Inventory.id, response, skip, limit, cursor,
+        row_id=lambda row: row[0].id
+    )
     
     return [
         InventoryWithDetails(
@@ -85,8 +154,88 @@ def list_inventory(
         for inventory, product_name, product_sku, store_name, store_location in results
     ]
 
+def _export_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+def _export_ndjson(rows):
+    batch = []
+    for row in rows:
+        batch.append(json.dumps(dict(zip(EXPORT_FIELDS, map(_export_value, row)))))
+        if len(batch) >= EXPORT_BATCH_SIZE:
+            yield "\n".join(batch) + "\n"
+            batch = []
+    if batch:
+        yield "\n".join(batch) + "\n"
+
+def _export_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    for count, row in enumerate(rows, 1):
+        writer.writerow([_export_value(value) for value in row])
+        if count % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+@router.get("/export")
+def export_inventory(
+    format: ExportFormat = ExportFormat.NDJSON,
+    store_id: Optional[int] = None,
+    product_id: Optional[int] = None,
+    db: Session = Depends(get_read_db)
+):
+    """Stream the full joined inventory view as NDJSON or CSV"""
+    query = db.query(*EXPORT_COLUMNS)\
+        .select_from(Inventory)\
+        .join(Product, Product.id == Inventory.product_id)\
+        .join(Store, Store.id == Inventory.store_id)
+    
+    if store_id:
+        query = query.filter(Inventory.store_id == store_id)
+    if product_id:
+        query = query.filter(Inventory.product_id == product_id)
+    
+    # yield_per streams from a server-side cursor, so memory stays flat
+    rows = query.order_by(Inventory.id).yield_per(EXPORT_BATCH_SIZE)
+    
+    if format == ExportFormat.CSV:
+        return StreamingResponse(
+            _export_csv(rows),
+            media_type="text/csv",
+            headers={"Content-Disposition": "attachment; filename=inventory.csv"}
+        )
+    return StreamingResponse(_export_ndjson(rows), media_type="application/x-ndjson")
+
+@router.get("/movements", response_model=List[InventoryMovementResponse])
+def list_inventory_movements(
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=MAX_CURSOR_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    store_id: Optional[int] = None,
+    product_id: Optional[int] = None,
+    movement_type: Optional[MovementType] = None,
+    db: Session = Depends(get_read_db)
+):
+    """List ledger movements not yet compacted into checkpoints, oldest first"""
+    query = db.query(InventoryMovement)
+    
+    if store_id:
+        query = query.filter(InventoryMovement.store_id == store_id)
+    if product_id:
+        query = query.filter(InventoryMovement.product_id == product_id)
+    if movement_type:
+        query = query.filter(InventoryMovement.movement_type == movement_type)
+    
+    return paginate(query, InventoryMovement.id, response, skip, limit, cursor)
+
 @router.get("/{inventory_id}", response_model=InventoryWithDetails)
-def get_inventory(inventory_id: int, db: Session = Depends(get_db)):
+def get_inventory(inventory_id: int, db: Session = Depends(get_read_db)):
     """Get a specific inventory record by ID"""
     result = db.query(
         Inventory,
@@ -117,15 +266,22 @@ def update_inventory(
     db: Session = Depends(get_db)
 ):
     """Update an inventory record"""
-    db_inventory = db.query(Inventory).filter(Inventory.id == inventory_id).first()
+    # Locked so the logged change matches the quantity it replaces
+    db_inventory = db.query(Inventory).filter(Inventory.id == inventory_id).with_for_update().first()
     if not db_inventory:
         raise HTTPException(status_code=404, detail="Inventory record not found")
 
+    before = inventory_state(db_inventory)
     update_data = inventory_update.dict(exclude_unset=True)
     for field, value in update_data.items():
         setattr(db_inventory, field, value)
     
     db_inventory.updated_at = datetime.utcnow()
+    after = inventory_state(db_inventory)
+    apply_inventory_deltas(db, [inventory_delta(
+        db_inventory.product_id, db_inventory.store_id, before, after
+    )])
+    record_movements(db, [_count_movement(db_inventory, (after.quantity or 0) - (before.quantity or 0))])
     db.commit()
     db.refresh(db_inventory)
     return db_inventory
@@ -133,10 +289,15 @@ def update_inventory(
 @router.delete("/{inventory_id}", status_code=204)
 def delete_inventory(inventory_id: int, db: Session = Depends(get_db)):
     """Delete an inventory record"""
-    db_inventory = db.query(Inventory).filter(Inventory.id == inventory_id).first()
+    # Locked so the logged change matches the quantity it replaces
+    db_inventory = db.query(Inventory).filter(Inventory.id == inventory_id).with_for_update().first()
     if not db_inventory:
         raise HTTPException(status_code=404, detail="Inventory record not found")
     
+    apply_inventory_deltas(db, [inventory_delta(
+        db_inventory.product_id, db_inventory.store_id, inventory_state(db_inventory), None
+    )])
+    record_movements(db, [_count_movement(db_inventory, -(db_inventory.quantity or 0))])
     db.delete(db_inventory)
     db.commit()
 
@@ -144,22 +305,46 @@ def delete_inventory(inventory_id: int, db: Session = Depends(get_db)):
 def restock_inventory(
     inventory_id: int,
     quantity: int = Query(..., gt=0),
+    expected_version: Optional[int] = None,
     db: Session = Depends(get_db)
 ):
     """Restock inventory with additional quantity"""
-    db_inventory = db.query(Inventory).filter(Inventory.id == inventory_id).first()
-    if not db_inventory:
+    # One atomic UPDATE, so concurrent restocks and sales never lose a change,
+    # logging a RESTOCK movement in the same statement
+    result, = adjust_inventory(db, [{
+        'inventory_id': inventory_id,
+        'quantity_change': quantity,
+        'expected_version': expected_version
+    }], restock=True)
+    if result['status'] == NOT_FOUND:
         raise HTTPException(status_code=404, detail="Inventory record not found")
-    
-    db_inventory.quantity += quantity
-    db_inventory.last_restock_at = datetime.utcnow()
-    db_inventory.updated_at = datetime.utcnow()
+    if result['status'] != APPLIED:
+        db.rollback()
+        raise HTTPException(status_code=409, detail=result['detail'])
     db.commit()
-    db.refresh(db_inventory)
-    return db_inventory
+    return result['inventory']
+
+@router.post("/adjustments", response_model=InventoryAdjustmentBatchResult)
+def adjust_inventory_quantities(payload: InventoryAdjustmentBatch, db: Session = Depends(get_db)):
+    """Apply many quantity changes atomically in one round trip.
+
+    Changes that would leave a negative quantity or fail their version
+    check are rejected individually; the rest are applied.
+    """
+    results = adjust_inventory(
+        db, [adjustment.dict() for adjustment in payload.adjustments], restock=payload.restock
+    )
+    db.commit()
+
+    applied = sum(1 for result in results if result['status'] == APPLIED)
+    return {
+        'applied': applied,
+        'rejected': len(results) - applied,
+        'results': results
+    }
 
 @router.get("/low-stock/summary", response_model=List[InventoryWithDetails])
-def get_low_stock_summary(db: Session = Depends(get_db)):
+def get_low_stock_summary(db: Session = Depends(get_read_db)):
     """Get a summary of all low stock items across all stores"""
     query = db.query(
         Inventory,
@@ -167,9 +352,7 @@ def get_low_stock_summary(db: Session = Depends(get_db)):
         Product.sku.label('product_sku'),
         Store.name.label('store_name'),
         Store.location.label('store_location')
-    ).join(Product).join(Store).filter(
-        Inventory.quantity <= Inventory.reorder_point
-    )
+    ).join(Product).join(Store).filter(Inventory.is_low_stock)
     
     results = query.all()
     
@@ -184,4 +367,24 @@ def get_low_stock_summary(db: Session = Depends(get_db)):
             }
         )
         for inventory, product_name, product_sku, store_name, store_location in results
-    ] 
\ No newline at end of file
+    ] 
+
+@router.get("/low-stock/events", response_model=List[LowStockEventResponse])
+def list_low_stock_events(
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=MAX_CURSOR_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    store_id: Optional[int] = None,
+    product_id: Optional[int] = None,
+    db: Session = Depends(get_read_db)
+):
+    """List entered/left low stock events, oldest first"""
+    query = db.query(LowStockEvent)
+    
+    if store_id:
+        query = query.filter(LowStockEvent.store_id == store_id)
+    if product_id:
+        query = query.filter(LowStockEvent.product_id == product_id)
+    
+    return paginate(query, LowStockEvent.id, response, skip, limit, cursor)
\ No newline at end of file
@@ -1,8 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from ..schemas.product import ProductCreate, ProductUpdate, ProductResponse
-from ...db.database import get_db
+from ..pagination import MAX_CURSOR_PAGE_SIZE, paginate
+from ...db.database import get_db, get_read_db
 from ...db.models import Product
 from sqlalchemy.exc import IntegrityError
 
@@ -26,13 +27,15 @@ def create_product(product: ProductCreate, db: Session = Depends(get_db)):
 
 @router.get("/", response_model=List[ProductResponse])
 def list_products(
+    response: Response,
     skip: int = Query(0, ge=0),
-    limit: int = Query(100, ge=1, le=100),
+    limit: int = Query(100, ge=1, le=MAX_CURSOR_PAGE_SIZE),
+    cursor: Optional[str] = None,
     category: Optional[str] = None,
     search: Optional[str] = None,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
-    """List products with optional filtering and pagination"""
+    """List products with optional filtering and offset or cursor pagination"""
     query = db.query(Product)
     
     if category:
@@ -45,10 +48,10 @@ def list_products(
             (Product.sku.ilike(search_filter))
         )
     
-    return query.offset(skip).limit(limit).all()
+    return paginate(query, Product.id, response, skip, limit, cursor)
 
 @router.get("/{product_id}", response_model=ProductResponse)
-def get_product(product_id: int, db: Session = Depends(get_db)):
+def get_product(product_id: int, db: Session = Depends(get_read_db)):
     """Get a specific product by ID"""
     product = db.query(Product).filter(Product.id == product_id).first()
     if not product:
@@ -1,24 +1,93 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
 from sqlalchemy import func, desc
 from typing import List, Optional
-from datetime import datetime, timedelta
+from datetime import datetime
+from collections import defaultdict
 from ..schemas.purchase_order import (
     PurchaseOrderCreate,
     PurchaseOrderUpdate,
     PurchaseOrderResponse,
+    PurchaseOrderItemResponse,
     ReorderCalculation,
     ReorderSuggestion,
+    ReorderOptimization,
+    OptimizedReorder,
+    DraftOrderGeneration,
+    DraftOrderGenerationResult,
     OrderStatus
 )
-from ...db.database import get_db
-from ...db.models import PurchaseOrder, PurchaseOrderItem, Product, Store, Inventory, SalesHistory
+from ..pagination import MAX_CURSOR_PAGE_SIZE, paginate
+from ...db.database import get_db, get_read_db
+from ...db.models import PurchaseOrder, PurchaseOrderItem, Product, Store
+from ...data.draft_orders import create_draft_orders, missing_ids
+from ...data.reorder import calculate_reorder_suggestions
+from ...data.reorder_optimizer import optimize_reorders
+from ...data.receipts import lock_purchase_order, receive_purchase_order
 
 router = APIRouter(
     prefix="/purchase-orders",
     tags=["purchase-orders"]
 )
 
+def _orders_query(db: Session):
+    """Purchase orders with their store name and total item quantity"""
+    return db.query(
+        PurchaseOrder,
+        Store.name.label('store_name'),
+        func.sum(PurchaseOrderItem.quantity).label('total_items')
+    ).join(Store).outerjoin(PurchaseOrderItem).group_by(PurchaseOrder.id, Store.name)
+
+def _load_orders(db: Session, results) -> List[PurchaseOrderResponse]:
+    """Build order responses, fetching the items of every order in one query"""
+    order_ids = [order.id for order, _, _ in results]
+    items_by_order = defaultdict(list)
+    if order_ids:
+        items = db.query(
+            PurchaseOrderItem.id,
+            PurchaseOrderItem.purchase_order_id,
+            PurchaseOrderItem.product_id,
+            PurchaseOrderItem.quantity,
+            PurchaseOrderItem.created_at,
+            PurchaseOrderItem.updated_at,
+            Product.name,
+            Product.sku
+        ).join(Product, Product.id == PurchaseOrderItem.product_id)\
+        .filter(PurchaseOrderItem.purchase_order_id.in_(order_ids))\
+        .order_by(PurchaseOrderItem.id)\
+        .all()
+        
+        for item in items:
+            items_by_order[item[1]].append(
+                PurchaseOrderItemResponse(
+                    id=item[0],
+                    purchase_order_id=item[1],
+                    product_id=item[2],
+                    quantity=item[3],
+                    created_at=item[4],
+                    updated_at=item[5],
+                    product_name=item[6],
+                    product_sku=item[7]
+                )
+            )
+    
+    return [
+        PurchaseOrderResponse(
+            id=order.id,
+            store_id=order.store_id,
+            status=order.status,
+            created_at=order.created_at,
+            updated_at=order.updated_at,
+            submitted_at=order.submitted_at,
+            approved_at=order.approved_at,
+            received_at=order.received_at,
+            store_name=store_name,
+            items=items_by_order[order.id],
+            total_items=total_items or 0
+        )
+        for order, store_name, total_items in results
+    ]
+
 @router.post("/", response_model=PurchaseOrderResponse, status_code=201)
 def create_purchase_order(order: PurchaseOrderCreate, db: Session = Depends(get_db)):
     """Create a new purchase order"""
@@ -32,175 +101,83 @@ def create_purchase_order(order: PurchaseOrderCreate, db: Session = Depends(get_
     db.add(db_order)
     db.flush()  # Get the order ID
     
+    # Verify every product exists in one query
+    missing = missing_ids(db, Product, {item.product_id for item in order.items})
+    if missing:
+        db.rollback()
+        raise HTTPException(status_code=404, detail=f"Product {missing[0]} not found")
+    
     # Create order items
-    total_items = 0
-    for item in order.items:
-        # Verify product exists
-        product = db.query(Product).filter(Product.id == item.product_id).first()
-        if not product:
-            db.rollback()
-            raise HTTPException(status_code=404, detail=f"Product {item.product_id} not found")
-        
-        db_item = PurchaseOrderItem(
+    db.add_all([
+        PurchaseOrderItem(
             purchase_order_id=db_order.id,
             product_id=item.product_id,
             quantity=item.quantity
         )
-        db.add(db_item)
-        total_items += item.quantity
+        for item in order.items
+    ])
     
     try:
         db.commit()
         # Fetch the complete order with items
-        result = db.query(
-            PurchaseOrder,
-            Store.name.label('store_name')
-        ).join(Store).filter(PurchaseOrder.id == db_order.id).first()
-        
-        order_items = db.query(
-            PurchaseOrderItem,
-            Product.name.label('product_name'),
-            Product.sku.label('product_sku')
-        ).join(Product).filter(PurchaseOrderItem.purchase_order_id == db_order.id).all()
-        
-        # Construct response
-        order_dict = result[0].__dict__
-        order_dict['store_name'] = result[1]
-        order_dict['total_items'] = total_items
-        order_dict['items'] = [
-            {
-                **item[0].__dict__,
-                'product_name': item[1],
-                'product_sku': item[2]
-            }
-            for item in order_items
-        ]
-        
-        return order_dict
+        results = _orders_query(db).filter(PurchaseOrder.id == db_order.id).all()
+        return _load_orders(db, results)[0]
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/", response_model=List[PurchaseOrderResponse])
 def list_purchase_orders(
+    response: Response,
     skip: int = Query(0, ge=0),
-    limit: int = Query(100, ge=1, le=100),
+    limit: int = Query(100, ge=1, le=MAX_CURSOR_PAGE_SIZE),
+    cursor: Optional[str] = None,
     store_id: Optional[int] = None,
     status: Optional[OrderStatus] = None,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
-    """List purchase orders with optional filtering"""
-    query = db.query(
-        PurchaseOrder,
-        Store.name.label('store_name'),
-        func.sum(PurchaseOrderItem.quantity).label('total_items')
-    ).join(Store).outerjoin(PurchaseOrderItem).group_by(PurchaseOrder.id, Store.name)
+    """List purchase orders with optional filtering and offset or cursor pagination"""
+    query = _orders_query(db)
     
     if store_id:
         query = query.filter(PurchaseOrder.store_id == store_id)
     if status:
         query = query.filter(PurchaseOrder.status == status)
     
-    results = query.offset(skip).limit(limit).all()
-    
-    orders = []
-    for order, store_name, total_items in results:
-        # Fetch items for each order
-        items = db.query(
-            PurchaseOrderItem,
-            Product.name.label('product_name'),
-            Product.sku.label('product_sku')
-        ).join(Product).filter(PurchaseOrderItem.purchase_order_id == order.id).all()
-        
-        order_dict = order.__dict__
-        order_dict['store_name'] = store_name
-        order_dict['total_items'] = total_items or 0
-        order_dict['items'] = [
-            {
-                **item[0].__dict__,
-                'product_name': item[1],
-                'product_sku': item[2]
-            }
-            for item in items
-        ]
-        orders.append(order_dict)
-    
-    return orders
+    results = paginate(
+        query, PurchaseOrder.id, response, skip, limit, cursor,
+        row_id=lambda row: row[0].id
+    )
+    return _load_orders(db, results)
 
 @router.get("/{order_id}", response_model=PurchaseOrderResponse)
-def get_purchase_order(order_id: int, db: Session = Depends(get_db)):
+def get_purchase_order(order_id: int, db: Session = Depends(get_read_db)):
     """Get a specific purchase order"""
-    result = db.query(
-        PurchaseOrder,
-        Store.name.label('store_name'),
-        func.sum(PurchaseOrderItem.quantity).label('total_items')
-    ).join(Store).outerjoin(PurchaseOrderItem).filter(
-        PurchaseOrder.id == order_id
-    ).group_by(PurchaseOrder.id, Store.name).first()
+    results = _orders_query(db).filter(PurchaseOrder.id == order_id).all()
     
-    if not result:
+    if not results:
         raise HTTPException(status_code=404, detail="Purchase order not found")
     
-    order, store_name, total_items = result
-    
-    # Fetch items
-    items = db.query(
-        PurchaseOrderItem,
-        Product.name.label('product_name'),
-        Product.sku.label('product_sku')
-    ).join(Product).filter(PurchaseOrderItem.purchase_order_id == order_id).all()
-    
-    order_dict = order.__dict__
-    order_dict['store_name'] = store_name
-    order_dict['total_items'] = total_items or 0
-    order_dict['items'] = [
-        {
-            **item[0].__dict__,
-            'product_name': item[1],
-            'product_sku': item[2]
-        }
-        for item in items
-    ]
-    
-    return order_dict
+    return _load_orders(db, results)[0]
 
 @router.put("/{order_id}", response_model=PurchaseOrderResponse)
 def update_purchase_order(order_id: int, order_update: PurchaseOrderUpdate, db: Session = Depends(get_db)):
     """Update a purchase order's status"""
-    db_order = db.query(PurchaseOrder).filter(PurchaseOrder.id == order_id).first()
+    # Locked so concurrent updates, and receipts in particular, run one at a time
+    db_order = lock_purchase_order(db, order_id)
     if not db_order:
         raise HTTPException(status_code=404, detail="Purchase order not found")
     
-    if order_update.status:
+    if order_update.status == OrderStatus.RECEIVED:
+        # Adds the items to inventory in one set-based statement, only once
+        receive_purchase_order(db, db_order)
+    elif order_update.status:
         # Update status and corresponding timestamp
         db_order.status = order_update.status
         if order_update.status == OrderStatus.SUBMITTED:
             db_order.submitted_at = datetime.utcnow()
         elif order_update.status == OrderStatus.APPROVED:
             db_order.approved_at = datetime.utcnow()
-        elif order_update.status == OrderStatus.RECEIVED:
-            db_order.received_at = datetime.utcnow()
-            # Update inventory when order is received
-            items = db.query(PurchaseOrderItem).filter(
-                PurchaseOrderItem.purchase_order_id == order_id
-            ).all()
-            for item in items:
-                inventory = db.query(Inventory).filter(
-                    Inventory.product_id == item.product_id,
-                    Inventory.store_id == db_order.store_id
-                ).first()
-                if inventory:
-                    inventory.quantity += item.quantity
-                    inventory.last_restock_at = datetime.utcnow()
-                else:
-                    # Create new inventory record if it doesn't exist
-                    new_inventory = Inventory(
-                        product_id=item.product_id,
-                        store_id=db_order.store_id,
-                        quantity=item.quantity,
-                        last_restock_at=datetime.utcnow()
-                    )
-                    db.add(new_inventory)
     
     db.commit()
     db.refresh(db_order)
@@ -211,54 +188,75 @@ def update_purchase_order(order_id: int, order_update: PurchaseOrderUpdate, db:
 @router.post("/calculate-reorder", response_model=List[ReorderSuggestion])
 def calculate_reorder(calculation: ReorderCalculation, db: Session = Depends(get_db)):
     """Calculate reorder quantities based on sales history"""
-    # Base query for inventory
-    query = db.query(
-        Inventory,
-        Product.name.label('product_name'),
-        Product.sku.label('product_sku'),
-        Store.name.label('store_name')
-    ).join(Product).join(Store)
-    
-    # Apply filters
-    if calculation.store_id:
-        query = query.filter(Inventory.store_id == calculation.store_id)
-    if calculation.product_id:
-        query = query.filter(Inventory.product_id == calculation.product_id)
-    
-    inventory_records = query.all()
-    suggestions = []
-    
-    for inv, prod_name, prod_sku, store_name in inventory_records:
-        # Get sales history for the specified period
-        end_date = datetime.utcnow()
-        start_date = end_date - timedelta(days=calculation.days_of_sales)
-        
-        sales = db.query(func.sum(SalesHistory.quantity_sold).label('total_sales')).filter(
-            SalesHistory.product_id == inv.product_id,
-            SalesHistory.store_id == inv.store_id,
-            SalesHistory.sale_date.between(start_date, end_date)
-        ).scalar()
-        
-        total_sales = sales or 0
-        avg_daily_sales = total_sales / calculation.days_of_sales if total_sales > 0 else 0
-        
-        # Calculate suggested order quantity
-        suggested_order = max(0, total_sales - inv.quantity)
-        
-        if suggested_order > 0:  # Only include items that need reordering
-            suggestions.append(
-                ReorderSuggestion(
-                    product_id=inv.product_id,
-                    product_name=prod_name,
-                    product_sku=prod_sku,
-                    store_id=inv.store_id,
-                    store_name=store_name,
-                    current_quantity=inv.quantity,
-                    suggested_order=suggested_order,
-                    days_of_sales=calculation.days_of_sales,
-                    total_sales=total_sales,
-                    average_daily_sales=avg_daily_sales
-                )
+    suggestions = calculate_reorder_suggestions(
+        db,
+        calculation.days_of_sales,
+        store_id=calculation.store_id,
+        product_id=calculation.product_id,
+        use_forecasts=calculation.use_forecasts
+    )
+    return [ReorderSuggestion(**suggestion) for suggestion in suggestions]
+
+@router.post("/optimize-reorder", response_model=List[OptimizedReorder])
+def optimize_reorder(optimization: ReorderOptimization, db: Session = Depends(get_db)):
+    """Optimize reorder points and quantities from demand, lead times and open orders"""
+    suggestions = optimize_reorders(
+        db,
+        store_id=optimization.store_id,
+        product_id=optimization.product_id,
+        window_days=optimization.window_days,
+        lead_time_days=optimization.lead_time_days,
+        service_level=optimization.service_level,
+        cycle_days=optimization.cycle_days,
+        use_forecasts=optimization.use_forecasts,
+        apply=optimization.apply
+    )
+    if optimization.apply:
+        db.commit()
+    return [OptimizedReorder(**suggestion) for suggestion in suggestions]
+
+@router.post("/generate-drafts", response_model=DraftOrderGenerationResult, status_code=201)
+def generate_draft_orders(generation: DraftOrderGeneration, db: Session = Depends(get_db)):
+    """Create one draft order per store from explicit lines or a reorder run"""
+    if generation.lines is not None:
+        lines = [(line.store_id, line.product_id, line.quantity) for line in generation.lines]
+    elif generation.calculation is not None:
+        calculation = generation.calculation
+        lines = [
+            (suggestion['store_id'], suggestion['product_id'], suggestion['suggested_order'])
+            for suggestion in calculate_reorder_suggestions(
+                db,
+                calculation.days_of_sales,
+                store_id=calculation.store_id,
+                product_id=calculation.product_id,
+                use_forecasts=calculation.use_forecasts
             )
-    
-    return sorted(suggestions, key=lambda x: x.suggested_order, reverse=True) 
\ No newline at end of file
+        ]
+    else:
+        optimization = generation.optimization
+        lines = [
+            (suggestion['store_id'], suggestion['product_id'], suggestion['suggested_order'])
+            for suggestion in optimize_reorders(
+                db,
+                store_id=optimization.store_id,
+                product_id=optimization.product_id,
+                window_days=optimization.window_days,
+                lead_time_days=optimization.lead_time_days,
+                service_level=optimization.service_level,
+                cycle_days=optimization.cycle_days,
+                use_forecasts=optimization.use_forecasts,
+                apply=optimization.apply
+            )
+        ]
+
+    try:
+        orders = create_draft_orders(db, lines)
+    except LookupError as e:
+        db.rollback()
+        raise HTTPException(status_code=404, detail=str(e))
+    db.commit()
+    return DraftOrderGenerationResult(
+        orders_created=len(orders),
+        lines_created=sum(order['line_count'] for order in orders),
+        orders=orders
+    )
\ No newline at end of file
@@ -0,0 +1,31 @@
+from fastapi import APIRouter, Depends, Request
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+import tempfile
+from ..schemas.sales import SalesFormat, SalesIngestResult
+from ...db.database import get_db
+from ...data.sales_ingest import ingest_sales_file, open_sales_stream
+
+router = APIRouter(
+    prefix="/sales",
+    tags=["sales"]
+)
+
+@router.post("/ingest", response_model=SalesIngestResult)
+async def ingest_sales(
+    request: Request,
+    format: SalesFormat = SalesFormat.CSV,
+    db: Session = Depends(get_db)
+):
+    """Bulk-load POS sale lines streamed as a CSV or NDJSON request body"""
+    # Spool the upload to disk so the body is never held in memory, then
+    # run the blocking COPY pipeline off the event loop.
+    with tempfile.TemporaryFile() as upload:
+        async for chunk in request.stream():
+            upload.write(chunk)
+        upload.seek(0)
+        stream = open_sales_stream(upload)
+        try:
+            return await run_in_threadpool(ingest_sales_file, db, stream, format.value)
+        finally:
+            stream.detach()
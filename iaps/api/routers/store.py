@@ -1,10 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 from typing import List, Optional
 from ..schemas.store import StoreCreate, StoreUpdate, StoreResponse, StoreWithInventoryCount
-from ...db.database import get_db
+from ..pagination import MAX_CURSOR_PAGE_SIZE, paginate
+from ...db.database import get_db, get_read_db
 from ...db.models import Store, Inventory
+from ...data.rollups import refresh_region_rollups
 from sqlalchemy.exc import IntegrityError
 
 router = APIRouter(
@@ -27,13 +29,15 @@ def create_store(store: StoreCreate, db: Session = Depends(get_db)):
 
 @router.get("/", response_model=List[StoreResponse])
 def list_stores(
+    response: Response,
     skip: int = Query(0, ge=0),
-    limit: int = Query(100, ge=1, le=100),
+    limit: int = Query(100, ge=1, le=MAX_CURSOR_PAGE_SIZE),
+    cursor: Optional[str] = None,
     region: Optional[str] = None,
     search: Optional[str] = None,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
-    """List stores with optional filtering and pagination"""
+    """List stores with optional filtering and offset or cursor pagination"""
     query = db.query(Store)
     
     if region:
@@ -45,12 +49,12 @@ def list_stores(
             (Store.location.ilike(search_filter))
         )
     
-    return query.offset(skip).limit(limit).all()
+    return paginate(query, Store.id, response, skip, limit, cursor)
 
 @router.get("/stats", response_model=List[StoreWithInventoryCount])
 def get_stores_with_stats(
     region: Optional[str] = None,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Get stores with their inventory statistics"""
     query = db.query(
@@ -76,7 +80,7 @@ def get_stores_with_stats(
     ]
 
 @router.get("/{store_id}", response_model=StoreResponse)
-def get_store(store_id: int, db: Session = Depends(get_db)):
+def get_store(store_id: int, db: Session = Depends(get_read_db)):
     """Get a specific store by ID"""
     store = db.query(Store).filter(Store.id == store_id).first()
     if not store:
@@ -84,7 +88,7 @@ def get_store(store_id: int, db: Session = Depends(get_db)):
     return store
 
 @router.get("/{store_id}/stats", response_model=StoreWithInventoryCount)
-def get_store_stats(store_id: int, db: Session = Depends(get_db)):
+def get_store_stats(store_id: int, db: Session = Depends(get_read_db)):
     """Get a specific store's statistics"""
     result = db.query(
         Store,
@@ -117,8 +121,12 @@ def update_store(
 
     update_data = store_update.dict(exclude_unset=True)
     try:
+        region_changed = 'region' in update_data and update_data['region'] != db_store.region
         for field, value in update_data.items():
             setattr(db_store, field, value)
+        if region_changed:
+            db.flush()
+            refresh_region_rollups(db)
         db.commit()
         db.refresh(db_store)
         return db_store
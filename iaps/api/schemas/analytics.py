@@ -1,6 +1,7 @@
 from pydantic import BaseModel
 from typing import List, Dict, Optional
 from datetime import datetime
+from enum import Enum
 
 class ProductPerformance(BaseModel):
     """Schema for product performance metrics"""
@@ -58,6 +59,10 @@ class LowStockPrediction(BaseModel):
     predicted_days_until_reorder: float
     confidence_score: float
     recommended_restock_date: datetime
+    daily_demand: Optional[float] = None
+    demand_model: Optional[str] = None
+    days_until_reorder_lower: Optional[float] = None
+    days_until_reorder_upper: Optional[float] = None
 
 class AnalyticsSummary(BaseModel):
     """Schema for overall analytics summary"""
@@ -70,8 +75,8 @@ class AnalyticsSummary(BaseModel):
     critical_products: List[str]
     regional_distribution: Dict[str, int]
 
-class TimeRange(str):
-    """Time range options for trend analysis"""
+class TimeRange(str, Enum):
+    """Time range options for trend analysis, also the bucket granularity"""
     DAY = "day"
     WEEK = "week"
     MONTH = "month"
@@ -82,6 +87,9 @@ class InventoryTrendPoint(BaseModel):
     quantity: int
     restock_count: int
     low_stock_count: int
+    sum_quantity: Optional[int] = None
+    min_quantity: Optional[int] = None
+    max_quantity: Optional[int] = None
 
 class ProductTrend(BaseModel):
     """Schema for product-specific trends"""
@@ -1,6 +1,7 @@
-from pydantic import BaseModel, conint
-from typing import Optional
+from pydantic import BaseModel, conint, validator
+from typing import List, Optional
 from datetime import datetime
+from enum import Enum
 
 class InventoryBase(BaseModel):
     """Base schema for Inventory shared properties"""
@@ -26,6 +27,8 @@ class InventoryResponse(InventoryBase):
     created_at: datetime
     updated_at: Optional[datetime] = None
     last_restock_at: Optional[datetime] = None
+    is_low_stock: bool = False
+    version: int = 1
 
     class Config:
         """Configure Pydantic to handle ORM objects"""
@@ -36,4 +39,107 @@ class InventoryWithDetails(InventoryResponse):
     product_name: str
     product_sku: str
     store_name: str
-    store_location: str 
\ No newline at end of file
+    store_location: str
+
+class LowStockTransition(str, Enum):
+    ENTERED = "entered"
+    LEFT = "left"
+
+class LowStockEventResponse(BaseModel):
+    """Schema for a product/store pair entering or leaving low stock"""
+    id: int
+    product_id: int
+    store_id: int
+    transition: LowStockTransition
+    created_at: datetime
+
+    class Config:
+        """Configure Pydantic to handle ORM objects"""
+        orm_mode = True
+
+class MovementType(str, Enum):
+    RECEIPT = "receipt"
+    RESTOCK = "restock"
+    ADJUSTMENT = "adjustment"
+    SALE = "sale"
+    COUNT = "count"
+
+class InventoryMovementResponse(BaseModel):
+    """Schema for one entry of the inventory movement ledger"""
+    id: int
+    product_id: int
+    store_id: int
+    movement_type: MovementType
+    quantity_change: int
+    purchase_order_id: Optional[int] = None
+    reference: Optional[str] = None
+    created_at: datetime
+
+    class Config:
+        """Configure Pydantic to handle ORM objects"""
+        orm_mode = True
+
+class ExportFormat(str, Enum):
+    """Output formats for the streaming inventory export"""
+    NDJSON = "ndjson"
+    CSV = "csv"
+
+class InventoryBulkRow(BaseModel):
+    """Schema for one row of a bulk inventory upsert, keyed by SKU and store name"""
+    sku: str
+    store: str
+    quantity: conint(ge=0)
+    reorder_point: Optional[conint(ge=0)] = None
+    reorder_quantity: Optional[conint(ge=0)] = None
+
+class InventoryBulkUpsert(BaseModel):
+    """Schema for a bulk inventory upsert request"""
+    rows: List[InventoryBulkRow]
+
+class InventoryBulkRowResult(BaseModel):
+    """Schema for the outcome of one bulk upsert row"""
+    index: int
+    status: str
+    inventory_id: Optional[int] = None
+    detail: Optional[str] = None
+
+class InventoryBulkUpsertResult(BaseModel):
+    """Schema for bulk inventory upsert responses"""
+    inserted: int
+    updated: int
+    skipped: int
+    failed: int
+    results: List[InventoryBulkRowResult]
+
+class InventoryAdjustment(BaseModel):
+    """Schema for one atomic quantity change"""
+    inventory_id: int
+    quantity_change: int
+    expected_version: Optional[int] = None  # Rejected if the row has changed since
+    movement_type: Optional[MovementType] = None  # Logged as an adjustment unless given
+    reference: Optional[str] = None  # e.g. a POS transaction or count sheet id
+
+    @validator('movement_type')
+    def manual_movement(cls, value):
+        if value not in (None, MovementType.ADJUSTMENT, MovementType.SALE):
+            raise ValueError("Only adjustment and sale movements can be posted directly")
+        return value
+
+class InventoryAdjustmentBatch(BaseModel):
+    """Schema for a batch of quantity changes applied in one round trip"""
+    adjustments: List[InventoryAdjustment]
+    restock: bool = False  # Log as restocks and stamp last_restock_at on every applied row
+
+class InventoryAdjustmentResult(BaseModel):
+    """Schema for the outcome of one adjustment"""
+    index: int
+    status: str
+    inventory_id: int
+    inventory: Optional[InventoryResponse] = None
+    detail: Optional[str] = None
+
+class InventoryAdjustmentBatchResult(BaseModel):
+    """Schema for batched adjustment responses"""
+    applied: int
+    rejected: int
+    results: List[InventoryAdjustmentResult]
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, conint
+from pydantic import BaseModel, confloat, conint, root_validator
 from typing import List, Optional
 from datetime import datetime
 from enum import Enum
@@ -64,6 +64,7 @@ class ReorderCalculation(BaseModel):
     days_of_sales: int
     store_id: Optional[int]
     product_id: Optional[int]
+    use_forecasts: bool = False
 
 class ReorderSuggestion(BaseModel):
     """Schema for reorder suggestion response"""
@@ -76,4 +77,67 @@ class ReorderSuggestion(BaseModel):
     suggested_order: int
     days_of_sales: int
     total_sales: int
-    average_daily_sales: float 
\ No newline at end of file
+    average_daily_sales: float 
+
+class ReorderOptimization(BaseModel):
+    """Schema for reorder policy optimization request"""
+    store_id: Optional[int]
+    product_id: Optional[int]
+    window_days: conint(ge=7, le=365) = 90
+    lead_time_days: confloat(gt=0) = 7.0  # Used where no received orders give a lead time
+    service_level: confloat(gt=0.5, lt=1) = 0.95
+    cycle_days: conint(ge=1) = 14
+    use_forecasts: bool = False
+    apply: bool = False  # Write the optimized reorder settings back
+
+class OptimizedReorder(BaseModel):
+    """Schema for an optimized reorder policy"""
+    product_id: int
+    product_name: str
+    product_sku: str
+    store_id: int
+    store_name: str
+    current_quantity: int
+    on_order: int
+    daily_demand: float
+    demand_std: float
+    lead_time_days: float
+    safety_stock: float
+    current_reorder_point: Optional[int]
+    current_reorder_quantity: Optional[int]
+    reorder_point: int
+    reorder_quantity: int
+    order_up_to: int
+    suggested_order: int
+
+class DraftOrderLine(BaseModel):
+    """Schema for one line of a draft order run"""
+    store_id: int
+    product_id: int
+    quantity: conint(gt=0)
+
+class DraftOrderGeneration(BaseModel):
+    """Schema for generating draft orders from explicit lines or a reorder run"""
+    lines: Optional[List[DraftOrderLine]]
+    calculation: Optional[ReorderCalculation]
+    optimization: Optional[ReorderOptimization]
+
+    @root_validator
+    def one_source(cls, values):
+        sources = [name for name in ('lines', 'calculation', 'optimization') if values.get(name) is not None]
+        if len(sources) != 1:
+            raise ValueError("Provide exactly one of lines, calculation or optimization")
+        return values
+
+class DraftOrderSummary(BaseModel):
+    """Schema for a generated draft order"""
+    id: int
+    store_id: int
+    line_count: int
+    total_items: int
+
+class DraftOrderGenerationResult(BaseModel):
+    """Schema for draft order generation results"""
+    orders_created: int
+    lines_created: int
+    orders: List[DraftOrderSummary]
\ No newline at end of file
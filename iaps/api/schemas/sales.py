@@ -0,0 +1,16 @@
+from pydantic import BaseModel
+from enum import Enum
+
+class SalesFormat(str, Enum):
+    """Accepted input formats for bulk sales ingestion"""
+    CSV = "csv"
+    NDJSON = "ndjson"
+
+class SalesIngestResult(BaseModel):
+    """Schema for bulk sales ingestion results"""
+    read: int
+    inserted: int
+    duplicates: int
+    rejected: int
+    seconds: float
+    rows_per_second: int
@@ -0,0 +1,212 @@
+"""Atomic inventory quantity adjustments.
+
+Quantities are never read into Python and written back. A batch of
+adjustments is applied by one statement per chunk::
+
+    WITH adjustments AS (VALUES ...),
+         locked AS (SELECT ... FROM inventory JOIN adjustments ...
+                    ORDER BY inventory.id FOR UPDATE),
+         updated AS (UPDATE inventory SET quantity = inventory.quantity + adjustments.quantity_change
+                     FROM adjustments JOIN locked ...
+                     WHERE inventory.quantity + adjustments.quantity_change >= 0
+                       AND (adjustments.expected_version IS NULL
+                            OR inventory.version = adjustments.expected_version)
+                     RETURNING ...),
+         logged AS (INSERT INTO inventory_movements SELECT ... FROM updated JOIN movements ...)
+    SELECT * FROM updated
+
+Concurrent restocks and sales on the same row serialize on its row lock and
+each adds its own change to the latest quantity, so none is lost. Locks are
+taken in id order, so overlapping batches queue instead of deadlocking.
+Changes that would take a quantity below zero, or whose
+``expected_version`` no longer matches (``inventory.version`` is bumped by a
+trigger on every update), are rejected individually and leave the row
+untouched. Every applied change is logged to the movement ledger by the same
+statement, so the ledger can never miss or invent a change.
+
+A batch that changes one row several times is applied in rounds: the n-th
+change of every row goes in round n, so each change is checked on its own
+against the quantity left by the ones before it, in input order. A batch
+without repeated rows is a single round.
+"""
+from collections import Counter
+from typing import Dict, List, Optional, Sequence
+
+from sqlalchemy import Integer, String, cast, column, func, insert, or_, select, update, values
+from sqlalchemy.orm import Session
+
+from ..db.models import Inventory, InventoryMovement, MovementType
+from .rollups import InventoryState, apply_inventory_deltas, inventory_delta
+
+ADJUSTMENT_BATCH_SIZE = 5000
+
+APPLIED = "applied"
+NOT_FOUND = "not_found"
+INSUFFICIENT_STOCK = "insufficient_stock"
+VERSION_CONFLICT = "version_conflict"
+
+inventory_table = Inventory.__table__
+movement_table = InventoryMovement.__table__
+
+
+def _log_movements(updated, movements: List):
+    """INSERT of one ledger movement per input adjustment of every updated row"""
+    changes = select(values(
+        column('inventory_id', Integer),
+        column('movement_type', String),
+        column('quantity_change', Integer),
+        column('reference', String),
+        name='logged_changes'
+    ).data(movements)).cte('movements')
+
+    return insert(movement_table).from_select(
+        ['product_id', 'store_id', 'movement_type', 'quantity_change', 'reference'],
+        select(
+            updated.c.product_id,
+            updated.c.store_id,
+            cast(changes.c.movement_type, movement_table.c.movement_type.type),
+            changes.c.quantity_change,
+            changes.c.reference
+        ).join_from(updated, changes, changes.c.inventory_id == updated.c.id)
+    ).cte('logged')
+
+
+def _adjust_chunk(db: Session, chunk: List, movements: List, restock: bool) -> Dict[int, Dict]:
+    adjustments = select(values(
+        column('inventory_id', Integer),
+        column('quantity_change', Integer),
+        column('expected_version', Integer),
+        name='changes'
+    ).data(chunk)).cte('adjustments')
+    # An all-NULL VALUES column is typed text
+    expected_version = cast(adjustments.c.expected_version, Integer)
+
+    locked = select(inventory_table.c.id)\
+        .join(adjustments, adjustments.c.inventory_id == inventory_table.c.id)\
+        .order_by(inventory_table.c.id)\
+        .with_for_update(of=inventory_table)\
+        .cte('locked')
+
+    updated = update(inventory_table)\
+        .where(
+            inventory_table.c.id == adjustments.c.inventory_id,
+            locked.c.id == inventory_table.c.id,
+            inventory_table.c.quantity + adjustments.c.quantity_change >= 0,
+            or_(expected_version.is_(None), inventory_table.c.version == expected_version)
+        )\
+        .values(
+            quantity=inventory_table.c.quantity + adjustments.c.quantity_change,
+            last_restock_at=func.now() if restock else inventory_table.c.last_restock_at,
+            updated_at=func.now()
+        )\
+        .returning(*inventory_table.c, adjustments.c.quantity_change)\
+        .cte('updated')
+
+    statement = select(updated)
+    if movements:
+        statement = statement.add_cte(_log_movements(updated, movements))
+
+    restocks = Counter(movement[0] for movement in movements) if restock else Counter()
+    applied = {}
+    deltas = []
+    for row in db.execute(statement).mappings():
+        row = dict(row)
+        change = row.pop('quantity_change')
+        applied[row['id']] = row
+        deltas.append(inventory_delta(
+            row['product_id'],
+            row['store_id'],
+            InventoryState(row['quantity'] - change, row['reorder_point']),
+            InventoryState(row['quantity'], row['reorder_point']),
+            restocks=restocks[row['id']]
+        ))
+    apply_inventory_deltas(db, deltas)
+    return applied
+
+
+def _rejection(current: Optional[Dict], expected_version: Optional[int]) -> Dict:
+    if current is None:
+        return {'status': NOT_FOUND, 'detail': "Inventory record not found"}
+    if expected_version is not None and current['version'] != expected_version:
+        return {'status': VERSION_CONFLICT, 'detail': f"Current version is {current['version']}"}
+    return {'status': INSUFFICIENT_STOCK, 'detail': f"Only {current['quantity']} in stock"}
+
+
+def _movement(adjustment: Dict, restock: bool):
+    movement_type = MovementType.RESTOCK if restock else MovementType(
+        adjustment.get('movement_type') or MovementType.ADJUSTMENT
+    )
+    return (
+        adjustment['inventory_id'],
+        movement_type.name,
+        adjustment['quantity_change'],
+        adjustment.get('reference')
+    )
+
+
+def adjust_inventory(
+    db: Session,
+    adjustments: Sequence[Dict],
+    restock: bool = False,
+    batch_size: int = ADJUSTMENT_BATCH_SIZE
+) -> List[Dict]:
+    """Apply (inventory_id, quantity_change[, expected_version, movement_type, reference]) adjustments.
+
+    Each change is applied, or rejected, on its own; changes to the same
+    row are applied in input order, each seeing the ones before it. Every
+    applied change is logged as its own movement (ADJUSTMENT unless a
+    movement_type is given). With ``restock`` every applied row's
+    ``last_restock_at`` is set and its changes are logged as RESTOCK
+    movements. Returns one outcome per input, in input order, with the
+    row's state after that change when applied. The caller commits.
+    """
+    rounds = []
+    occurrences = Counter()
+    for index, adjustment in enumerate(adjustments):
+        occurrence = occurrences[adjustment['inventory_id']]
+        occurrences[adjustment['inventory_id']] += 1
+        if occurrence == len(rounds):
+            rounds.append([])
+        rounds[occurrence].append(index)
+
+    results = [None] * len(adjustments)
+    for indexes in rounds:
+        # Locks are taken in id order; later rounds only touch rows the
+        # first one already locked
+        indexes = sorted(indexes, key=lambda index: adjustments[index]['inventory_id'])
+        applied = {}
+        for start in range(0, len(indexes), batch_size):
+            chunk = [adjustments[index] for index in indexes[start:start + batch_size]]
+            rows = [
+                (adjustment['inventory_id'], adjustment['quantity_change'], adjustment.get('expected_version'))
+                for adjustment in chunk
+            ]
+            movements = [_movement(adjustment, restock) for adjustment in chunk if adjustment['quantity_change']]
+            applied.update(_adjust_chunk(db, rows, movements, restock))
+
+        rejected = [
+            adjustments[index]['inventory_id'] for index in indexes
+            if adjustments[index]['inventory_id'] not in applied
+        ]
+        current = {}
+        if rejected:
+            current = {
+                row.id: {'quantity': row.quantity, 'version': row.version}
+                for row in db.query(Inventory.id, Inventory.quantity, Inventory.version)
+                .filter(Inventory.id.in_(rejected))
+            }
+
+        for index in indexes:
+            adjustment = adjustments[index]
+            inventory_id = adjustment['inventory_id']
+            row = applied.get(inventory_id)
+            if row is not None:
+                outcome = {'status': APPLIED, 'inventory_id': inventory_id, 'inventory': row}
+            else:
+                outcome = dict(
+                    _rejection(current.get(inventory_id), adjustment.get('expected_version')),
+                    inventory_id=inventory_id,
+                    inventory=None
+                )
+            results[index] = dict(outcome, index=index)
+    return results
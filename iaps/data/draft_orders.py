@@ -0,0 +1,74 @@
+"""Bulk creation of draft purchase orders from reorder suggestions.
+
+A reorder run yields (store, product, quantity) lines for any number of
+stores. They are grouped into one DRAFT purchase order per store, every
+referenced store and product is validated with one query apiece, and the
+orders and their items are written with multi-row inserts in the caller's
+transaction, so thousands of stores cost a handful of round trips.
+"""
+from collections import defaultdict
+from typing import Dict, Iterable, List, Set, Tuple
+
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from ..db.models import OrderStatus, Product, PurchaseOrder, PurchaseOrderItem, Store
+
+DRAFT_INSERT_BATCH = 5000
+
+
+def missing_ids(db: Session, model, ids: Set[int]) -> List[int]:
+    """The ``ids`` without a row in ``model``'s table, in one query"""
+    if not ids:
+        return []
+    found = {row[0] for row in db.query(model.id).filter(model.id.in_(ids))}
+    return sorted(ids - found)
+
+
+def create_draft_orders(db: Session, lines: Iterable[Tuple[int, int, int]]) -> List[Dict]:
+    """Create one DRAFT order per store from (store_id, product_id, quantity) lines.
+
+    Repeated (store, product) lines are merged and non-positive quantities
+    dropped. Raises LookupError naming unknown stores or products before
+    anything is written. Returns a summary per order; the caller commits.
+    """
+    quantities = defaultdict(lambda: defaultdict(int))
+    for store_id, product_id, quantity in lines:
+        if quantity > 0:
+            quantities[store_id][product_id] += quantity
+
+    missing_stores = missing_ids(db, Store, set(quantities))
+    if missing_stores:
+        raise LookupError(f"Stores not found: {', '.join(map(str, missing_stores))}")
+    missing_products = missing_ids(db, Product, {
+        product_id for items in quantities.values() for product_id in items
+    })
+    if missing_products:
+        raise LookupError(f"Products not found: {', '.join(map(str, missing_products))}")
+
+    store_ids = sorted(quantities)
+    order_ids = {}
+    for start in range(0, len(store_ids), DRAFT_INSERT_BATCH):
+        statement = insert(PurchaseOrder).values([
+            {'store_id': store_id, 'status': OrderStatus.DRAFT}
+            for store_id in store_ids[start:start + DRAFT_INSERT_BATCH]
+        ]).returning(PurchaseOrder.id, PurchaseOrder.store_id)
+        order_ids.update((store_id, order_id) for order_id, store_id in db.execute(statement))
+
+    items = [
+        {'purchase_order_id': order_ids[store_id], 'product_id': product_id, 'quantity': quantity}
+        for store_id in store_ids
+        for product_id, quantity in sorted(quantities[store_id].items())
+    ]
+    for start in range(0, len(items), DRAFT_INSERT_BATCH):
+        db.execute(insert(PurchaseOrderItem).values(items[start:start + DRAFT_INSERT_BATCH]))
+
+    return [
+        {
+            'id': order_ids[store_id],
+            'store_id': store_id,
+            'line_count': len(quantities[store_id]),
+            'total_items': sum(quantities[store_id].values())
+        }
+        for store_id in store_ids
+    ]
@@ -0,0 +1,137 @@
+"""Bulk inventory upserts for the daily iQmetrix pull.
+
+Rows are keyed by (SKU, store name). Each chunk resolves its SKUs and stores
+with one lookup query apiece and is then written with a single
+``INSERT ... ON CONFLICT (product_id, store_id) DO UPDATE``. Existing rows
+in the chunk are locked in key order first so their previous state can be
+folded into the analytics rollups and every quantity change logged to the
+movement ledger as a stock count.
+"""
+from typing import Dict, List, Sequence
+
+from sqlalchemy import func, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from ..db.models import Inventory, MovementType, Product, Store
+from .ledger import record_movements
+from .rollups import InventoryState, apply_inventory_deltas, inventory_delta
+
+UPSERT_CHUNK_SIZE = 5000
+
+INSERTED = "inserted"
+UPDATED = "updated"
+SKIPPED = "skipped"
+ERROR = "error"
+
+
+def _upsert_chunk(db: Session, values: Dict, results: List[Dict]) -> None:
+    keys = sorted(values)
+
+    existing = {
+        (product_id, store_id): InventoryState(quantity, reorder_point)
+        for product_id, store_id, quantity, reorder_point in db.query(
+            Inventory.product_id,
+            Inventory.store_id,
+            Inventory.quantity,
+            Inventory.reorder_point
+        ).filter(tuple_(Inventory.product_id, Inventory.store_id).in_(keys))
+        .order_by(Inventory.product_id, Inventory.store_id)
+        .with_for_update()
+    }
+
+    statement = insert(Inventory).values([values[key][1] for key in keys])
+    # Reorder settings missing from the feed keep their current values
+    statement = statement.on_conflict_do_update(
+        index_elements=['product_id', 'store_id'],
+        set_={
+            'quantity': statement.excluded.quantity,
+            'reorder_point': func.coalesce(statement.excluded.reorder_point, Inventory.reorder_point),
+            'reorder_quantity': func.coalesce(statement.excluded.reorder_quantity, Inventory.reorder_quantity),
+            'updated_at': func.now()
+        }
+    ).returning(
+        Inventory.id,
+        Inventory.product_id,
+        Inventory.store_id,
+        Inventory.quantity,
+        Inventory.reorder_point
+    )
+
+    deltas = []
+    movements = []
+    for inventory_id, product_id, store_id, quantity, reorder_point in db.execute(statement):
+        key = (product_id, store_id)
+        before = existing.get(key)
+        index = values[key][0]
+        results[index] = {
+            'index': index,
+            'status': UPDATED if before else INSERTED,
+            'inventory_id': inventory_id
+        }
+        after = InventoryState(quantity, reorder_point)
+        deltas.append(inventory_delta(product_id, store_id, before, after))
+        movements.append({
+            'product_id': product_id,
+            'store_id': store_id,
+            'movement_type': MovementType.COUNT,
+            'quantity_change': (after.quantity or 0) - ((before.quantity or 0) if before else 0)
+        })
+    apply_inventory_deltas(db, deltas)
+    record_movements(db, movements)
+
+
+def bulk_upsert_inventory(
+    db: Session,
+    rows: Sequence[Dict],
+    chunk_size: int = UPSERT_CHUNK_SIZE
+) -> List[Dict]:
+    """Upsert (sku, store, quantity, reorder_point, reorder_quantity) rows.
+
+    Returns one outcome dict per input row, in input order. When the same
+    (sku, store) appears more than once the last row wins and earlier ones
+    are reported as skipped. The caller owns the transaction.
+    """
+    results = [None] * len(rows)
+
+    latest = {}
+    for index, row in enumerate(rows):
+        key = (row['sku'], row['store'])
+        if key in latest:
+            results[latest[key]] = {
+                'index': latest[key],
+                'status': SKIPPED,
+                'detail': f"Superseded by row {index}"
+            }
+        latest[key] = index
+    pending = sorted(latest.values())
+
+    for start in range(0, len(pending), chunk_size):
+        chunk = pending[start:start + chunk_size]
+        skus = {rows[index]['sku'] for index in chunk}
+        stores = {rows[index]['store'] for index in chunk}
+        product_ids = dict(db.query(Product.sku, Product.id).filter(Product.sku.in_(skus)).all())
+        store_ids = dict(db.query(Store.name, Store.id).filter(Store.name.in_(stores)).all())
+
+        values = {}
+        for index in chunk:
+            row = rows[index]
+            product_id = product_ids.get(row['sku'])
+            store_id = store_ids.get(row['store'])
+            if product_id is None:
+                results[index] = {'index': index, 'status': ERROR, 'detail': f"Unknown SKU {row['sku']}"}
+            elif store_id is None:
+                results[index] = {'index': index, 'status': ERROR, 'detail': f"Unknown store {row['store']}"}
+            else:
+                values[(product_id, store_id)] = (index, {
+                    'product_id': product_id,
+                    'store_id': store_id,
+                    'quantity': row['quantity'],
+                    'reorder_point': row.get('reorder_point'),
+                    'reorder_quantity': row.get('reorder_quantity')
+                })
+
+        if values:
+            _upsert_chunk(db, values, results)
+
+    return results
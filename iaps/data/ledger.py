@@ -0,0 +1,218 @@
+"""Inventory movement ledger.
+
+Every change to an inventory quantity is appended to ``inventory_movements``
+with its source: a restock, a purchase order receipt, a manual adjustment or
+sale, or a stock count (a create, edit or delete through the API, or a bulk
+feed row). The set-based write paths log their movements in the same
+statement as the change; the rest go through :func:`record_movements`.
+
+The quantity of a (product, store) pair is derivable from the ledger as its
+checkpoint in ``inventory_checkpoints`` plus the movements logged after it.
+:func:`compact_ledger` folds movements older than the retention window into
+the checkpoints and deletes them, so both the log and the reads stay bounded
+by the window rather than by history. Run it on a schedule::
+
+    python -m iaps.data.ledger [--retain-days 90] [--verify]
+"""
+import argparse
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import and_, func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from ..db.database import SessionLocal
+from ..db.models import Inventory, InventoryCheckpoint, InventoryMovement, MovementType
+
+logger = logging.getLogger(__name__)
+
+MOVEMENT_INSERT_BATCH = 5000
+COMPACTION_BATCH_SIZE = 50000
+RETAIN_DAYS = 90
+
+# Movements counted as restocks by the store rollups
+RESTOCK_TYPES = (MovementType.RESTOCK, MovementType.RECEIPT)
+
+MOVEMENT_FIELDS = ('product_id', 'store_id', 'movement_type', 'quantity_change', 'purchase_order_id', 'reference')
+
+
+def record_movements(db: Session, movements: Iterable[Dict]) -> int:
+    """Append movements with multi-row inserts; zero changes are skipped.
+
+    Each movement needs product_id, store_id, movement_type and
+    quantity_change and may carry purchase_order_id and reference. Returns
+    the number logged. The caller commits, together with the change itself.
+    """
+    rows = [
+        {field: movement.get(field) for field in MOVEMENT_FIELDS}
+        for movement in movements
+        if movement['quantity_change']
+    ]
+    for start in range(0, len(rows), MOVEMENT_INSERT_BATCH):
+        db.execute(insert(InventoryMovement).values(rows[start:start + MOVEMENT_INSERT_BATCH]))
+    return len(rows)
+
+
+def _scoped(query, model, store_id: Optional[int], product_id: Optional[int]):
+    if store_id:
+        query = query.filter(model.store_id == store_id)
+    if product_id:
+        query = query.filter(model.product_id == product_id)
+    return query
+
+
+def live_movements_query(db: Session, store_id: Optional[int] = None, product_id: Optional[int] = None):
+    """Totals of the movements not yet folded into a checkpoint, per pair"""
+    query = db.query(
+        InventoryMovement.product_id,
+        InventoryMovement.store_id,
+        func.sum(InventoryMovement.quantity_change).label('quantity'),
+        func.count().filter(InventoryMovement.movement_type.in_(RESTOCK_TYPES)).label('restock_count')
+    ).outerjoin(InventoryCheckpoint, and_(
+        InventoryCheckpoint.product_id == InventoryMovement.product_id,
+        InventoryCheckpoint.store_id == InventoryMovement.store_id
+    )).filter(InventoryMovement.id > func.coalesce(InventoryCheckpoint.movement_id, 0))
+
+    query = _scoped(query, InventoryMovement, store_id, product_id)
+    return query.group_by(InventoryMovement.product_id, InventoryMovement.store_id)
+
+
+def ledger_query(db: Session, store_id: Optional[int] = None, product_id: Optional[int] = None):
+    """(product_id, store_id, quantity, restock_count) per pair, from the ledger alone"""
+    checkpoints = _scoped(db.query(InventoryCheckpoint), InventoryCheckpoint, store_id, product_id)\
+        .subquery('checkpoints')
+    live = live_movements_query(db, store_id, product_id).subquery('live')
+
+    return db.query(
+        func.coalesce(checkpoints.c.product_id, live.c.product_id).label('product_id'),
+        func.coalesce(checkpoints.c.store_id, live.c.store_id).label('store_id'),
+        (func.coalesce(checkpoints.c.quantity, 0) + func.coalesce(live.c.quantity, 0)).label('quantity'),
+        (func.coalesce(checkpoints.c.restock_count, 0) + func.coalesce(live.c.restock_count, 0)).label('restock_count')
+    ).select_from(checkpoints).outerjoin(live, and_(
+        live.c.product_id == checkpoints.c.product_id,
+        live.c.store_id == checkpoints.c.store_id
+    ), full=True)
+
+
+def store_restock_counts_query(db: Session):
+    """(store_id, restock_count) for every store with restocks in the ledger"""
+    ledger = ledger_query(db).subquery('ledger')
+    return db.query(ledger.c.store_id, func.sum(ledger.c.restock_count).label('restock_count'))\
+        .group_by(ledger.c.store_id)
+
+
+def ledger_drift_query(db: Session, store_id: Optional[int] = None, product_id: Optional[int] = None):
+    """Pairs whose inventory quantity differs from the ledger's.
+
+    Yields (product_id, store_id, inventory_quantity, ledger_quantity); a
+    deleted row or an empty ledger counts as zero.
+    """
+    stock = _scoped(
+        db.query(Inventory.product_id, Inventory.store_id, Inventory.quantity)
+        .filter(Inventory.product_id.isnot(None), Inventory.store_id.isnot(None)),
+        Inventory, store_id, product_id
+    ).subquery('stock')
+    ledger = ledger_query(db, store_id, product_id).subquery('ledger')
+
+    inventory_quantity = func.coalesce(stock.c.quantity, 0)
+    ledger_quantity = func.coalesce(ledger.c.quantity, 0)
+    return db.query(
+        func.coalesce(stock.c.product_id, ledger.c.product_id),
+        func.coalesce(stock.c.store_id, ledger.c.store_id),
+        inventory_quantity,
+        ledger_quantity
+    ).select_from(stock).outerjoin(ledger, and_(
+        ledger.c.product_id == stock.c.product_id,
+        ledger.c.store_id == stock.c.store_id
+    ), full=True).filter(inventory_quantity != ledger_quantity)
+
+
+def _compact_range(db: Session, low: int, high: int) -> int:
+    checkpoint = InventoryCheckpoint.__table__
+    movements = InventoryMovement.__table__
+
+    # Movements at or below a checkpoint's movement_id are already in it
+    folded = select(
+        movements.c.product_id,
+        movements.c.store_id,
+        func.max(movements.c.id),
+        func.sum(movements.c.quantity_change),
+        func.count().filter(movements.c.movement_type.in_(RESTOCK_TYPES))
+    ).select_from(movements.outerjoin(checkpoint, and_(
+        checkpoint.c.product_id == movements.c.product_id,
+        checkpoint.c.store_id == movements.c.store_id
+    ))).where(
+        movements.c.id > low,
+        movements.c.id <= high,
+        movements.c.id > func.coalesce(checkpoint.c.movement_id, 0)
+    ).group_by(movements.c.product_id, movements.c.store_id)\
+        .order_by(movements.c.product_id, movements.c.store_id)
+
+    statement = insert(checkpoint).from_select(
+        ['product_id', 'store_id', 'movement_id', 'quantity', 'restock_count'], folded
+    )
+    db.execute(statement.on_conflict_do_update(
+        index_elements=['product_id', 'store_id'],
+        set_={
+            'movement_id': statement.excluded.movement_id,
+            'quantity': checkpoint.c.quantity + statement.excluded.quantity,
+            'restock_count': checkpoint.c.restock_count + statement.excluded.restock_count,
+            'compacted_at': func.now()
+        }
+    ))
+    return db.execute(movements.delete().where(movements.c.id > low, movements.c.id <= high)).rowcount
+
+
+def compact_ledger(db: Session, before: datetime, batch_size: int = COMPACTION_BATCH_SIZE) -> int:
+    """Fold every movement up to the last one logged before ``before`` into the checkpoints.
+
+    Works through the log in id ranges of ``batch_size``, committing each
+    range so locks stay short and an interrupted run simply continues where
+    it stopped. ``created_at`` is the logging transaction's start time, so
+    nothing below the cutoff id can still be uncommitted once ``before`` is
+    well in the past. Returns the number of movements compacted.
+    """
+    high = db.query(func.max(InventoryMovement.id)).filter(InventoryMovement.created_at < before).scalar()
+    if high is None:
+        return 0
+    low = db.query(func.min(InventoryMovement.id)).scalar() - 1
+
+    compacted = 0
+    while low < high:
+        end = min(low + batch_size, high)
+        compacted += _compact_range(db, low, end)
+        db.commit()
+        logger.info("Compacted movements up to id %s", end)
+        low = end
+    return compacted
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compact the inventory movement ledger into checkpoints")
+    parser.add_argument('--retain-days', type=int, default=RETAIN_DAYS, help="Days of movements kept in the log")
+    parser.add_argument('--batch-size', type=int, default=COMPACTION_BATCH_SIZE, help="Movement ids per transaction")
+    parser.add_argument('--verify', action='store_true', help="Report pairs whose quantity disagrees with the ledger")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    db = SessionLocal()
+    try:
+        before = datetime.utcnow() - timedelta(days=args.retain_days)
+        compacted = compact_ledger(db, before, args.batch_size)
+        logger.info("Compacted %d movements logged before %s", compacted, before.date())
+        if args.verify:
+            drifted = ledger_drift_query(db).all()
+            for product_id, store_id, quantity, ledger_quantity in drifted:
+                logger.warning(
+                    "Product %s at store %s has quantity %s, ledger says %s",
+                    product_id, store_id, quantity, ledger_quantity
+                )
+            logger.info("%d pairs drifted from the ledger", len(drifted))
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
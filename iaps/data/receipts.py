@@ -0,0 +1,112 @@
+"""Set-based purchase order receipt.
+
+Receiving an order adds every item to its store's inventory with a single
+``INSERT ... SELECT ... ON CONFLICT DO UPDATE SET quantity = inventory.quantity
++ excluded.quantity``. The same statement logs one RECEIPT row per product in
+``inventory_movements`` through a data-modifying CTE, so a 2,000-line order
+costs three statements instead of thousands:
+
+1. lock the order row, so the same order is never received twice;
+2. lock the store's existing inventory rows for the order's products in
+   product order, reading their previous state for the rollups;
+3. the upsert plus movement log.
+
+Locks are always taken in (order, product_id) order, so concurrent
+receipts for the same store queue up instead of deadlocking, and they are
+released when the caller commits straight afterwards.
+"""
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import func, literal, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from ..db.models import Inventory, InventoryMovement, MovementType, OrderStatus, PurchaseOrder, PurchaseOrderItem
+from .rollups import InventoryState, apply_inventory_deltas, inventory_delta
+
+
+def lock_purchase_order(db: Session, order_id: int) -> Optional[PurchaseOrder]:
+    return db.query(PurchaseOrder)\
+        .filter(PurchaseOrder.id == order_id)\
+        .populate_existing()\
+        .with_for_update()\
+        .first()
+
+
+def receive_purchase_order(db: Session, order: PurchaseOrder, received_at: Optional[datetime] = None) -> int:
+    """Mark a locked order RECEIVED and add its items to inventory.
+
+    Returns the number of inventory rows changed. Receiving an order that
+    is already RECEIVED changes nothing. The caller commits.
+    """
+    if order.status == OrderStatus.RECEIVED:
+        return 0
+    order.status = OrderStatus.RECEIVED
+    order.received_at = received_at or datetime.utcnow()
+
+    items = select(
+        PurchaseOrderItem.product_id,
+        func.sum(PurchaseOrderItem.quantity).label('quantity')
+    ).where(PurchaseOrderItem.purchase_order_id == order.id)\
+        .group_by(PurchaseOrderItem.product_id)\
+        .cte('items')
+
+    before = {
+        product_id: InventoryState(quantity, reorder_point)
+        for product_id, quantity, reorder_point in db.query(
+            Inventory.product_id,
+            Inventory.quantity,
+            Inventory.reorder_point
+        ).filter(
+            Inventory.store_id == order.store_id,
+            Inventory.product_id.in_(select(items.c.product_id))
+        ).order_by(Inventory.product_id)
+        .with_for_update()
+    }
+
+    upsert = insert(Inventory.__table__).from_select(
+        ['product_id', 'store_id', 'quantity', 'last_restock_at'],
+        select(
+            items.c.product_id,
+            literal(order.store_id),
+            items.c.quantity,
+            literal(order.received_at)
+        ).order_by(items.c.product_id)
+    )
+    received = upsert.on_conflict_do_update(
+        index_elements=['product_id', 'store_id'],
+        set_={
+            'quantity': Inventory.quantity + upsert.excluded.quantity,
+            'last_restock_at': upsert.excluded.last_restock_at,
+            'updated_at': func.now()
+        }
+    ).returning(
+        Inventory.product_id,
+        Inventory.quantity,
+        Inventory.reorder_point
+    ).cte('received')
+
+    logged = insert(InventoryMovement).from_select(
+        ['product_id', 'store_id', 'movement_type', 'quantity_change', 'purchase_order_id'],
+        select(
+            items.c.product_id,
+            literal(order.store_id),
+            literal(MovementType.RECEIPT, InventoryMovement.movement_type.type),
+            items.c.quantity,
+            literal(order.id)
+        ).where(items.c.product_id.in_(select(received.c.product_id)))
+    ).cte('logged')
+
+    # Every received product is one restock of its row
+    deltas = [
+        inventory_delta(
+            product_id, order.store_id, before.get(product_id),
+            InventoryState(quantity, reorder_point), restocks=1
+        )
+        for product_id, quantity, reorder_point in db.execute(
+            select(received).add_cte(logged)
+        )
+    ]
+    apply_inventory_deltas(db, deltas)
+    return len(deltas)
@@ -0,0 +1,158 @@
+"""Batched reorder suggestion engine.
+
+Sales for the whole window are summed in one grouped aggregate and joined onto
+the inventory rows server-side, so a run costs a single round trip no matter
+how many (product, store) pairs are in scope. Suggestions are then computed
+column-wise with pandas instead of row by row.
+
+With ``use_forecasts`` the window's sales are replaced by the demand the
+forecasting pipeline stored for each pair, projected over the same number
+of days.
+"""
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from ..db.models import DemandForecast, Inventory, Product, Store, SalesHistory
+
+REORDER_COLUMNS = [
+    'product_id',
+    'product_name',
+    'product_sku',
+    'store_id',
+    'store_name',
+    'current_quantity',
+    'total_sales',
+]
+
+
+def sales_totals_query(
+    db: Session,
+    start_date: datetime,
+    end_date: datetime,
+    store_id: Optional[int] = None,
+    product_id: Optional[int] = None
+):
+    """Grouped SUM(quantity_sold) per (product_id, store_id) for a window"""
+    query = db.query(
+        SalesHistory.product_id.label('product_id'),
+        SalesHistory.store_id.label('store_id'),
+        func.sum(SalesHistory.quantity_sold).label('total_sales')
+    ).filter(SalesHistory.sale_date.between(start_date, end_date))
+
+    if store_id:
+        query = query.filter(SalesHistory.store_id == store_id)
+    if product_id:
+        query = query.filter(SalesHistory.product_id == product_id)
+
+    return query.group_by(SalesHistory.product_id, SalesHistory.store_id)
+
+
+def load_reorder_frame(
+    db: Session,
+    days_of_sales: int,
+    store_id: Optional[int] = None,
+    product_id: Optional[int] = None
+) -> pd.DataFrame:
+    """Fetch inventory joined to its sales totals as one DataFrame"""
+    end_date = datetime.utcnow()
+    start_date = end_date - timedelta(days=days_of_sales)
+
+    sales = sales_totals_query(db, start_date, end_date, store_id, product_id).subquery()
+
+    # Pairs without sales in the window can never need a reorder, so the
+    # inner join keeps them out of the transfer altogether.
+    query = db.query(
+        Inventory.product_id,
+        Product.name,
+        Product.sku,
+        Inventory.store_id,
+        Store.name,
+        Inventory.quantity,
+        sales.c.total_sales
+    ).select_from(Inventory)\
+        .join(Product, Product.id == Inventory.product_id)\
+        .join(Store, Store.id == Inventory.store_id)\
+        .join(
+            sales,
+            (sales.c.product_id == Inventory.product_id) &
+            (sales.c.store_id == Inventory.store_id)
+        )
+
+    if store_id:
+        query = query.filter(Inventory.store_id == store_id)
+    if product_id:
+        query = query.filter(Inventory.product_id == product_id)
+
+    frame = pd.DataFrame.from_records(query.all(), columns=REORDER_COLUMNS)
+    frame['current_quantity'] = frame['current_quantity'].fillna(0).astype('int64')
+    frame['total_sales'] = frame['total_sales'].fillna(0).astype('int64')
+    return frame.set_index(['product_id', 'store_id'], drop=False)
+
+
+def load_forecast_reorder_frame(
+    db: Session,
+    days_of_sales: int,
+    store_id: Optional[int] = None,
+    product_id: Optional[int] = None
+) -> pd.DataFrame:
+    """Inventory joined to its stored forecast, projected over ``days_of_sales``"""
+    # Pairs the pipeline has not fitted have no demand to reorder for
+    query = db.query(
+        Inventory.product_id,
+        Product.name,
+        Product.sku,
+        Inventory.store_id,
+        Store.name,
+        Inventory.quantity,
+        DemandForecast.daily_demand
+    ).select_from(Inventory)\
+        .join(Product, Product.id == Inventory.product_id)\
+        .join(Store, Store.id == Inventory.store_id)\
+        .join(
+            DemandForecast,
+            (DemandForecast.product_id == Inventory.product_id) &
+            (DemandForecast.store_id == Inventory.store_id)
+        )
+
+    if store_id:
+        query = query.filter(Inventory.store_id == store_id)
+    if product_id:
+        query = query.filter(Inventory.product_id == product_id)
+
+    frame = pd.DataFrame.from_records(query.all(), columns=REORDER_COLUMNS)
+    frame['current_quantity'] = frame['current_quantity'].fillna(0).astype('int64')
+    frame['total_sales'] = np.ceil(frame['total_sales'].fillna(0).astype(float) * days_of_sales).astype('int64')
+    return frame.set_index(['product_id', 'store_id'], drop=False)
+
+
+def compute_reorder_suggestions(frame: pd.DataFrame, days_of_sales: int) -> pd.DataFrame:
+    """Vectorized suggested order quantities, largest first"""
+    suggested = (frame['total_sales'] - frame['current_quantity']).clip(lower=0)
+    result = frame.assign(
+        suggested_order=suggested,
+        days_of_sales=days_of_sales,
+        average_daily_sales=frame['total_sales'] / days_of_sales
+    )
+    result = result[result['suggested_order'] > 0]
+    return result.sort_values('suggested_order', ascending=False, kind='mergesort')
+
+
+def calculate_reorder_suggestions(
+    db: Session,
+    days_of_sales: int,
+    store_id: Optional[int] = None,
+    product_id: Optional[int] = None,
+    use_forecasts: bool = False
+) -> List[Dict]:
+    """Reorder suggestions for every matching (product, store) in one query"""
+    if use_forecasts:
+        frame = load_forecast_reorder_frame(db, days_of_sales, store_id, product_id)
+    else:
+        frame = load_reorder_frame(db, days_of_sales, store_id, product_id)
+    suggestions = compute_reorder_suggestions(frame, days_of_sales)
+    return suggestions.to_dict('records')
@@ -0,0 +1,297 @@
+"""Catalog-wide reorder policy optimization.
+
+Every (product, store) pair gets a continuous-review (s, S) policy derived
+from its demand distribution (see :mod:`iaps.ml.demand`):
+
+* demand over the lead time ``L`` is treated as normal with mean ``d * L``
+  and variance ``L * sigma_d**2 + d**2 * sigma_L**2``, where ``sigma_L`` is
+  the spread of the pair's observed lead times;
+* safety stock is ``z`` standard deviations of lead-time demand for the
+  requested service level;
+* the reorder point ``s`` is lead-time demand plus safety stock, the
+  reorder quantity covers ``cycle_days`` of demand and the order-up-to
+  level is ``S = s + reorder quantity``.
+
+Lead times are measured from received purchase orders (submitted to
+received) and fall back to a default for pairs without history. Units on
+SUBMITTED or APPROVED orders count towards the inventory position, so an
+order is only suggested when on-hand plus on-order stock is at or below
+``s``. The whole scope is solved as numpy columns in one pass, and the
+optimized reorder points and quantities can be written back with chunked
+``UPDATE ... FROM (VALUES ...)`` statements::
+
+    python -m iaps.data.reorder_optimizer [--store-id N] [--apply]
+"""
+import argparse
+import logging
+from datetime import datetime, timedelta
+from statistics import NormalDist
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import Integer, column, func, or_, tuple_, update, values
+from sqlalchemy.orm import Session
+
+from ..db.database import SessionLocal
+from ..db.models import Inventory, OrderStatus, PurchaseOrder, PurchaseOrderItem
+from ..ml.demand import DEMAND_WINDOW_DAYS, load_demand_frame, load_forecast_frame
+from .rollups import InventoryState, apply_inventory_deltas, inventory_delta
+
+logger = logging.getLogger(__name__)
+
+SERVICE_LEVEL = 0.95
+DEFAULT_LEAD_TIME_DAYS = 7.0
+CYCLE_DAYS = 14
+LEAD_TIME_LOOKBACK_DAYS = 365
+POLICY_WRITE_BATCH = 5000
+
+OPEN_ORDER_STATUSES = (OrderStatus.SUBMITTED, OrderStatus.APPROVED)
+
+
+def on_order_query(db: Session, store_id: Optional[int] = None, product_id: Optional[int] = None):
+    """Units on open purchase orders per (product_id, store_id)"""
+    query = db.query(
+        PurchaseOrderItem.product_id,
+        PurchaseOrder.store_id,
+        func.sum(PurchaseOrderItem.quantity)
+    ).join(PurchaseOrder, PurchaseOrder.id == PurchaseOrderItem.purchase_order_id)\
+        .filter(PurchaseOrder.status.in_(OPEN_ORDER_STATUSES))
+
+    if store_id:
+        query = query.filter(PurchaseOrder.store_id == store_id)
+    if product_id:
+        query = query.filter(PurchaseOrderItem.product_id == product_id)
+
+    return query.group_by(PurchaseOrderItem.product_id, PurchaseOrder.store_id)
+
+
+def lead_time_query(
+    db: Session,
+    since: datetime,
+    store_id: Optional[int] = None,
+    product_id: Optional[int] = None
+):
+    """Mean and standard deviation of submitted-to-received days per pair"""
+    days = func.extract('epoch', PurchaseOrder.received_at - PurchaseOrder.submitted_at) / 86400.0
+    query = db.query(
+        PurchaseOrderItem.product_id,
+        PurchaseOrder.store_id,
+        func.avg(days),
+        func.stddev_samp(days)
+    ).join(PurchaseOrder, PurchaseOrder.id == PurchaseOrderItem.purchase_order_id)\
+        .filter(
+            PurchaseOrder.status == OrderStatus.RECEIVED,
+            PurchaseOrder.submitted_at.isnot(None),
+            PurchaseOrder.received_at >= since
+        )
+
+    if store_id:
+        query = query.filter(PurchaseOrder.store_id == store_id)
+    if product_id:
+        query = query.filter(PurchaseOrderItem.product_id == product_id)
+
+    return query.group_by(PurchaseOrderItem.product_id, PurchaseOrder.store_id)
+
+
+def load_policy_frame(
+    db: Session,
+    window_days: int = DEMAND_WINDOW_DAYS,
+    store_id: Optional[int] = None,
+    product_id: Optional[int] = None,
+    use_forecasts: bool = False,
+    default_lead_time: float = DEFAULT_LEAD_TIME_DAYS
+) -> pd.DataFrame:
+    """Inventory rows in scope with demand, on-order units and lead times"""
+    if use_forecasts:
+        frame = load_forecast_frame(db, store_id, product_id)
+    else:
+        frame = load_demand_frame(db, window_days, store_id, product_id)
+    frame = frame.rename(columns={
+        'reorder_point': 'current_reorder_point',
+        'reorder_quantity': 'current_reorder_quantity'
+    })
+
+    on_order = pd.DataFrame.from_records(
+        on_order_query(db, store_id, product_id).all(),
+        columns=['product_id', 'store_id', 'on_order']
+    )
+    since = datetime.utcnow() - timedelta(days=LEAD_TIME_LOOKBACK_DAYS)
+    lead_times = pd.DataFrame.from_records(
+        lead_time_query(db, since, store_id, product_id).all(),
+        columns=['product_id', 'store_id', 'lead_time_days', 'lead_time_std']
+    )
+    frame = frame.merge(on_order, on=['product_id', 'store_id'], how='left')\
+        .merge(lead_times, on=['product_id', 'store_id'], how='left')
+
+    frame['on_order'] = frame['on_order'].fillna(0).astype('int64')
+    frame['lead_time_days'] = frame['lead_time_days'].astype(float).fillna(default_lead_time)
+    # A single observed order has no spread
+    frame['lead_time_std'] = frame['lead_time_std'].astype(float).fillna(0.0)
+    return frame
+
+
+def optimize_policies(
+    frame: pd.DataFrame,
+    service_level: float = SERVICE_LEVEL,
+    cycle_days: int = CYCLE_DAYS
+) -> pd.DataFrame:
+    """Vectorized safety stock, (s, S) levels and suggested orders"""
+    z = NormalDist().inv_cdf(service_level)
+    demand = frame['daily_demand'].to_numpy(dtype=float)
+    demand_std = frame['demand_std'].to_numpy(dtype=float)
+    lead_time = frame['lead_time_days'].to_numpy(dtype=float)
+    lead_time_std = frame['lead_time_std'].to_numpy(dtype=float)
+
+    lead_time_demand_std = np.sqrt(lead_time * demand_std ** 2 + demand ** 2 * lead_time_std ** 2)
+    safety_stock = z * lead_time_demand_std
+    reorder_point = np.ceil(demand * lead_time + safety_stock).astype('int64')
+    # Pairs with any demand order at least one unit at a time
+    reorder_quantity = np.where(demand > 0, np.maximum(np.ceil(demand * cycle_days), 1), 0).astype('int64')
+    order_up_to = reorder_point + reorder_quantity
+
+    position = frame['current_quantity'].to_numpy() + frame['on_order'].to_numpy()
+    suggested = np.where((demand > 0) & (position <= reorder_point), order_up_to - position, 0)
+
+    return frame.assign(
+        safety_stock=safety_stock,
+        reorder_point=reorder_point,
+        reorder_quantity=reorder_quantity,
+        order_up_to=order_up_to,
+        suggested_order=suggested.astype('int64')
+    )
+
+
+def write_policies(db: Session, policies: pd.DataFrame) -> int:
+    """Store optimized reorder settings for pairs with demand.
+
+    Pairs without any demand keep their current settings. Rows are locked in
+    key order before each chunk is updated so the rollups see their prior
+    state. Returns the number of rows changed; the caller commits.
+    """
+    changed = policies[
+        (policies['daily_demand'] > 0) & (
+            (policies['reorder_point'] != policies['current_reorder_point']) |
+            (policies['reorder_quantity'] != policies['current_reorder_quantity'])
+        )
+    ].sort_values(['product_id', 'store_id'])
+
+    rows = list(zip(
+        changed['product_id'].tolist(),
+        changed['store_id'].tolist(),
+        changed['reorder_point'].tolist(),
+        changed['reorder_quantity'].tolist()
+    ))
+    updated = 0
+    for start in range(0, len(rows), POLICY_WRITE_BATCH):
+        chunk = rows[start:start + POLICY_WRITE_BATCH]
+        before = {
+            (product_id, store_id): InventoryState(quantity, reorder_point)
+            for product_id, store_id, quantity, reorder_point in db.query(
+                Inventory.product_id,
+                Inventory.store_id,
+                Inventory.quantity,
+                Inventory.reorder_point
+            ).filter(tuple_(Inventory.product_id, Inventory.store_id).in_([row[:2] for row in chunk]))
+            .order_by(Inventory.product_id, Inventory.store_id)
+            .with_for_update()
+        }
+
+        optimized = values(
+            column('product_id', Integer),
+            column('store_id', Integer),
+            column('reorder_point', Integer),
+            column('reorder_quantity', Integer),
+            name='optimized'
+        ).data(chunk)
+        statement = update(Inventory)\
+            .where(
+                Inventory.product_id == optimized.c.product_id,
+                Inventory.store_id == optimized.c.store_id,
+                or_(
+                    Inventory.reorder_point.is_distinct_from(optimized.c.reorder_point),
+                    Inventory.reorder_quantity.is_distinct_from(optimized.c.reorder_quantity)
+                )
+            )\
+            .values(
+                reorder_point=optimized.c.reorder_point,
+                reorder_quantity=optimized.c.reorder_quantity,
+                updated_at=func.now()
+            )\
+            .returning(
+                Inventory.product_id,
+                Inventory.store_id,
+                Inventory.quantity,
+                Inventory.reorder_point
+            )\
+            .execution_options(synchronize_session=False)
+
+        deltas = []
+        for product_id, store_id, quantity, reorder_point in db.execute(statement):
+            deltas.append(inventory_delta(
+                product_id, store_id, before.get((product_id, store_id)),
+                InventoryState(quantity, reorder_point)
+            ))
+        apply_inventory_deltas(db, deltas)
+        updated += len(deltas)
+    return updated
+
+
+def optimize_reorders(
+    db: Session,
+    store_id: Optional[int] = None,
+    product_id: Optional[int] = None,
+    window_days: int = DEMAND_WINDOW_DAYS,
+    lead_time_days: float = DEFAULT_LEAD_TIME_DAYS,
+    service_level: float = SERVICE_LEVEL,
+    cycle_days: int = CYCLE_DAYS,
+    use_forecasts: bool = False,
+    apply: bool = False
+) -> List[Dict]:
+    """Optimized policies for every pair in scope that needs an order now,
+    largest first; ``apply`` also stores the policies of every pair"""
+    frame = load_policy_frame(db, window_days, store_id, product_id, use_forecasts, lead_time_days)
+    policies = optimize_policies(frame, service_level, cycle_days)
+    if apply:
+        updated = write_policies(db, policies)
+        logger.info("Updated reorder settings of %d of %d inventory rows", updated, len(policies))
+
+    suggestions = policies[policies['suggested_order'] > 0]\
+        .sort_values(['suggested_order', 'product_id', 'store_id'], ascending=[False, True, True], kind='mergesort')
+    suggestions = suggestions.astype({'current_reorder_point': object, 'current_reorder_quantity': object})
+    return suggestions.where(suggestions.notna(), None).to_dict('records')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Optimize reorder points and quantities")
+    parser.add_argument('--store-id', type=int, default=None, help="Limit to one store")
+    parser.add_argument('--window-days', type=int, default=DEMAND_WINDOW_DAYS, help="Days of sales history")
+    parser.add_argument('--lead-time-days', type=float, default=DEFAULT_LEAD_TIME_DAYS,
+                        help="Lead time for pairs without received orders")
+    parser.add_argument('--service-level', type=float, default=SERVICE_LEVEL, help="Target cycle service level")
+    parser.add_argument('--cycle-days', type=int, default=CYCLE_DAYS, help="Days of demand each order covers")
+    parser.add_argument('--use-forecasts', action='store_true', help="Use the stored demand forecasts")
+    parser.add_argument('--apply', action='store_true', help="Write the optimized settings back")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    db = SessionLocal()
+    try:
+        suggestions = optimize_reorders(
+            db,
+            store_id=args.store_id,
+            window_days=args.window_days,
+            lead_time_days=args.lead_time_days,
+            service_level=args.service_level,
+            cycle_days=args.cycle_days,
+            use_forecasts=args.use_forecasts,
+            apply=args.apply
+        )
+        db.commit()
+        logger.info("%d inventory rows need an order", len(suggestions))
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,352 @@
+"""Analytics rollup maintenance.
+
+The product, store and region rollup tables hold the aggregates behind the
+dashboard endpoints so they never scan ``inventory``. Write paths describe what
+they changed as :class:`InventoryDelta` values and :func:`apply_inventory_deltas`
+folds them in with a handful of set-based upserts, logging every pair that
+entered or left low stock to ``low_stock_events`` on the way. :func:`refresh_rollups`
+rebuilds everything from scratch and is meant to run on a schedule to repair
+any drift::
+
+    python -m iaps.data.rollups
+"""
+import logging
+from collections import defaultdict
+from typing import Iterable, NamedTuple, Optional
+
+from sqlalchemy import and_, case, func, literal_column
+from sqlalchemy.dialects.postgresql import aggregate_order_by, array_agg, insert
+from sqlalchemy.orm import Session
+
+from ..db.database import SessionLocal
+from ..db.models import (
+    Inventory,
+    LowStockEvent,
+    LowStockTransition,
+    Product,
+    Store,
+    ProductRollup,
+    StoreRollup,
+    RegionRollup,
+    RegionProductRollup
+)
+from .ledger import store_restock_counts_query
+
+logger = logging.getLogger(__name__)
+
+# Stores without a region are rolled up under the empty string
+NO_REGION = ''
+
+
+class InventoryState(NamedTuple):
+    """The fields of an inventory row that feed the rollups"""
+    quantity: Optional[int]
+    reorder_point: Optional[int]
+
+
+class InventoryDelta(NamedTuple):
+    """Change to one (product, store) pair's contribution to the rollups"""
+    product_id: int
+    store_id: int
+    rows: int = 0
+    quantity: int = 0
+    low_stock: int = 0
+    restocks: int = 0
+
+
+def is_low_stock(quantity: Optional[int], reorder_point: Optional[int]) -> bool:
+    """Python mirror of the ``inventory.is_low_stock`` generated column"""
+    return quantity is not None and reorder_point is not None and quantity <= reorder_point
+
+
+def inventory_state(inventory: Inventory) -> InventoryState:
+    return InventoryState(inventory.quantity, inventory.reorder_point)
+
+
+def inventory_delta(
+    product_id: int,
+    store_id: int,
+    before: Optional[InventoryState],
+    after: Optional[InventoryState],
+    restocks: int = 0
+) -> InventoryDelta:
+    """Delta between two states of a row; ``None`` means the row is absent.
+
+    ``restocks`` is the number of restock events (restocks and purchase
+    order receipts) behind the change.
+    """
+    def contribution(state):
+        if state is None:
+            return 0, 0, 0
+        return (
+            1,
+            state.quantity or 0,
+            int(is_low_stock(state.quantity, state.reorder_point))
+        )
+
+    old = contribution(before)
+    new = contribution(after)
+    return InventoryDelta(product_id, store_id, *(n - o for n, o in zip(new, old)), restocks)
+
+
+def _upsert_deltas(db: Session, model, keys, rows, returning=None):
+    """Add each row's values onto the existing rollup row, creating it if absent"""
+    statement = insert(model).values(rows)
+    set_ = {
+        name: getattr(model, name) + getattr(statement.excluded, name)
+        for name in rows[0]
+        if name not in keys
+    }
+    if hasattr(model, 'updated_at'):
+        set_['updated_at'] = func.now()
+    statement = statement.on_conflict_do_update(index_elements=keys, set_=set_)
+    if returning is not None:
+        statement = statement.returning(*returning)
+    return db.execute(statement)
+
+
+def apply_inventory_deltas(db: Session, deltas: Iterable[InventoryDelta]) -> None:
+    """Fold inventory deltas into every rollup table in the current transaction"""
+    products = defaultdict(lambda: [0, 0, 0])
+    stores = defaultdict(lambda: [0, 0, 0, 0])
+    pairs = defaultdict(int)
+    transitions = []
+
+    for delta in deltas:
+        if not any(delta[2:]):
+            continue
+        if delta.low_stock:
+            transitions.append({
+                'product_id': delta.product_id,
+                'store_id': delta.store_id,
+                'transition': LowStockTransition.ENTERED if delta.low_stock > 0 else LowStockTransition.LEFT
+            })
+        product = products[delta.product_id]
+        product[0] += delta.rows
+        product[1] += delta.quantity
+        product[2] += delta.low_stock
+        store = stores[delta.store_id]
+        store[0] += delta.rows
+        store[1] += delta.quantity
+        store[2] += delta.low_stock
+        store[3] += delta.restocks
+        pairs[(delta.store_id, delta.product_id)] += delta.rows
+
+    if not stores:
+        return
+    if transitions:
+        db.execute(insert(LowStockEvent).values(transitions))
+
+    # Sorted keys give every writer the same lock order
+    _upsert_deltas(db, ProductRollup, ['product_id'], [
+        {'product_id': product_id, 'store_count': v[0], 'total_quantity': v[1], 'low_stock_count': v[2]}
+        for product_id, v in sorted(products.items())
+    ])
+    store_counts = _upsert_deltas(db, StoreRollup, ['store_id'], [
+        {
+            'store_id': store_id,
+            'total_products': v[0],
+            'total_quantity': v[1],
+            'low_stock_items': v[2],
+            'restock_count': v[3]
+        }
+        for store_id, v in sorted(stores.items())
+    ], returning=(StoreRollup.store_id, StoreRollup.total_products)).all()
+
+    store_regions = dict(
+        db.query(Store.id, func.coalesce(Store.region, NO_REGION))
+        .filter(Store.id.in_(list(stores)))
+        .all()
+    )
+
+    # A store starts or stops counting towards its region when its product
+    # count moves away from or back to zero; the returned post-update count
+    # together with the applied delta tells which way it went.
+    regions = defaultdict(lambda: [0, 0, 0, 0])
+    for store_id, total_products in store_counts:
+        added = stores[store_id][0]
+        region = regions[store_regions[store_id]]
+        region[2] += stores[store_id][1]
+        region[3] += stores[store_id][2]
+        region[0] += _presence_change(total_products, added)
+
+    region_pairs = defaultdict(int)
+    for (store_id, product_id), rows in pairs.items():
+        if rows:
+            region_pairs[(store_regions[store_id], product_id)] += rows
+    region_pairs = {key: rows for key, rows in region_pairs.items() if rows}
+
+    if region_pairs:
+        pair_counts = _upsert_deltas(db, RegionProductRollup, ['region', 'product_id'], [
+            {'region': region, 'product_id': product_id, 'store_count': rows}
+            for (region, product_id), rows in sorted(region_pairs.items())
+        ], returning=(
+            RegionProductRollup.region,
+            RegionProductRollup.product_id,
+            RegionProductRollup.store_count
+        )).all()
+        for region, product_id, store_count in pair_counts:
+            regions[region][1] += _presence_change(store_count, region_pairs[(region, product_id)])
+
+    _upsert_deltas(db, RegionRollup, ['region'], [
+        {
+            'region': region,
+            'store_count': v[0],
+            'total_products': v[1],
+            'total_quantity': v[2],
+            'low_stock_count': v[3]
+        }
+        for region, v in sorted(regions.items())
+    ])
+
+
+def _presence_change(count_after: int, added: int) -> int:
+    """+1 when a count just became non-zero, -1 when it just dropped to zero"""
+    if added > 0 and count_after == added:
+        return 1
+    if added < 0 and count_after == 0:
+        return -1
+    return 0
+
+
+def refresh_rollups(db: Session) -> None:
+    """Rebuild every rollup table in one transaction.
+
+    Everything comes from ``inventory`` except the restock counts, which
+    are counted from the movement ledger.
+    """
+    low_stock = func.sum(case([(Inventory.is_low_stock, 1)], else_=0))
+    quantity = func.coalesce(func.sum(Inventory.quantity), 0)
+
+    db.query(ProductRollup).delete(synchronize_session=False)
+    db.execute(insert(ProductRollup).from_select(
+        ['product_id', 'store_count', 'total_quantity', 'low_stock_count'],
+        db.query(Inventory.product_id, func.count(), quantity, low_stock)
+        .filter(Inventory.product_id.isnot(None))
+        .group_by(Inventory.product_id)
+        .statement
+    ))
+
+    restocks = store_restock_counts_query(db).subquery('restocks')
+    stores = db.query(
+        Inventory.store_id.label('store_id'),
+        func.count().label('total_products'),
+        quantity.label('total_quantity'),
+        low_stock.label('low_stock_items')
+    ).filter(Inventory.store_id.isnot(None))\
+        .group_by(Inventory.store_id)\
+        .subquery('stores')
+
+    db.query(StoreRollup).delete(synchronize_session=False)
+    db.execute(insert(StoreRollup).from_select(
+        ['store_id', 'total_products', 'total_quantity', 'low_stock_items', 'restock_count'],
+        db.query(
+            stores.c.store_id,
+            stores.c.total_products,
+            stores.c.total_quantity,
+            stores.c.low_stock_items,
+            func.coalesce(restocks.c.restock_count, 0)
+        ).outerjoin(restocks, restocks.c.store_id == stores.c.store_id)
+        .statement
+    ))
+
+    refresh_region_rollups(db)
+
+
+def refresh_region_rollups(db: Session) -> None:
+    """Rebuild the region rollups, e.g. after a store moves to another region"""
+    low_stock = func.sum(case([(Inventory.is_low_stock, 1)], else_=0))
+    region = func.coalesce(Store.region, literal_column("''"))
+
+    db.query(RegionProductRollup).delete(synchronize_session=False)
+    db.execute(insert(RegionProductRollup).from_select(
+        ['region', 'product_id', 'store_count'],
+        db.query(region, Inventory.product_id, func.count())
+        .join(Store, Store.id == Inventory.store_id)
+        .filter(Inventory.product_id.isnot(None))
+        .group_by(region, Inventory.product_id)
+        .statement
+    ))
+
+    db.query(RegionRollup).delete(synchronize_session=False)
+    db.execute(insert(RegionRollup).from_select(
+        ['region', 'store_count', 'total_products', 'total_quantity', 'low_stock_count'],
+        db.query(
+            region,
+            func.count(func.distinct(Inventory.store_id)),
+            func.count(func.distinct(Inventory.product_id)),
+            func.coalesce(func.sum(Inventory.quantity), 0),
+            low_stock
+        ).join(Store, Store.id == Inventory.store_id)
+        .group_by(region)
+        .statement
+    ))
+
+
+def summary_query(db: Session, top: int = 5):
+    """Everything behind the analytics summary as a single-row query.
+
+    Returns (total_products, total_stores, total_inventory, low_stock_items,
+    total_items, top_stores, critical_products, regions, region_store_counts).
+    Stores are scanned once: the window rank orders stocked stores by
+    quantity and FILTER picks the top ones out of the same aggregate.
+    """
+    stocked = StoreRollup.total_products > 0
+    store_stats = db.query(
+        Store.name.label('name'),
+        Store.region.label('region'),
+        StoreRollup.total_quantity.label('total_quantity'),
+        StoreRollup.low_stock_items.label('low_stock_items'),
+        StoreRollup.total_products.label('total_products'),
+        func.row_number().over(
+            partition_by=stocked,
+            order_by=StoreRollup.total_quantity.desc()
+        ).label('store_rank')
+    ).outerjoin(StoreRollup, StoreRollup.store_id == Store.id).cte('store_stats')
+
+    regions = db.query(
+        store_stats.c.region,
+        func.count().label('store_count')
+    ).group_by(store_stats.c.region).cte('regions')
+
+    critical = db.query(
+        Product.name.label('name'),
+        func.row_number().over(order_by=ProductRollup.low_stock_count.desc()).label('product_rank')
+    ).join(ProductRollup, ProductRollup.product_id == Product.id)\
+        .filter(ProductRollup.low_stock_count > 0)\
+        .cte('critical')
+
+    return db.query(
+        db.query(func.count(Product.id)).scalar_subquery(),
+        func.count(),
+        func.coalesce(func.sum(store_stats.c.total_quantity), 0),
+        func.coalesce(func.sum(store_stats.c.low_stock_items), 0),
+        func.coalesce(func.sum(store_stats.c.total_products), 0),
+        array_agg(aggregate_order_by(store_stats.c.name, store_stats.c.store_rank)).filter(
+            and_(store_stats.c.total_products > 0, store_stats.c.store_rank <= top)
+        ),
+        db.query(
+            array_agg(aggregate_order_by(critical.c.name, critical.c.product_rank))
+        ).filter(critical.c.product_rank <= top).scalar_subquery(),
+        db.query(
+            array_agg(aggregate_order_by(regions.c.region, regions.c.region))
+        ).scalar_subquery(),
+        db.query(
+            array_agg(aggregate_order_by(regions.c.store_count, regions.c.region))
+        ).scalar_subquery()
+    ).select_from(store_stats)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    db = SessionLocal()
+    try:
+        refresh_rollups(db)
+        db.commit()
+        logger.info("Analytics rollups refreshed")
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,264 @@
+"""Bulk POS sales ingestion.
+
+Sale lines are streamed from CSV or NDJSON, their SKUs and store names are
+mapped to ids through batched lookups that are cached for the whole run, and
+each batch is loaded with ``COPY`` into a temporary staging table. A single
+``INSERT ... SELECT ... ON CONFLICT DO NOTHING`` then merges the batch into
+``sales_history`` on its natural key (store, transaction, line), so feeding
+the same file twice never double counts a sale.
+
+Every line needs sku, store, quantity_sold, sale_date, transaction_id and
+line_number. A malformed line, including one that is not valid JSON or not
+valid UTF-8, is counted as rejected and the rest of the file still loads.
+Run with::
+
+    python -m iaps.data.sales_ingest sales.csv [--format csv|ndjson]
+"""
+import argparse
+import csv
+import io
+import json
+import logging
+import sys
+import time
+from datetime import datetime
+from typing import Dict, IO, Iterable, Iterator, List, Optional
+
+from sqlalchemy import Integer, String, DateTime, column, select, table, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from ..db.database import SessionLocal
+from ..db.models import Product, Store, SalesHistory
+
+logger = logging.getLogger(__name__)
+
+SALES_BATCH_SIZE = 50000
+LOOKUP_CHUNK_SIZE = 5000
+
+SALES_FORMATS = ('csv', 'ndjson')
+STAGING_COLUMNS = ('product_id', 'store_id', 'quantity_sold', 'sale_date', 'transaction_id', 'line_number')
+
+staging = table(
+    'sales_history_staging',
+    column('product_id', Integer),
+    column('store_id', Integer),
+    column('quantity_sold', Integer),
+    column('sale_date', DateTime(timezone=True)),
+    column('transaction_id', String),
+    column('line_number', Integer)
+)
+
+
+class IdLookup:
+    """Cache of natural key -> id, filled with one IN query per batch of misses.
+
+    Unknown keys are cached as ``None`` so they are only looked up once.
+    """
+
+    def __init__(self, key_column, id_column):
+        self.key_column = key_column
+        self.id_column = id_column
+        self.ids = {}
+
+    def resolve(self, db: Session, keys: Iterable[str]) -> Dict[str, Optional[int]]:
+        missing = [key for key in set(keys) if key not in self.ids]
+        for start in range(0, len(missing), LOOKUP_CHUNK_SIZE):
+            chunk = missing[start:start + LOOKUP_CHUNK_SIZE]
+            self.ids.update(dict.fromkeys(chunk))
+            self.ids.update(
+                db.query(self.key_column, self.id_column)
+                .filter(self.key_column.in_(chunk))
+                .all()
+            )
+        return self.ids
+
+
+def open_sales_stream(binary: IO[bytes]) -> IO[str]:
+    """Text view of a binary upload for :func:`read_sales_rows`.
+
+    Undecodable bytes are carried through as lone surrogates instead of
+    failing the whole read, so only the lines holding them are rejected.
+    """
+    return io.TextIOWrapper(binary, encoding='utf-8', errors='surrogateescape', newline='')
+
+
+def read_sales_rows(stream: IO[str], format: str) -> Iterator[Optional[Dict]]:
+    """Yield raw sale line dicts from a CSV or NDJSON text stream.
+
+    Lines that cannot be parsed at all are yielded as None.
+    """
+    if format == 'csv':
+        reader = csv.DictReader(stream)
+        while True:
+            try:
+                yield next(reader)
+            except StopIteration:
+                return
+            except csv.Error:
+                yield None
+    elif format == 'ndjson':
+        for line in stream:
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    yield None
+    else:
+        raise ValueError(f"Unsupported sales format: {format}")
+
+
+def _encodable(value) -> bool:
+    try:
+        str(value).encode('utf-8')
+    except UnicodeEncodeError:
+        return False
+    return True
+
+
+def _parse_line(row: Optional[Dict]):
+    """Validate one raw line, returning the staging values or None"""
+    if not isinstance(row, dict):
+        return None
+    try:
+        quantity_sold = int(row['quantity_sold'])
+        line_number = int(row['line_number'])
+        sale_date = row['sale_date']
+        if not isinstance(sale_date, datetime):
+            sale_date = datetime.fromisoformat(sale_date.replace('Z', '+00:00'))
+        transaction_id = str(row['transaction_id']).strip()
+    except (KeyError, TypeError, ValueError):
+        return None
+    if not transaction_id or not row.get('sku') or not row.get('store'):
+        return None
+    if not all(_encodable(value) for value in (row['sku'], row['store'], transaction_id)):
+        return None
+    return quantity_sold, sale_date.isoformat(), transaction_id, line_number
+
+
+def _ensure_staging_table(db: Session) -> None:
+    # Temporary tables live per connection, and the session may be handed a
+    # different pooled connection after each commit.
+    db.execute(text(
+        "CREATE TEMP TABLE IF NOT EXISTS sales_history_staging ("
+        "product_id integer, store_id integer, quantity_sold integer, "
+        "sale_date timestamptz, transaction_id varchar, line_number integer"
+        ") ON COMMIT DELETE ROWS"
+    ))
+
+
+def _copy_batch(db: Session, lines: List[tuple]) -> None:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(lines)
+    buffer.seek(0)
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY sales_history_staging ({', '.join(STAGING_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+            buffer
+        )
+    finally:
+        cursor.close()
+
+
+def _merge_staging(db: Session) -> int:
+    statement = insert(SalesHistory).from_select(
+        list(STAGING_COLUMNS),
+        select(*[staging.c[name] for name in STAGING_COLUMNS])
+    ).on_conflict_do_nothing(index_elements=['store_id', 'transaction_id', 'line_number'])
+    return db.execute(statement).rowcount
+
+
+def ingest_sales(
+    db: Session,
+    rows: Iterable[Dict],
+    batch_size: int = SALES_BATCH_SIZE
+) -> Dict:
+    """Load sale lines in COPY batches, committing after each merged batch.
+
+    Returns counts of lines read, inserted, skipped as already loaded and
+    rejected (unparseable, malformed or unknown SKU/store), plus elapsed seconds and
+    rows per second.
+    """
+    products = IdLookup(Product.sku, Product.id)
+    stores = IdLookup(Store.name, Store.id)
+    stats = {'read': 0, 'inserted': 0, 'duplicates': 0, 'rejected': 0}
+    started = time.perf_counter()
+
+    def flush(batch):
+        product_ids = products.resolve(db, (row['sku'] for row, _ in batch))
+        store_ids = stores.resolve(db, (row['store'] for row, _ in batch))
+        lines = []
+        for row, values in batch:
+            product_id = product_ids.get(row['sku'])
+            store_id = store_ids.get(row['store'])
+            if product_id is None or store_id is None:
+                stats['rejected'] += 1
+                continue
+            lines.append((product_id, store_id) + values)
+        if lines:
+            _ensure_staging_table(db)
+            _copy_batch(db, lines)
+            inserted = _merge_staging(db)
+            db.commit()
+            stats['inserted'] += inserted
+            stats['duplicates'] += len(lines) - inserted
+
+    batch = []
+    for row in rows:
+        stats['read'] += 1
+        values = _parse_line(row)
+        if values is None:
+            stats['rejected'] += 1
+            continue
+        batch.append((row, values))
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+
+    elapsed = time.perf_counter() - started
+    stats['seconds'] = round(elapsed, 3)
+    stats['rows_per_second'] = round(stats['read'] / elapsed) if elapsed else 0
+    return stats
+
+
+def ingest_sales_file(db: Session, stream: IO[str], format: str) -> Dict:
+    """Ingest a CSV or NDJSON text stream and log the throughput"""
+    stats = ingest_sales(db, read_sales_rows(stream, format))
+    logger.info(
+        "Ingested %d sales lines in %.1fs (%d rows/s): %d inserted, %d duplicates, %d rejected",
+        stats['read'], stats['seconds'], stats['rows_per_second'],
+        stats['inserted'], stats['duplicates'], stats['rejected']
+    )
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk-load POS sales lines into sales_history")
+    parser.add_argument('path', help="CSV or NDJSON file, or - for stdin")
+    parser.add_argument(
+        '--format',
+        choices=SALES_FORMATS,
+        default=None,
+        help="Input format, inferred from the file extension by default"
+    )
+    args = parser.parse_args(argv)
+
+    format = args.format or ('ndjson' if args.path.endswith(('.ndjson', '.jsonl')) else 'csv')
+
+    logging.basicConfig(level=logging.INFO)
+    db = SessionLocal()
+    try:
+        if args.path == '-':
+            ingest_sales_file(db, open_sales_stream(sys.stdin.buffer), format)
+        else:
+            with open(args.path, 'rb') as binary:
+                ingest_sales_file(db, open_sales_stream(binary), format)
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+"""Daily inventory snapshot ingestion.
+
+Copies the live ``inventory`` table into the append-only
+``inventory_snapshots`` fact table once per day. The capture is a single
+INSERT ... SELECT executed inside Postgres; rows coming from outside the
+database (backfills, iQmetrix pulls) go through chunked multi-row INSERTs.
+
+Run daily with::
+
+    python -m iaps.data.snapshots [--date YYYY-MM-DD]
+"""
+import argparse
+import logging
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import literal, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from ..db.database import SessionLocal
+from ..db.models import Inventory, InventorySnapshot
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_CHUNK_SIZE = 5000
+
+
+def _month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def _next_month(day: date) -> date:
+    if day.month == 12:
+        return date(day.year + 1, 1, 1)
+    return date(day.year, day.month + 1, 1)
+
+
+def partition_name(day: date) -> str:
+    """Name of the monthly partition holding ``day``"""
+    return f"{InventorySnapshot.__tablename__}_y{day.year}m{day.month:02d}"
+
+
+def ensure_snapshot_partitions(db: Session, start_date: date, end_date: date) -> List[str]:
+    """Ensure monthly partitions exist for [start_date, end_date], returning their names"""
+    created = []
+    month = _month_start(start_date)
+    while month <= end_date:
+        upper = _next_month(month)
+        name = partition_name(month)
+        db.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {name} "
+            f"PARTITION OF {InventorySnapshot.__tablename__} "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{upper.isoformat()}')"
+        ))
+        created.append(name)
+        month = upper
+    return created
+
+
+def _upsert(statement):
+    # Re-running a day's load replaces that day's rows; earlier days are
+    # never touched, so history stays append-only.
+    return statement.on_conflict_do_update(
+        index_elements=['product_id', 'store_id', 'snapshot_date'],
+        set_={
+            'quantity': statement.excluded.quantity,
+            'reorder_point': statement.excluded.reorder_point,
+            'reorder_quantity': statement.excluded.reorder_quantity,
+            'last_restock_at': statement.excluded.last_restock_at,
+        }
+    )
+
+
+def capture_inventory_snapshot(db: Session, snapshot_date: Optional[date] = None) -> int:
+    """Snapshot every live inventory row for ``snapshot_date`` (default today)"""
+    snapshot_date = snapshot_date or datetime.utcnow().date()
+    ensure_snapshot_partitions(db, snapshot_date, snapshot_date)
+
+    source = db.query(
+        Inventory.product_id,
+        Inventory.store_id,
+        literal(snapshot_date).label('snapshot_date'),
+        Inventory.quantity,
+        Inventory.reorder_point,
+        Inventory.reorder_quantity,
+        Inventory.last_restock_at
+    ).statement
+
+    statement = _upsert(insert(InventorySnapshot).from_select(
+        [
+            'product_id',
+            'store_id',
+            'snapshot_date',
+            'quantity',
+            'reorder_point',
+            'reorder_quantity',
+            'last_restock_at',
+        ],
+        source
+    ))
+    result = db.execute(statement)
+    db.commit()
+    return result.rowcount
+
+
+def append_snapshot_rows(
+    db: Session,
+    rows: Iterable[Dict],
+    chunk_size: int = SNAPSHOT_CHUNK_SIZE
+) -> int:
+    """Bulk-load externally sourced snapshot rows with multi-row INSERTs"""
+    total = 0
+    chunk = []
+    seen_months = set()
+
+    def flush():
+        months = {_month_start(row['snapshot_date']) for row in chunk} - seen_months
+        for month in sorted(months):
+            ensure_snapshot_partitions(db, month, month)
+        seen_months.update(months)
+        # ON CONFLICT cannot touch the same row twice in one statement
+        unique = {
+            (row['product_id'], row['store_id'], row['snapshot_date']): row
+            for row in chunk
+        }
+        db.execute(_upsert(insert(InventorySnapshot).values(list(unique.values()))))
+        return len(unique)
+
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            total += flush()
+            chunk = []
+    if chunk:
+        total += flush()
+
+    db.commit()
+    return total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Capture the daily inventory snapshot")
+    parser.add_argument(
+        '--date',
+        type=lambda value: datetime.strptime(value, '%Y-%m-%d').date(),
+        default=None,
+        help="Snapshot date (YYYY-MM-DD), defaults to today (UTC)"
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    db = SessionLocal()
+    try:
+        count = capture_inventory_snapshot(db, args.date)
+        logger.info("Captured %d inventory snapshot rows", count)
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
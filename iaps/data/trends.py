@@ -0,0 +1,199 @@
+"""Server-side bucketed, single-pass trend aggregation.
+
+Snapshots are rolled up inside Postgres: first into one daily total per
+product, store, category and the whole selection (GROUPING SETS), then into
+``date_trunc`` buckets of the requested granularity with sum, min, max and
+last aggregates. Only those bucket rows cross the wire, so the response size
+is bounded by groups x buckets rather than by the number of snapshot rows.
+A single pass over the bucket rows then fills every grouping.
+"""
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import DateTime, case, cast, func, literal_column, tuple_
+from sqlalchemy.dialects.postgresql import aggregate_order_by, array_agg
+from sqlalchemy.orm import Session
+
+from ..db.models import InventorySnapshot, Product, Store
+
+# A snapshot counts as a restock when the last restock happened on its day
+SNAPSHOT_RESTOCKED = func.date(InventorySnapshot.last_restock_at) == InventorySnapshot.snapshot_date
+SNAPSHOT_LOW_STOCK = InventorySnapshot.quantity <= InventorySnapshot.reorder_point
+
+TREND_GRANULARITIES = ('day', 'week', 'month')
+
+
+def trend_buckets_query(
+    db: Session,
+    granularity: str,
+    start_date: datetime,
+    end_date: datetime,
+    category: Optional[str] = None,
+    store_id: Optional[int] = None,
+    product_id: Optional[int] = None
+):
+    """Per-group bucket aggregates for the range, oldest bucket first.
+
+    Each row carries exactly one of product_id, store_id or category; rows
+    with none of them are the totals for the whole selection.
+    """
+    if granularity not in TREND_GRANULARITIES:
+        raise ValueError(f"Unsupported trend granularity: {granularity}")
+
+    quantity = func.coalesce(InventorySnapshot.quantity, 0)
+    category_name = func.coalesce(Product.category, literal_column("'Uncategorized'"))
+
+    daily = db.query(
+        InventorySnapshot.snapshot_date.label('day'),
+        InventorySnapshot.product_id.label('product_id'),
+        Product.name.label('product_name'),
+        InventorySnapshot.store_id.label('store_id'),
+        Store.name.label('store_name'),
+        category_name.label('category'),
+        func.sum(quantity).label('quantity'),
+        func.sum(case([(SNAPSHOT_RESTOCKED, 1)], else_=0)).label('restock_count'),
+        func.sum(case([(SNAPSHOT_LOW_STOCK, 1)], else_=0)).label('low_stock_count'),
+        func.count().label('row_count'),
+        func.sum(case([(quantity == 0, 1)], else_=0)).label('stock_out_count')
+    ).select_from(InventorySnapshot)\
+        .join(Product, Product.id == InventorySnapshot.product_id)\
+        .join(Store, Store.id == InventorySnapshot.store_id)
+
+    if category:
+        daily = daily.filter(Product.category == category)
+    if store_id:
+        daily = daily.filter(InventorySnapshot.store_id == store_id)
+    if product_id:
+        daily = daily.filter(InventorySnapshot.product_id == product_id)
+
+    daily = daily.filter(
+        InventorySnapshot.snapshot_date.between(start_date.date(), end_date.date())
+    ).group_by(
+        InventorySnapshot.snapshot_date,
+        func.grouping_sets(
+            tuple_(InventorySnapshot.product_id, Product.name),
+            tuple_(InventorySnapshot.store_id, Store.name),
+            tuple_(category_name),
+            tuple_()
+        )
+    ).subquery()
+
+    # Inlined (it is whitelisted above) so SELECT and GROUP BY match exactly
+    bucket = func.date_trunc(literal_column(f"'{granularity}'"), cast(daily.c.day, DateTime))
+    group_columns = (
+        daily.c.product_id,
+        daily.c.product_name,
+        daily.c.store_id,
+        daily.c.store_name,
+        daily.c.category,
+    )
+
+    return db.query(
+        *group_columns,
+        bucket.label('bucket'),
+        func.sum(daily.c.quantity),
+        func.min(daily.c.quantity),
+        func.max(daily.c.quantity),
+        array_agg(aggregate_order_by(daily.c.quantity, daily.c.day.desc()))[1],
+        func.sum(daily.c.restock_count),
+        func.sum(daily.c.low_stock_count),
+        func.sum(daily.c.row_count),
+        func.sum(daily.c.stock_out_count)
+    ).group_by(*group_columns, bucket).order_by(bucket)
+
+
+def _track_extremes(group: Dict, bucket: datetime, minimum: int, maximum: int) -> None:
+    if group['peak'] is None or maximum >= group['peak'][1]:
+        group['peak'] = (bucket, maximum)
+    if group['low'] is None or minimum < group['low'][1]:
+        group['low'] = (bucket, minimum)
+
+
+def aggregate_trends(rows: Iterable) -> Dict:
+    """Fold bucket rows into product, store, category and overall groupings.
+
+    Every group gets its bucket points as ``(timestamp, last, restock_count,
+    low_stock_count, sum, min, max)`` tuples. Peaks keep the latest bucket
+    with the highest maximum and lows the earliest with the lowest minimum.
+    """
+    products = {}
+    stores = {}
+    categories = {}
+    overall = {'points': [], 'first': None, 'last': None, 'peak': None, 'low': None}
+
+    for (product_id, product_name, store_id, store_name, category, bucket,
+            total, minimum, maximum, last, restocks, lows, row_count, stock_outs) in rows:
+        point = (bucket, last, restocks, lows, total, minimum, maximum)
+
+        if product_id is not None:
+            group = products.get(product_id)
+            if group is None:
+                group = products[product_id] = {
+                    'name': product_name,
+                    'points': [],
+                    'total_quantity': 0,
+                    'row_count': 0,
+                    'restock_count': 0,
+                    'stock_out_count': 0
+                }
+            group['total_quantity'] += total
+            group['row_count'] += row_count
+            group['restock_count'] += restocks
+            group['stock_out_count'] += stock_outs
+        elif store_id is not None:
+            group = stores.get(store_id)
+            if group is None:
+                group = stores[store_id] = {
+                    'name': store_name,
+                    'points': [],
+                    'total_quantity': 0,
+                    'row_count': 0,
+                    'peak': None,
+                    'low': None
+                }
+            group['total_quantity'] += total
+            group['row_count'] += row_count
+            _track_extremes(group, bucket, minimum, maximum)
+        elif category is not None:
+            group = categories.get(category)
+            if group is None:
+                group = categories[category] = {'points': [], 'first': last}
+            group['last'] = last
+        else:
+            group = overall
+            if not group['points']:
+                group['first'] = last
+            group['last'] = last
+            _track_extremes(group, bucket, minimum, maximum)
+
+        group['points'].append(point)
+
+    return {
+        'products': products,
+        'stores': stores,
+        'categories': categories,
+        'overall': overall
+    }
+
+
+def growth_rate(first: Optional[int], last: Optional[int], count: int) -> float:
+    """Percent change from the first to the last quantity of a series"""
+    if count < 2 or not first or first <= 0:
+        return 0
+    return ((last - first) / first) * 100
+
+
+def load_trend_aggregates(
+    db: Session,
+    granularity: str,
+    start_date: datetime,
+    end_date: datetime,
+    category: Optional[str] = None,
+    store_id: Optional[int] = None,
+    product_id: Optional[int] = None
+) -> Dict:
+    """Bucket the range in SQL and aggregate the result"""
+    query = trend_buckets_query(
+        db, granularity, start_date, end_date, category, store_id, product_id
+    )
+    return aggregate_trends(query.all())
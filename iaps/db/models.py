@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, UniqueConstraint, Enum
+from sqlalchemy import Column, Integer, BigInteger, String, Float, Boolean, Date, DateTime, ForeignKey, UniqueConstraint, Enum, Index, Computed
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from .database import Base
@@ -11,6 +11,22 @@ class OrderStatus(str, enum.Enum):
     RECEIVED = "received"
     CANCELLED = "cancelled"
 
+class LowStockTransition(str, enum.Enum):
+    ENTERED = "entered"
+    LEFT = "left"
+
+class MovementType(str, enum.Enum):
+    RECEIPT = "receipt"
+    RESTOCK = "restock"
+    ADJUSTMENT = "adjustment"
+    SALE = "sale"
+    COUNT = "count"
+
+class ForecastRunStatus(str, enum.Enum):
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
 class Product(Base):
     __tablename__ = "products"
 
@@ -51,12 +67,46 @@ class Inventory(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     last_restock_at = Column(DateTime(timezone=True), nullable=True)
+    # Maintained by Postgres on every write, whatever the write path
+    is_low_stock = Column(
+        Boolean,
+        Computed('coalesce(quantity <= reorder_point, false)', persisted=True),
+        nullable=False
+    )
+    # Bumped by the inventory_bump_version trigger on every update, for
+    # optimistic concurrency checks
+    version = Column(Integer, nullable=False, server_default='1')
 
     product = relationship("Product", back_populates="inventory_records")
     store = relationship("Store", back_populates="inventory_records")
 
     __table_args__ = (
         UniqueConstraint('product_id', 'store_id', name='uix_product_store'),
+        Index('ix_inventory_store_id', 'store_id'),
+        Index('ix_inventory_low_stock', 'store_id', 'product_id', postgresql_where=is_low_stock),
+    )
+
+class InventorySnapshot(Base):
+    """Daily inventory fact table, one row per (product, store, day).
+
+    Range-partitioned by month on snapshot_date; partitions are created by
+    iaps.data.snapshots before each load.
+    """
+    __tablename__ = "inventory_snapshots"
+
+    product_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
+    store_id = Column(Integer, ForeignKey("stores.id"), primary_key=True)
+    snapshot_date = Column(Date, primary_key=True)
+    quantity = Column(Integer, default=0)
+    reorder_point = Column(Integer, nullable=True)
+    reorder_quantity = Column(Integer, nullable=True)
+    last_restock_at = Column(DateTime(timezone=True), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index('ix_inventory_snapshots_snapshot_date', 'snapshot_date', postgresql_using='brin'),
+        Index('ix_inventory_snapshots_store_date', 'store_id', 'snapshot_date'),
+        {'postgresql_partition_by': 'RANGE (snapshot_date)'},
     )
 
 class SalesHistory(Base):
@@ -67,11 +117,29 @@ class SalesHistory(Base):
     store_id = Column(Integer, ForeignKey("stores.id"))
     quantity_sold = Column(Integer, nullable=False)
     sale_date = Column(DateTime(timezone=True), server_default=func.now())
+    # POS natural key; re-ingesting the same sale line is a no-op
+    transaction_id = Column(String, nullable=True)
+    line_number = Column(Integer, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     product = relationship("Product", back_populates="sales_history")
     store = relationship("Store", back_populates="sales_history")
 
+    __table_args__ = (
+        UniqueConstraint('store_id', 'transaction_id', 'line_number', name='uix_sales_store_transaction_line'),
+        Index(
+            'ix_sales_history_product_store_date',
+            'product_id',
+            'store_id',
+            'sale_date',
+            postgresql_include=['quantity_sold']
+        ),
+        # Sales arrive roughly in time order, which keeps a BRIN index tiny
+        Index('ix_sales_history_sale_date', 'sale_date', postgresql_using='brin'),
+        # Finds the lines loaded since a forecast was fitted
+        Index('ix_sales_history_created_at', 'created_at', postgresql_using='brin'),
+    )
+
 class PurchaseOrder(Base):
     __tablename__ = "purchase_orders"
 
@@ -87,15 +155,157 @@ class PurchaseOrder(Base):
     store = relationship("Store", back_populates="purchase_orders")
     items = relationship("PurchaseOrderItem", back_populates="purchase_order")
 
+    __table_args__ = (
+        Index('ix_purchase_orders_store_status', 'store_id', 'status'),
+    )
+
 class PurchaseOrderItem(Base):
     __tablename__ = "purchase_order_items"
 
     id = Column(Integer, primary_key=True, index=True)
-    purchase_order_id = Column(Integer, ForeignKey("purchase_orders.id"))
+    purchase_order_id = Column(Integer, ForeignKey("purchase_orders.id"), index=True)
     product_id = Column(Integer, ForeignKey("products.id"))
     quantity = Column(Integer, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
     purchase_order = relationship("PurchaseOrder", back_populates="items")
-    product = relationship("Product", back_populates="purchase_order_items") 
\ No newline at end of file
+    product = relationship("Product", back_populates="purchase_order_items")
+
+class ProductRollup(Base):
+    """Per-product inventory aggregates, maintained by iaps.data.rollups"""
+    __tablename__ = "product_rollups"
+
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), primary_key=True)
+    store_count = Column(Integer, nullable=False, default=0)
+    total_quantity = Column(BigInteger, nullable=False, default=0)
+    low_stock_count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class StoreRollup(Base):
+    """Per-store inventory aggregates, maintained by iaps.data.rollups"""
+    __tablename__ = "store_rollups"
+
+    store_id = Column(Integer, ForeignKey("stores.id", ondelete="CASCADE"), primary_key=True)
+    total_products = Column(Integer, nullable=False, default=0)
+    total_quantity = Column(BigInteger, nullable=False, default=0)
+    low_stock_items = Column(Integer, nullable=False, default=0)
+    restock_count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class RegionRollup(Base):
+    """Per-region inventory aggregates; stores without a region use ''"""
+    __tablename__ = "region_rollups"
+
+    region = Column(String, primary_key=True)
+    store_count = Column(Integer, nullable=False, default=0)
+    total_products = Column(Integer, nullable=False, default=0)
+    total_quantity = Column(BigInteger, nullable=False, default=0)
+    low_stock_count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class RegionProductRollup(Base):
+    """Stores stocking each product per region, backing distinct product counts"""
+    __tablename__ = "region_product_rollups"
+
+    region = Column(String, primary_key=True)
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), primary_key=True)
+    store_count = Column(Integer, nullable=False, default=0)
+
+class LowStockEvent(Base):
+    """Append-only log of (product, store) pairs entering or leaving low stock.
+
+    Written by iaps.data.rollups.apply_inventory_deltas alongside the rollups.
+    """
+    __tablename__ = "low_stock_events"
+
+    id = Column(BigInteger, primary_key=True)
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), nullable=False)
+    store_id = Column(Integer, ForeignKey("stores.id", ondelete="CASCADE"), nullable=False)
+    transition = Column(Enum(LowStockTransition), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        Index('ix_low_stock_events_store_id', 'store_id', 'id'),
+    )
+
+class InventoryMovement(Base):
+    """Append-only log of changes to inventory quantities.
+
+    Every write path in iaps.data and the inventory API records its deltas
+    here; iaps.data.ledger folds old movements into InventoryCheckpoint.
+    """
+    __tablename__ = "inventory_movements"
+
+    id = Column(BigInteger, primary_key=True)
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), nullable=False)
+    store_id = Column(Integer, ForeignKey("stores.id", ondelete="CASCADE"), nullable=False)
+    movement_type = Column(Enum(MovementType), nullable=False)
+    quantity_change = Column(Integer, nullable=False)
+    purchase_order_id = Column(Integer, ForeignKey("purchase_orders.id", ondelete="SET NULL"), nullable=True)
+    reference = Column(String, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        Index('ix_inventory_movements_store_product', 'store_id', 'product_id', 'id'),
+        Index('ix_inventory_movements_created_at', 'created_at', postgresql_using='brin'),
+    )
+
+class InventoryCheckpoint(Base):
+    """Compacted ledger state of a (product, store) pair.
+
+    Holds the running totals of every movement up to and including
+    ``movement_id``; the pair's quantity is this plus its later movements.
+    """
+    __tablename__ = "inventory_checkpoints"
+
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), primary_key=True)
+    store_id = Column(Integer, ForeignKey("stores.id", ondelete="CASCADE"), primary_key=True)
+    movement_id = Column(BigInteger, nullable=False, default=0)
+    quantity = Column(BigInteger, nullable=False, default=0)
+    restock_count = Column(Integer, nullable=False, default=0)
+    compacted_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+class ForecastRun(Base):
+    """One pass of the forecasting pipeline, checkpointed for resume.
+
+    The checkpoint is the last (product_id, store_id) whose forecast has been
+    committed; series are processed in that key order.
+    """
+    __tablename__ = "forecast_runs"
+
+    id = Column(Integer, primary_key=True)
+    status = Column(Enum(ForecastRunStatus), nullable=False, default=ForecastRunStatus.RUNNING)
+    window_days = Column(Integer, nullable=False)
+    holdout_days = Column(Integer, nullable=False)
+    window_end = Column(Date, nullable=False)
+    checkpoint_product_id = Column(Integer, nullable=True)
+    checkpoint_store_id = Column(Integer, nullable=True)
+    # Incremental runs only refit series with late sales or drifted forecasts
+    incremental = Column(Boolean, nullable=False, default=False)
+    # In standard deviations of the units predicted since the last fit
+    drift_threshold = Column(Float, nullable=True)
+    series_count = Column(BigInteger, nullable=False, default=0)
+    skipped_count = Column(BigInteger, nullable=False, default=0)
+    started_at = Column(DateTime(timezone=True), server_default=func.now())
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+class DemandForecast(Base):
+    """Latest fitted daily demand per (product, store), written by iaps.ml.forecasting"""
+    __tablename__ = "demand_forecasts"
+
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), primary_key=True)
+    store_id = Column(Integer, ForeignKey("stores.id", ondelete="CASCADE"), primary_key=True)
+    model = Column(String, nullable=False)
+    daily_demand = Column(Float, nullable=False)
+    demand_std = Column(Float, nullable=False)
+    # Holdout errors of the same model fitted without the last holdout_days
+    mae = Column(Float, nullable=True)
+    rmse = Column(Float, nullable=True)
+    bias = Column(Float, nullable=True)
+    demand_days = Column(Integer, nullable=False)
+    window_end = Column(Date, nullable=False)
+    # Latest SalesHistory.created_at among the window's sales when fitted
+    sales_high_water = Column(DateTime(timezone=True), nullable=True)
+    run_id = Column(Integer, ForeignKey("forecast_runs.id", ondelete="SET NULL"), nullable=True)
+    fitted_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
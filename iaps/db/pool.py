@@ -0,0 +1,194 @@
+"""Connection pool configuration and metrics.
+
+Pool sizing and connection health are read from the environment:
+
+    DB_POOL_SIZE              persistent connections per engine (5)
+    DB_MAX_OVERFLOW           extra connections allowed under burst load (10)
+    DB_POOL_TIMEOUT           seconds to wait for a free connection (30)
+    DB_POOL_RECYCLE           seconds before a connection is replaced (1800)
+    DB_POOL_PRE_PING          test connections on checkout, e.g. after a failover (true)
+    DB_STATEMENT_TIMEOUT_MS   server-side statement timeout, 0 disables it (0)
+    DB_PGBOUNCER              running behind PgBouncer in transaction mode (false)
+
+Engines created with :func:`engine_options` use instrumented pools whose
+checkout waits, timeouts and overflow checkouts are rendered in the
+Prometheus text format by :func:`render_pool_metrics`.
+"""
+import os
+import threading
+import time
+from typing import Dict
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, default))
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    return os.getenv(name, str(default)).strip().lower() in ("1", "true", "yes", "on")
+
+
+POOL_SIZE = _env_int("DB_POOL_SIZE", 5)
+MAX_OVERFLOW = _env_int("DB_MAX_OVERFLOW", 10)
+POOL_TIMEOUT = _env_int("DB_POOL_TIMEOUT", 30)
+POOL_RECYCLE = _env_int("DB_POOL_RECYCLE", 1800)
+POOL_PRE_PING = _env_bool("DB_POOL_PRE_PING", True)
+STATEMENT_TIMEOUT_MS = _env_int("DB_STATEMENT_TIMEOUT_MS", 0)
+PGBOUNCER = _env_bool("DB_PGBOUNCER", False)
+
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0)
+
+
+class PoolMetrics:
+    """Checkout wait histogram and event counters for one pool"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.buckets = [0] * len(WAIT_BUCKETS)
+        self.wait_count = 0
+        self.wait_sum = 0.0
+        self.timeouts = 0
+        self.overflows = 0
+
+    def observe_wait(self, seconds: float) -> None:
+        with self.lock:
+            self.wait_count += 1
+            self.wait_sum += seconds
+            for index, bound in enumerate(WAIT_BUCKETS):
+                if seconds <= bound:
+                    self.buckets[index] += 1
+
+
+class InstrumentedPoolMixin:
+    """Times every checkout from the pool's queue"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            with self.metrics.lock:
+                self.metrics.timeouts += 1
+            raise
+        finally:
+            self.metrics.observe_wait(time.perf_counter() - started)
+        if self.checkedout() > self.size():
+            with self.metrics.lock:
+                self.metrics.overflows += 1
+        return connection
+
+
+class InstrumentedQueuePool(InstrumentedPoolMixin, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+_engines: Dict[str, Engine] = {}
+
+
+def engine_options(asyncpg: bool = False) -> Dict:
+    """Keyword arguments for create_engine / create_async_engine"""
+    connect_args = {}
+    if STATEMENT_TIMEOUT_MS and not PGBOUNCER:
+        # PgBouncer rejects startup parameters, so it gets SET LOCAL instead
+        if asyncpg:
+            connect_args["server_settings"] = {"statement_timeout": str(STATEMENT_TIMEOUT_MS)}
+        else:
+            connect_args["options"] = f"-c statement_timeout={STATEMENT_TIMEOUT_MS}"
+    if PGBOUNCER and asyncpg:
+        # Prepared statements do not survive transaction-mode server switches
+        connect_args["statement_cache_size"] = 0
+
+    return {
+        "poolclass": InstrumentedAsyncQueuePool if asyncpg else InstrumentedQueuePool,
+        "pool_size": POOL_SIZE,
+        "max_overflow": MAX_OVERFLOW,
+        "pool_timeout": POOL_TIMEOUT,
+        "pool_recycle": POOL_RECYCLE,
+        "pool_pre_ping": POOL_PRE_PING,
+        "connect_args": connect_args,
+    }
+
+
+def asyncpg_url(url: str) -> str:
+    """Disable SQLAlchemy's prepared statement cache behind PgBouncer"""
+    if not PGBOUNCER:
+        return url
+    return str(make_url(url).update_query_dict({"prepared_statement_cache_size": "0"}))
+
+
+def register_engine(name: str, engine: Engine) -> None:
+    """Export ``engine``'s pool metrics and apply per-transaction settings"""
+    _engines[name] = engine
+    if PGBOUNCER and STATEMENT_TIMEOUT_MS:
+        @event.listens_for(engine, "begin")
+        def set_statement_timeout(connection):
+            connection.exec_driver_sql(f"SET LOCAL statement_timeout = {STATEMENT_TIMEOUT_MS}")
+
+
+POOL_METRIC_FAMILIES = (
+    ("iaps_db_pool_size", "gauge", "Configured persistent connections"),
+    ("iaps_db_pool_checked_out", "gauge", "Connections currently in use"),
+    ("iaps_db_pool_checked_in", "gauge", "Idle connections in the pool"),
+    ("iaps_db_pool_overflow", "gauge", "Connections open beyond pool_size"),
+    ("iaps_db_pool_overflow_checkouts_total", "counter", "Checkouts served by overflow connections"),
+    ("iaps_db_pool_timeouts_total", "counter", "Checkouts that gave up after pool_timeout"),
+    ("iaps_db_pool_checkout_wait_seconds", "histogram", "Time spent waiting for a connection"),
+)
+
+
+def _pool_samples(name: str, engine: Engine) -> Dict[str, list]:
+    """One consistent reading of a pool, as samples keyed by metric family"""
+    pool = engine.pool
+    label = f'pool="{name}"'
+    samples = {
+        "iaps_db_pool_size": [f"iaps_db_pool_size{{{label}}} {pool.size()}"],
+        "iaps_db_pool_checked_out": [f"iaps_db_pool_checked_out{{{label}}} {pool.checkedout()}"],
+        "iaps_db_pool_checked_in": [f"iaps_db_pool_checked_in{{{label}}} {pool.checkedin()}"],
+        "iaps_db_pool_overflow": [f"iaps_db_pool_overflow{{{label}}} {max(pool.overflow(), 0)}"],
+    }
+
+    metrics = getattr(pool, "metrics", None)
+    if metrics is None:
+        return samples
+    with metrics.lock:
+        samples["iaps_db_pool_overflow_checkouts_total"] = [
+            f"iaps_db_pool_overflow_checkouts_total{{{label}}} {metrics.overflows}"
+        ]
+        samples["iaps_db_pool_timeouts_total"] = [f"iaps_db_pool_timeouts_total{{{label}}} {metrics.timeouts}"]
+        samples["iaps_db_pool_checkout_wait_seconds"] = [
+            f'iaps_db_pool_checkout_wait_seconds_bucket{{{label},le="{bound}"}} {count}'
+            for bound, count in zip(WAIT_BUCKETS, metrics.buckets)
+        ] + [
+            f'iaps_db_pool_checkout_wait_seconds_bucket{{{label},le="+Inf"}} {metrics.wait_count}',
+            f"iaps_db_pool_checkout_wait_seconds_sum{{{label}}} {metrics.wait_sum}",
+            f"iaps_db_pool_checkout_wait_seconds_count{{{label}}} {metrics.wait_count}",
+        ]
+    return samples
+
+
+def render_pool_metrics() -> str:
+    """Every registered pool's metrics in the Prometheus text format.
+
+    Each family's HELP and TYPE lines are followed by that family's samples
+    for every pool, as the exposition format requires.
+    """
+    pools = [_pool_samples(name, engine) for name, engine in sorted(_engines.items())]
+    lines = []
+    for family, kind, description in POOL_METRIC_FAMILIES:
+        lines.append(f"# HELP {family} {description}")
+        lines.append(f"# TYPE {family} {kind}")
+        for samples in pools:
+            lines.extend(samples.get(family, ()))
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,121 @@
+"""Read-replica selection with lag-aware fallback.
+
+Replicas are tried round-robin. Each one's replication lag is measured at
+most once per ``check_interval`` seconds and cached; a replica that lags
+by more than ``max_lag`` seconds, is not streaming from the primary, or
+cannot be reached, is skipped until its next check. When no replica
+qualifies the caller falls back to the primary.
+"""
+import itertools
+import logging
+import threading
+import time
+from typing import List, Optional
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+# A replica whose WAL receiver has heard nothing from the primary for this
+# long is treated as cut off. An idle primary still answers the receiver's
+# pings every wal_receiver_timeout / 2 (30 seconds by default).
+RECEIVER_SILENCE_SECONDS = 60
+
+# NULL, meaning unhealthy, unless the server is a standby streaming from
+# the primary and has heard from it recently: a standalone or promoted
+# server, or a standby whose receiver disconnected, would otherwise report
+# zero lag while serving stale reads. A healthy replica reports zero when
+# it has replayed everything it received (an idle primary must not look
+# like a lagging one), otherwise the age of the last replayed transaction.
+# The receiver's status is only visible to roles with pg_read_all_stats.
+REPLICATION_LAG_SQL = text(
+    "SELECT CASE "
+    "WHEN NOT pg_is_in_recovery() THEN NULL "
+    "WHEN receiver.status IS DISTINCT FROM 'streaming' THEN NULL "
+    "WHEN receiver.last_msg_receipt_time IS NULL "
+    f"OR receiver.last_msg_receipt_time < now() - interval '{RECEIVER_SILENCE_SECONDS} seconds' THEN NULL "
+    "WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE coalesce(extract(epoch FROM now() - pg_last_xact_replay_timestamp()), 0) "
+    "END "
+    "FROM (SELECT 1) AS probe LEFT JOIN pg_stat_wal_receiver AS receiver ON true"
+)
+
+
+class Replica:
+    """One replica's engines, session factories and last measured lag"""
+
+    def __init__(self, name: str, engine, session_factory, async_engine, async_session_factory):
+        self.name = name
+        self.engine = engine
+        self.session_factory = session_factory
+        self.async_engine = async_engine
+        self.async_session_factory = async_session_factory
+        self.lag: Optional[float] = None
+        self.checked_at = 0.0
+
+    def record(self, lag: Optional[float]) -> None:
+        self.lag = lag
+        self.checked_at = time.monotonic()
+
+
+class ReplicaSet:
+    def __init__(self, replicas: List[Replica], max_lag: float, check_interval: float):
+        self.replicas = replicas
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._order = itertools.cycle(range(len(replicas))) if replicas else None
+        self._lock = threading.Lock()
+
+    def __bool__(self) -> bool:
+        return bool(self.replicas)
+
+    def _candidates(self) -> List[Replica]:
+        with self._lock:
+            start = next(self._order)
+        return self.replicas[start:] + self.replicas[:start]
+
+    def _due(self, replica: Replica) -> bool:
+        return time.monotonic() - replica.checked_at >= self.check_interval
+
+    def _usable(self, replica: Replica) -> bool:
+        return replica.lag is not None and replica.lag <= self.max_lag
+
+    def _measured(self, replica: Replica, lag) -> None:
+        if lag is None:
+            logger.warning("Replica %s is not streaming from the primary, reading from primary", replica.name)
+        replica.record(None if lag is None else float(lag))
+
+    def _failed(self, replica: Replica, error: Exception) -> None:
+        logger.warning("Replica %s unavailable, reading from primary: %s", replica.name, error)
+        replica.record(None)
+
+    def pick(self) -> Optional[Replica]:
+        """A replica that is within the lag budget, or None for the primary"""
+        if not self.replicas:
+            return None
+        for replica in self._candidates():
+            if self._due(replica):
+                try:
+                    with replica.engine.connect() as connection:
+                        self._measured(replica, connection.execute(REPLICATION_LAG_SQL).scalar())
+                except Exception as error:
+                    self._failed(replica, error)
+            if self._usable(replica):
+                return replica
+        return None
+
+    async def pick_async(self) -> Optional[Replica]:
+        """Async counterpart of :meth:`pick`, sharing the cached lag"""
+        if not self.replicas:
+            return None
+        for replica in self._candidates():
+            if self._due(replica):
+                try:
+                    async with replica.async_engine.connect() as connection:
+                        result = await connection.execute(REPLICATION_LAG_SQL)
+                        self._measured(replica, result.scalar())
+                except Exception as error:
+                    self._failed(replica, error)
+            if self._usable(replica):
+                return replica
+        return None
@@ -0,0 +1,320 @@
+"""Demand-rate estimation and stock-out prediction.
+
+Daily sales per (product, store) are summed in Postgres for a trailing
+window and laid out as a series x day matrix. Demand rates are then
+estimated for every series at once with numpy, stepping through the days
+rather than through the series:
+
+* smooth series use an exponentially weighted moving average (EWMA) of
+  daily demand;
+* intermittent series (average interval between demand days above 1.32)
+  use Croston's method with the Syntetos-Boylan bias correction.
+
+The forecasting pipeline additionally pools short series, those observed
+for fewer than ``SHORT_SERIES_DAYS`` days of the window, with their
+product category (see :func:`pool_short_series`).
+
+Demand over ``d`` days is treated as normal with mean ``rate * d`` and
+standard deviation ``sigma * sqrt(d)``, which gives the expected days until
+the reorder point is reached and an interval around it.
+"""
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from ..db.models import DemandForecast, Inventory, Product, Store, SalesHistory
+
+DEMAND_WINDOW_DAYS = 90
+SMOOTHING_ALPHA = 0.1
+INTERMITTENT_ADI = 1.32
+# Two-sided 90% interval
+CONFIDENCE_Z = 1.645
+MAX_PREDICTION_DAYS = 365
+DEFAULT_REORDER_POINT = 10
+# Series per numpy block, bounding the size of the demand matrix
+DEMAND_BLOCK_SIZE = 50000
+# Series observed for fewer days than this borrow from their category
+SHORT_SERIES_DAYS = 28
+
+EWMA = "ewma"
+CROSTON = "croston"
+POOLED = "pooled"
+
+
+def daily_sales_query(
+    db: Session,
+    start_date: datetime,
+    end_date: datetime,
+    store_id: Optional[int] = None,
+    product_id: Optional[int] = None
+):
+    """SUM(quantity_sold) per (product_id, store_id, day) for a window"""
+    day = func.date(SalesHistory.sale_date)
+    query = db.query(
+        SalesHistory.product_id,
+        SalesHistory.store_id,
+        day.label('day'),
+        func.sum(SalesHistory.quantity_sold)
+    ).filter(SalesHistory.sale_date >= start_date, SalesHistory.sale_date < end_date)
+
+    if store_id:
+        query = query.filter(SalesHistory.store_id == store_id)
+    if product_id:
+        query = query.filter(SalesHistory.product_id == product_id)
+
+    return query.group_by(SalesHistory.product_id, SalesHistory.store_id, day)
+
+
+def estimate_demand(matrix: np.ndarray, alpha: float = SMOOTHING_ALPHA):
+    """Daily demand rate, its standard deviation and the model used per row.
+
+    ``matrix`` holds one row per series and one column per day, oldest first.
+    """
+    series_count, days = matrix.shape
+    demand_days = np.count_nonzero(matrix, axis=1)
+    average_interval = days / np.maximum(demand_days, 1)
+
+    level = np.zeros(series_count)
+    variance = np.zeros(series_count)
+    # Croston starts from the window's mean demand size and interval
+    size = matrix.sum(axis=1) / np.maximum(demand_days, 1)
+    interval = average_interval.copy()
+    since = np.ones(series_count)
+
+    for t in range(days):
+        demand = matrix[:, t]
+        error = demand - level
+        level += alpha * error
+        variance = (1 - alpha) * (variance + alpha * error ** 2)
+
+        # Croston only updates on days with demand
+        sold = demand > 0
+        size = np.where(sold, size + alpha * (demand - size), size)
+        interval = np.where(sold, interval + alpha * (since - interval), interval)
+        since = np.where(sold, 1, since + 1)
+
+    intermittent = (demand_days > 0) & (average_interval > INTERMITTENT_ADI)
+    croston = size / interval * (1 - alpha / 2)
+
+    rate = np.where(intermittent, croston, level)
+    return rate, np.sqrt(variance), np.where(intermittent, CROSTON, EWMA)
+
+
+def pool_short_series(
+    rate: np.ndarray,
+    model: np.ndarray,
+    totals: np.ndarray,
+    history_days: np.ndarray,
+    prior: np.ndarray,
+    short_days: int = SHORT_SERIES_DAYS
+):
+    """Blend the rates of series observed for fewer than ``short_days`` days with ``prior``.
+
+    Days before a series existed are zeros in the matrix, so a smoothed rate
+    underestimates a new series. Its own rate is instead its mean over the
+    days observed, weighted by the share of ``short_days`` they cover, and
+    the category rate in ``prior`` makes up the rest.
+    """
+    short = history_days < short_days
+    weight = history_days / max(short_days, 1)
+    own = totals / np.maximum(history_days, 1)
+    pooled = weight * own + (1 - weight) * prior
+    return np.where(short, pooled, rate), np.where(short, POOLED, model)
+
+
+def days_until_reorder(stock: np.ndarray, rate: np.ndarray, sigma: np.ndarray, z: float = CONFIDENCE_Z):
+    """Expected days until ``stock`` units are sold, with a z-sigma interval.
+
+    The bounds solve ``rate * d +/- z * sigma * sqrt(d) = stock`` for ``d``.
+    Series without demand are capped at MAX_PREDICTION_DAYS.
+    """
+    stock = np.maximum(stock, 0).astype(float)
+    selling = rate > 0
+    safe_rate = np.where(selling, rate, 1.0)
+    spread = z * sigma
+    root = np.sqrt(spread ** 2 + 4 * safe_rate * stock)
+
+    expected = stock / safe_rate
+    lower = ((root - spread) / (2 * safe_rate)) ** 2
+    upper = ((root + spread) / (2 * safe_rate)) ** 2
+
+    def cap(days):
+        days = np.where(selling, days, MAX_PREDICTION_DAYS)
+        return np.clip(np.where(stock > 0, days, 0), 0, MAX_PREDICTION_DAYS)
+
+    return cap(expected), cap(lower), cap(upper)
+
+
+def demand_matrix(
+    series_index: np.ndarray,
+    day_index: np.ndarray,
+    quantity: np.ndarray,
+    series_count: int,
+    days: int
+) -> np.ndarray:
+    """Dense series x day matrix from sparse (series, day, quantity) triples"""
+    matrix = np.zeros((series_count, days))
+    in_window = (day_index >= 0) & (day_index < days)
+    np.add.at(matrix, (series_index[in_window], day_index[in_window]), quantity[in_window])
+    return matrix
+
+
+def day_offsets(days, start_day: pd.Timestamp) -> np.ndarray:
+    """Whole days between ``start_day`` and each of ``days``"""
+    return (pd.to_datetime(pd.Series(days)) - start_day).dt.days.to_numpy()
+
+
+def demand_window(now: datetime, window_days: int):
+    """[start, end) midnight bounds of the trailing window ending today"""
+    end_day = pd.Timestamp(now.date()) + pd.Timedelta(days=1)
+    return end_day - pd.Timedelta(days=window_days), end_day
+
+
+def _inventory_frame(db: Session, store_id: Optional[int], product_id: Optional[int]) -> pd.DataFrame:
+    inventory = db.query(
+        Inventory.product_id,
+        Product.name,
+        Product.sku,
+        Inventory.store_id,
+        Store.name,
+        Inventory.quantity,
+        Inventory.reorder_point,
+        Inventory.reorder_quantity
+    ).select_from(Inventory)\
+        .join(Product, Product.id == Inventory.product_id)\
+        .join(Store, Store.id == Inventory.store_id)
+    if store_id:
+        inventory = inventory.filter(Inventory.store_id == store_id)
+    if product_id:
+        inventory = inventory.filter(Inventory.product_id == product_id)
+
+    frame = pd.DataFrame.from_records(inventory.all(), columns=[
+        'product_id', 'product_name', 'product_sku', 'store_id', 'store_name',
+        'current_quantity', 'reorder_point', 'reorder_quantity'
+    ])
+    frame['current_quantity'] = frame['current_quantity'].fillna(0).astype('int64')
+    return frame
+
+
+def load_forecast_frame(
+    db: Session,
+    store_id: Optional[int] = None,
+    product_id: Optional[int] = None
+) -> pd.DataFrame:
+    """Inventory rows in scope with the demand stored by the forecasting pipeline.
+
+    Pairs the pipeline has not fitted yet get zero demand.
+    """
+    frame = _inventory_frame(db, store_id, product_id)
+    forecasts = db.query(
+        DemandForecast.product_id,
+        DemandForecast.store_id,
+        DemandForecast.daily_demand,
+        DemandForecast.demand_std,
+        DemandForecast.model
+    )
+    if store_id:
+        forecasts = forecasts.filter(DemandForecast.store_id == store_id)
+    if product_id:
+        forecasts = forecasts.filter(DemandForecast.product_id == product_id)
+
+    frame = frame.merge(
+        pd.DataFrame.from_records(forecasts.all(), columns=[
+            'product_id', 'store_id', 'daily_demand', 'demand_std', 'demand_model'
+        ]),
+        on=['product_id', 'store_id'],
+        how='left'
+    )
+    frame['daily_demand'] = frame['daily_demand'].fillna(0.0)
+    frame['demand_std'] = frame['demand_std'].fillna(0.0)
+    return frame
+
+
+def load_demand_frame(
+    db: Session,
+    window_days: int = DEMAND_WINDOW_DAYS,
+    store_id: Optional[int] = None,
+    product_id: Optional[int] = None,
+    now: Optional[datetime] = None
+) -> pd.DataFrame:
+    """Inventory rows in scope with demand estimated from sales, in two queries"""
+    start_day, end_day = demand_window(now or datetime.utcnow(), window_days)
+    frame = _inventory_frame(db, store_id, product_id)
+    frame['series'] = np.arange(len(frame))
+
+    sales = pd.DataFrame.from_records(
+        daily_sales_query(
+            db, start_day.to_pydatetime(), end_day.to_pydatetime(), store_id, product_id
+        ).all(),
+        columns=['product_id', 'store_id', 'day', 'quantity']
+    ).merge(frame[['product_id', 'store_id', 'series']], on=['product_id', 'store_id'])
+    sales = sales.sort_values('series', kind='mergesort')
+
+    rates = np.zeros(len(frame))
+    sigmas = np.zeros(len(frame))
+    models = np.full(len(frame), EWMA, dtype=object)
+    bounds = np.searchsorted(sales['series'].to_numpy(), np.arange(0, len(frame) + DEMAND_BLOCK_SIZE, DEMAND_BLOCK_SIZE))
+    for block, first in enumerate(range(0, len(frame), DEMAND_BLOCK_SIZE)):
+        last = min(first + DEMAND_BLOCK_SIZE, len(frame))
+        block_sales = sales.iloc[bounds[block]:bounds[block + 1]]
+        matrix = demand_matrix(
+            block_sales['series'].to_numpy() - first,
+            day_offsets(block_sales['day'], start_day),
+            block_sales['quantity'].to_numpy(dtype=float),
+            last - first,
+            window_days
+        )
+        rates[first:last], sigmas[first:last], models[first:last] = estimate_demand(matrix)
+
+    frame['daily_demand'] = rates
+    frame['demand_std'] = sigmas
+    frame['demand_model'] = models
+    return frame.drop(columns=['series'])
+
+
+def predict_stockouts(
+    db: Session,
+    store_id: Optional[int] = None,
+    product_id: Optional[int] = None,
+    window_days: int = DEMAND_WINDOW_DAYS,
+    limit: Optional[int] = None,
+    now: Optional[datetime] = None,
+    use_forecasts: bool = False
+) -> List[Dict]:
+    """Days until each in-scope pair hits its reorder point, most urgent first.
+
+    Demand comes from the stored pipeline forecasts with ``use_forecasts``,
+    otherwise it is estimated from recent sales on the fly.
+    """
+    now = now or datetime.utcnow()
+    if use_forecasts:
+        frame = load_forecast_frame(db, store_id, product_id)
+    else:
+        frame = load_demand_frame(db, window_days, store_id, product_id, now)
+
+    expected, lower, upper = days_until_reorder(
+        (frame['current_quantity'] - frame['reorder_point'].fillna(DEFAULT_REORDER_POINT)).to_numpy(),
+        frame['daily_demand'].to_numpy(),
+        frame['demand_std'].to_numpy()
+    )
+    # Narrow intervals relative to the horizon mean confident predictions
+    with np.errstate(invalid='ignore', divide='ignore'):
+        confidence = np.where(upper + lower > 0, 1 - (upper - lower) / (upper + lower), 1.0)
+
+    frame = frame.assign(
+        predicted_days_until_reorder=expected,
+        days_until_reorder_lower=lower,
+        days_until_reorder_upper=upper,
+        confidence_score=np.clip(confidence, 0, 1)
+    ).sort_values(['predicted_days_until_reorder', 'product_id', 'store_id'], kind='mergesort')
+    if limit is not None:
+        frame = frame.head(limit)
+
+    frame['recommended_restock_date'] = [
+        now + timedelta(days=float(days)) for days in frame['predicted_days_until_reorder']
+    ]
+    return frame.drop(columns=['product_sku', 'reorder_point', 'reorder_quantity']).to_dict('records')
@@ -0,0 +1,484 @@
+"""Batch demand forecasting pipeline.
+
+Walks every (product, store) inventory pair in key order, in chunks. For
+each chunk the parent process pulls the daily sales of those series in one
+range query and hands the sparse (series, day, quantity) triples to a
+process pool. The workers fit the demand models from :mod:`iaps.ml.demand`
+on a whole chunk at a time:
+
+* once without the last ``holdout_days`` to score the model on the held-out
+  days (MAE, RMSE and bias);
+* once on the full window for the stored forecast.
+
+Series observed for fewer than ``short_series_days`` days of the window (a
+pair stocked recently, with no earlier sales) are pooled by product
+category: their own mean over the observed days is blended with the
+category's mean daily rate per stocked pair, measured once per run. Every
+other series is fitted on its own.
+
+Results are upserted into ``demand_forecasts`` in chunk order, and the
+run's checkpoint is advanced in the same transaction, so an interrupted run
+resumes after the last committed chunk. Workers share nothing, so
+throughput grows with the number of cores until the database becomes the
+bottleneck.
+
+Runs are incremental by default. Each forecast keeps a high-water mark, the
+latest ``SalesHistory.created_at`` it was fitted on, and a series is only
+refit when:
+
+* it has no forecast yet;
+* sales lines for days its forecast already covered were loaded after its
+  high-water mark (late or backfilled data);
+* its forecast has drifted: the units it predicted for the whole days
+  since it was fitted differ from the units actually sold on them by more
+  than day-to-day noise explains. Daily sales are treated as Poisson, so
+  the tolerance is ``drift_threshold`` standard deviations (the square
+  root of the predicted units), and never less than ``DRIFT_MIN_UNITS``.
+
+Every other series keeps its forecast, so a nightly run only touches the
+SKUs whose sales moved away from their forecast.
+
+Run nightly with::
+
+    python -m iaps.ml.forecasting [--workers N] [--chunk-size N] [--full] [--restart]
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import and_, func, or_, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from ..db.database import SessionLocal
+from ..db.models import DemandForecast, ForecastRun, ForecastRunStatus, Inventory, Product, SalesHistory
+from .demand import (
+    DEMAND_WINDOW_DAYS,
+    SHORT_SERIES_DAYS,
+    SMOOTHING_ALPHA,
+    daily_sales_query,
+    day_offsets,
+    demand_matrix,
+    demand_window,
+    estimate_demand,
+    pool_short_series
+)
+
+logger = logging.getLogger(__name__)
+
+FORECAST_CHUNK_SIZE = 20000
+FORECAST_WRITE_BATCH = 5000
+HOLDOUT_DAYS = 14
+# Standard deviations between predicted and actual sales since the fit
+# before a refit; an accurate forecast is refit on well under 1% of runs
+DRIFT_THRESHOLD = 3.0
+# Smallest difference in units that counts as drift, so slow series are not
+# refit over a single unit
+DRIFT_MIN_UNITS = 3.0
+
+Key = Tuple[int, int]
+
+
+def fit_series(
+    series_count: int,
+    days: int,
+    series_index: np.ndarray,
+    day_index: np.ndarray,
+    quantity: np.ndarray,
+    holdout_days: int = HOLDOUT_DAYS,
+    alpha: float = SMOOTHING_ALPHA,
+    created_offset: Optional[np.ndarray] = None,
+    prior: Optional[np.ndarray] = None,
+    short_days: int = SHORT_SERIES_DAYS
+) -> Dict[str, np.ndarray]:
+    """Fit and score every series of one chunk; runs in a worker process.
+
+    With ``created_offset`` (the window day each pair was stocked on) and its
+    category's daily rate in ``prior``, short series are pooled.
+    """
+    matrix = demand_matrix(series_index, day_index, quantity, series_count, days)
+
+    history = None
+    if prior is not None:
+        # A series is observed from when it was stocked, or from its first
+        # sale when sales were loaded for days before that
+        first_sale = np.full(series_count, days)
+        in_window = (day_index >= 0) & (day_index < days)
+        np.minimum.at(first_sale, series_index[in_window], day_index[in_window])
+        history = days - np.minimum(np.clip(created_offset, 0, days), first_sale)
+
+    def estimate(window: np.ndarray, observed: Optional[np.ndarray]):
+        rate, std, model = estimate_demand(window, alpha)
+        if observed is not None:
+            rate, model = pool_short_series(rate, model, window.sum(axis=1), observed, prior, short_days)
+        return rate, std, model
+
+    result = {}
+    if 0 < holdout_days < days:
+        observed = None if history is None else np.maximum(history - holdout_days, 0)
+        rate, _, _ = estimate(matrix[:, :-holdout_days], observed)
+        errors = matrix[:, -holdout_days:] - rate[:, None]
+        result['mae'] = np.abs(errors).mean(axis=1)
+        result['rmse'] = np.sqrt((errors ** 2).mean(axis=1))
+        result['bias'] = errors.mean(axis=1)
+
+    result['daily_demand'], result['demand_std'], result['model'] = estimate(matrix, history)
+    result['demand_days'] = np.count_nonzero(matrix, axis=1)
+    return result
+
+
+def series_chunk(db: Session, after: Optional[Key], size: int) -> List[Key]:
+    """The next ``size`` inventory pairs after ``after`` in key order"""
+    key = tuple_(Inventory.product_id, Inventory.store_id)
+    query = db.query(Inventory.product_id, Inventory.store_id)\
+        .filter(Inventory.product_id.isnot(None), Inventory.store_id.isnot(None))
+    if after is not None:
+        query = query.filter(key > tuple_(*after))
+    return [tuple(row) for row in query.order_by(Inventory.product_id, Inventory.store_id).limit(size)]
+
+
+def chunk_sales(db: Session, keys: List[Key], start_day: pd.Timestamp, end_day: pd.Timestamp):
+    """Sparse daily sales of ``keys`` as (series, day, quantity) arrays, with
+    each series' high-water mark"""
+    key = tuple_(SalesHistory.product_id, SalesHistory.store_id)
+    rows = daily_sales_query(db, start_day.to_pydatetime(), end_day.to_pydatetime())\
+        .add_columns(func.max(SalesHistory.created_at))\
+        .filter(key >= tuple_(*keys[0]), key <= tuple_(*keys[-1]))\
+        .all()
+
+    # The key range can include pairs without inventory; the merge drops them
+    sales = pd.DataFrame.from_records(rows, columns=['product_id', 'store_id', 'day', 'quantity', 'loaded_at']).merge(
+        pd.DataFrame(keys, columns=['product_id', 'store_id']).reset_index().rename(columns={'index': 'series'}),
+        on=['product_id', 'store_id']
+    )
+    high_water = sales.groupby('series')['loaded_at'].max().reindex(range(len(keys)))
+    return (
+        sales['series'].to_numpy(),
+        day_offsets(sales['day'], start_day),
+        sales['quantity'].to_numpy(dtype=float),
+        [None if pd.isna(loaded_at) else loaded_at.to_pydatetime() for loaded_at in high_water]
+    )
+
+
+def category_rates(db: Session, start_day: pd.Timestamp, end_day: pd.Timestamp) -> Dict[Optional[str], float]:
+    """Mean daily units sold per stocked (product, store) pair, by product category"""
+    window_days = (end_day - start_day).days
+    sold = dict(
+        db.query(Product.category, func.sum(SalesHistory.quantity_sold))
+        .join(Product, Product.id == SalesHistory.product_id)
+        .filter(SalesHistory.sale_date >= start_day.to_pydatetime(), SalesHistory.sale_date < end_day.to_pydatetime())
+        .group_by(Product.category)
+        .all()
+    )
+    stocked = db.query(Product.category, func.count())\
+        .join(Inventory, Inventory.product_id == Product.id)\
+        .group_by(Product.category)
+    return {category: float(sold.get(category) or 0) / (pairs * window_days) for category, pairs in stocked}
+
+
+def series_priors(
+    db: Session,
+    keys: List[Key],
+    start_day: pd.Timestamp,
+    rates: Dict[Optional[str], float]
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Window day each of ``keys`` was stocked on, and its category's daily rate"""
+    key = tuple_(Inventory.product_id, Inventory.store_id)
+    rows = db.query(Inventory.product_id, Inventory.store_id, Product.category, Inventory.created_at)\
+        .join(Product, Product.id == Inventory.product_id)\
+        .filter(key >= tuple_(*keys[0]), key <= tuple_(*keys[-1]))\
+        .all()
+    stocked = {(product_id, store_id): (category, created_at) for product_id, store_id, category, created_at in rows}
+
+    created_offset = np.zeros(len(keys), dtype=int)
+    prior = np.zeros(len(keys))
+    for index, pair in enumerate(keys):
+        category, created_at = stocked.get(pair, (None, None))
+        if created_at is not None:
+            created_offset[index] = (pd.Timestamp(created_at.date()) - start_day).days
+        prior[index] = rates.get(category, 0.0)
+    return created_offset, prior
+
+
+def stale_series(frame: pd.DataFrame, window_end, drift_threshold: float) -> np.ndarray:
+    """Mask of the series to refit for a run ending on ``window_end``.
+
+    ``frame`` holds one row per series: its forecast's ``daily_demand`` and
+    ``window_end`` (missing when it has none), ``late_sales`` (lines for
+    days the forecast already covered were loaded after it was fitted) and
+    ``sold``, the units sold on the whole days since its ``window_end``.
+    ``drift_threshold`` is in standard deviations of the predicted units.
+    """
+    unfitted = frame['window_end'].isna()
+    elapsed = (pd.Timestamp(window_end) - pd.to_datetime(frame['window_end'])).dt.days
+    predicted = (frame['daily_demand'] * elapsed).astype(float)
+    tolerance = np.maximum(drift_threshold * np.sqrt(predicted.clip(lower=0)), DRIFT_MIN_UNITS)
+    drifted = (predicted - frame['sold'].fillna(0).astype(float)).abs() > tolerance
+    late_sales = frame['late_sales'].fillna(False).astype(bool)
+    return (unfitted | late_sales | drifted).to_numpy()
+
+
+def series_to_refit(
+    db: Session,
+    run: ForecastRun,
+    keys: List[Key],
+    start_day: pd.Timestamp,
+    end_day: pd.Timestamp
+) -> List[Key]:
+    """The chunk's series without a forecast, with late sales or with drift"""
+    forecast_key = tuple_(DemandForecast.product_id, DemandForecast.store_id)
+    forecasts = db.query(
+        DemandForecast.product_id,
+        DemandForecast.store_id,
+        DemandForecast.daily_demand,
+        DemandForecast.window_end
+    ).filter(forecast_key >= tuple_(*keys[0]), forecast_key <= tuple_(*keys[-1]))
+
+    frame = pd.DataFrame(keys, columns=['product_id', 'store_id']).merge(
+        pd.DataFrame.from_records(forecasts.all(), columns=[
+            'product_id', 'store_id', 'daily_demand', 'window_end'
+        ]),
+        on=['product_id', 'store_id'],
+        how='left'
+    )
+    if frame['window_end'].isna().all():
+        return keys
+
+    # A series fitted without sales counts lines loaded after the fit
+    high_water = func.coalesce(DemandForecast.sales_high_water, DemandForecast.fitted_at)
+    # A forecast's last day was still in progress when it was fitted, so
+    # only the days before window_end count as covered; sales from that day
+    # on are checked against the forecast instead
+    covered = SalesHistory.sale_date < DemandForecast.window_end
+    since_fit = and_(
+        SalesHistory.sale_date >= DemandForecast.window_end,
+        SalesHistory.sale_date < run.window_end
+    )
+    sales_key = tuple_(SalesHistory.product_id, SalesHistory.store_id)
+    sales = db.query(
+        SalesHistory.product_id,
+        SalesHistory.store_id,
+        func.bool_or(and_(covered, SalesHistory.created_at > high_water)),
+        func.sum(SalesHistory.quantity_sold).filter(since_fit)
+    ).join(DemandForecast, and_(
+        DemandForecast.product_id == SalesHistory.product_id,
+        DemandForecast.store_id == SalesHistory.store_id
+    )).filter(
+        SalesHistory.sale_date >= start_day.to_pydatetime(),
+        SalesHistory.sale_date < end_day.to_pydatetime(),
+        or_(SalesHistory.created_at > high_water, since_fit),
+        sales_key >= tuple_(*keys[0]),
+        sales_key <= tuple_(*keys[-1])
+    ).group_by(SalesHistory.product_id, SalesHistory.store_id)
+
+    frame = frame.merge(
+        pd.DataFrame.from_records(sales.all(), columns=['product_id', 'store_id', 'late_sales', 'sold']),
+        on=['product_id', 'store_id'],
+        how='left'
+    )
+    refit = stale_series(frame, run.window_end, run.drift_threshold)
+    return [key for key, stale in zip(keys, refit) if stale]
+
+
+def _nullable(values: Optional[np.ndarray], index: int) -> Optional[float]:
+    return None if values is None else float(values[index])
+
+
+def write_forecasts(
+    db: Session,
+    run: ForecastRun,
+    checkpoint: Key,
+    keys: List[Key],
+    fitted: Optional[Dict[str, np.ndarray]],
+    high_water: Optional[List[Optional[datetime]]],
+    skipped: int
+) -> None:
+    """Upsert one chunk's refit forecasts and advance the run's checkpoint"""
+    rows = [
+        {
+            'product_id': product_id,
+            'store_id': store_id,
+            'model': str(fitted['model'][index]),
+            'daily_demand': float(fitted['daily_demand'][index]),
+            'demand_std': float(fitted['demand_std'][index]),
+            'mae': _nullable(fitted.get('mae'), index),
+            'rmse': _nullable(fitted.get('rmse'), index),
+            'bias': _nullable(fitted.get('bias'), index),
+            'demand_days': int(fitted['demand_days'][index]),
+            'window_end': run.window_end,
+            'sales_high_water': high_water[index],
+            'run_id': run.id
+        }
+        for index, (product_id, store_id) in enumerate(keys)
+    ]
+    for start in range(0, len(rows), FORECAST_WRITE_BATCH):
+        statement = insert(DemandForecast).values(rows[start:start + FORECAST_WRITE_BATCH])
+        db.execute(statement.on_conflict_do_update(
+            index_elements=['product_id', 'store_id'],
+            set_=dict(
+                {name: statement.excluded[name] for name in rows[0] if name not in ('product_id', 'store_id')},
+                fitted_at=func.now()
+            )
+        ))
+
+    run.checkpoint_product_id, run.checkpoint_store_id = checkpoint
+    run.series_count += len(keys)
+    run.skipped_count += skipped
+    db.commit()
+
+
+def start_run(
+    db: Session,
+    window_days: int = DEMAND_WINDOW_DAYS,
+    holdout_days: int = HOLDOUT_DAYS,
+    incremental: bool = True,
+    drift_threshold: float = DRIFT_THRESHOLD,
+    resume: bool = True
+) -> ForecastRun:
+    """The interrupted run to resume, or a new one"""
+    if resume:
+        run = db.query(ForecastRun)\
+            .filter(ForecastRun.status == ForecastRunStatus.RUNNING)\
+            .order_by(ForecastRun.id.desc())\
+            .first()
+        if run is not None:
+            logger.info(
+                "Resuming forecast run %d after (%s, %s)",
+                run.id, run.checkpoint_product_id, run.checkpoint_store_id
+            )
+            return run
+
+    run = ForecastRun(
+        status=ForecastRunStatus.RUNNING,
+        window_days=window_days,
+        holdout_days=holdout_days,
+        window_end=datetime.utcnow().date(),
+        incremental=incremental,
+        drift_threshold=drift_threshold if incremental else None,
+        series_count=0,
+        skipped_count=0
+    )
+    db.add(run)
+    db.commit()
+    return run
+
+
+def run_forecasts(
+    db: Session,
+    workers: Optional[int] = None,
+    chunk_size: int = FORECAST_CHUNK_SIZE,
+    window_days: int = DEMAND_WINDOW_DAYS,
+    holdout_days: int = HOLDOUT_DAYS,
+    incremental: bool = True,
+    drift_threshold: float = DRIFT_THRESHOLD,
+    resume: bool = True,
+    short_series_days: int = SHORT_SERIES_DAYS
+) -> ForecastRun:
+    """Fit every stale series, keeping up to two chunks per worker in flight.
+
+    ``short_series_days`` of 0 fits every series on its own.
+    """
+    run = start_run(db, window_days, holdout_days, incremental, drift_threshold, resume)
+    start_day, end_day = demand_window(datetime.combine(run.window_end, datetime.min.time()), run.window_days)
+    rates = category_rates(db, start_day, end_day) if short_series_days > 0 else None
+    after = None
+    if run.checkpoint_product_id is not None:
+        after = (run.checkpoint_product_id, run.checkpoint_store_id)
+
+    workers = workers or os.cpu_count() or 1
+    started = time.perf_counter()
+    pending = deque()
+
+    def write_oldest():
+        checkpoint, keys, skipped, future, high_water = pending.popleft()
+        fitted = future.result() if future is not None else None
+        write_forecasts(db, run, checkpoint, keys, fitted, high_water, skipped)
+
+    try:
+        # Workers never touch the database, and spawned ones do not inherit
+        # the parent's pooled connections
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            while True:
+                keys = series_chunk(db, after, chunk_size)
+                if not keys:
+                    break
+                after = keys[-1]
+                refit = series_to_refit(db, run, keys, start_day, end_day) if run.incremental else keys
+                future = high_water = None
+                if refit:
+                    series_index, day_index, quantity, high_water = chunk_sales(db, refit, start_day, end_day)
+                    created_offset = prior = None
+                    if rates is not None:
+                        created_offset, prior = series_priors(db, refit, start_day, rates)
+                    future = pool.submit(
+                        fit_series, len(refit), run.window_days, series_index, day_index, quantity, run.holdout_days,
+                        created_offset=created_offset, prior=prior, short_days=short_series_days
+                    )
+                pending.append((after, refit, len(keys) - len(refit), future, high_water))
+                # Chunks are written in order so the checkpoint never skips one
+                while len(pending) >= 2 * workers or (
+                    pending and (pending[0][3] is None or pending[0][3].done())
+                ):
+                    write_oldest()
+            while pending:
+                write_oldest()
+    except Exception:
+        db.rollback()
+        run.status = ForecastRunStatus.FAILED
+        db.commit()
+        raise
+
+    run.status = ForecastRunStatus.COMPLETED
+    run.finished_at = func.now()
+    db.commit()
+
+    elapsed = time.perf_counter() - started
+    logger.info(
+        "Forecast run %d refit %d series and skipped %d unchanged in %.1fs with %d workers",
+        run.id, run.series_count, run.skipped_count, elapsed, workers
+    )
+    return run
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fit demand forecasts for every (product, store) series")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes, defaults to the CPU count")
+    parser.add_argument('--chunk-size', type=int, default=FORECAST_CHUNK_SIZE, help="Series per chunk")
+    parser.add_argument('--window-days', type=int, default=DEMAND_WINDOW_DAYS, help="Days of sales history to fit")
+    parser.add_argument('--holdout-days', type=int, default=HOLDOUT_DAYS, help="Trailing days held out for scoring")
+    parser.add_argument('--drift-threshold', type=float, default=DRIFT_THRESHOLD,
+                        help="Standard deviations between predicted and actual sales that force a refit")
+    parser.add_argument('--short-series-days', type=int, default=SHORT_SERIES_DAYS,
+                        help="Series observed for fewer days are pooled with their category; 0 disables pooling")
+    parser.add_argument('--full', action='store_true', help="Refit every series, not only the changed ones")
+    parser.add_argument('--restart', action='store_true', help="Start a new run instead of resuming an interrupted one")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    db = SessionLocal()
+    try:
+        run_forecasts(
+            db,
+            workers=args.workers,
+            chunk_size=args.chunk_size,
+            window_days=args.window_days,
+            holdout_days=args.holdout_days,
+            incremental=not args.full,
+            drift_threshold=args.drift_threshold,
+            resume=not args.restart,
+            short_series_days=args.short_series_days
+        )
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
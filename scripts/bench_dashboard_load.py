@@ -0,0 +1,116 @@
+"""Dashboard load benchmark.
+
+Drives concurrent clients that each loop over the dashboard endpoints for
+a fixed duration and reports requests per second and latency percentiles
+per server. Pass several ``--url`` values to compare deployments side by
+side, e.g. a build serving the routes synchronously against one serving
+them from the async session::
+
+    python -m scripts.bench_dashboard_load --url http://localhost:8000 --url http://localhost:8001 \\
+        [--clients 500] [--duration 30] [--bypass-cache]
+
+``--bypass-cache`` tags every request with a unique query parameter so
+the response cache never hits and each request reaches the database.
+"""
+import argparse
+import itertools
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DASHBOARD_PATHS = (
+    "/analytics/summary",
+    "/analytics/products/performance",
+    "/analytics/stores/performance",
+    "/analytics/regional/trends",
+)
+
+
+def percentile(ordered, fraction: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def run_client(base_url: str, paths, start: float, deadline: float, bypass_cache: bool, offset: int):
+    """Loop over the paths until the deadline; returns (latencies, errors)"""
+    session = requests.Session()
+    session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=1))
+    latencies, errors = [], 0
+    cycle = itertools.islice(itertools.cycle(paths), offset, None)
+    while time.monotonic() < start:
+        time.sleep(0.001)
+    try:
+        for path in cycle:
+            if time.monotonic() >= deadline:
+                break
+            params = {"nocache": uuid.uuid4().hex} if bypass_cache else None
+            sent = time.perf_counter()
+            try:
+                response = session.get(base_url + path, params=params, timeout=60)
+                failed = response.status_code >= 400
+            except requests.RequestException:
+                failed = True
+            if failed:
+                errors += 1
+            else:
+                latencies.append(time.perf_counter() - sent)
+    finally:
+        session.close()
+    return latencies, errors
+
+
+def measure(base_url: str, clients: int, duration: float, paths, bypass_cache: bool):
+    latencies, errors = [], 0
+    # Every client starts together once all threads are up
+    start = time.monotonic() + 1 + clients / 500
+    deadline = start + duration
+    with ThreadPoolExecutor(clients) as pool:
+        futures = [
+            pool.submit(run_client, base_url, paths, start, deadline, bypass_cache, index)
+            for index in range(clients)
+        ]
+        for future in futures:
+            client_latencies, client_errors = future.result()
+            latencies.extend(client_latencies)
+            errors += client_errors
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / duration,
+        "p50": percentile(latencies, 0.50) * 1000,
+        "p95": percentile(latencies, 0.95) * 1000,
+        "p99": percentile(latencies, 0.99) * 1000,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure dashboard RPS and latency under concurrent clients")
+    parser.add_argument("--url", action="append", help="Server base URL; repeat to compare servers")
+    parser.add_argument("--clients", type=int, default=500, help="Concurrent dashboard clients")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds measured per server")
+    parser.add_argument("--warmup", type=float, default=5, help="Seconds of unmeasured load first")
+    parser.add_argument("--path", action="append", help="Endpoint to load; defaults to the dashboard set")
+    parser.add_argument("--bypass-cache", action="store_true", help="Make every request miss the response cache")
+    args = parser.parse_args(argv)
+
+    urls = [url.rstrip("/") for url in args.url or ["http://localhost:8000"]]
+    paths = args.path or DASHBOARD_PATHS
+
+    print(f"{'server':<32} {'requests':>9} {'errors':>7} {'rps':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for url in urls:
+        if args.warmup:
+            measure(url, args.clients, args.warmup, paths, args.bypass_cache)
+        result = measure(url, args.clients, args.duration, paths, args.bypass_cache)
+        print(
+            f"{url:<32} {result['requests']:>9} {result['errors']:>7} {result['rps']:>9.1f} "
+            f"{result['p50']:>8.1f} {result['p95']:>8.1f} {result['p99']:>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Forecast fitting scaling benchmark.
+
+Fits synthetic chunks of sparse daily sales with the pipeline's
+:func:`fit_series` in a process pool at growing worker counts and reports
+wall time, series per second and the speedup over one worker. The
+database is left out, so this measures how the model fitting itself scales
+with cores; a near-linear speedup means a run is bound by the fitting
+until the database side (chunk reads and forecast writes) saturates::
+
+    python -m scripts.bench_forecast_scaling [--series 400000] [--workers 1,2,4,8]
+"""
+import argparse
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from iaps.ml.demand import DEMAND_WINDOW_DAYS
+from iaps.ml.forecasting import FORECAST_CHUNK_SIZE, HOLDOUT_DAYS, fit_series
+
+
+def synthetic_chunk(rng, series: int, days: int, density: float):
+    """Sparse (series, day, quantity) triples plus stocking days and category priors"""
+    sold = rng.random((series, days)) < density
+    series_index, day_index = np.nonzero(sold)
+    quantity = rng.poisson(3, len(series_index)).astype(float) + 1
+    # One series in ten was stocked within the window
+    created_offset = np.where(rng.random(series) < 0.1, rng.integers(0, days, series), -1)
+    prior = rng.random(series) * 3
+    return series, days, series_index, day_index, quantity, created_offset, prior
+
+
+def fit(chunk):
+    series, days, series_index, day_index, quantity, created_offset, prior = chunk
+    return len(fit_series(
+        series, days, series_index, day_index, quantity, HOLDOUT_DAYS,
+        created_offset=created_offset, prior=prior
+    )['daily_demand'])
+
+
+def measure(chunks, workers: int) -> float:
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        # Start every worker and import the pipeline before timing
+        list(pool.map(fit, chunks[:workers]))
+        started = time.perf_counter()
+        fitted = sum(pool.map(fit, chunks))
+        elapsed = time.perf_counter() - started
+    assert fitted == sum(chunk[0] for chunk in chunks)
+    return elapsed
+
+
+def main(argv=None):
+    cores = os.cpu_count() or 1
+    default_workers = ','.join(str(2 ** power) for power in range(cores.bit_length()) if 2 ** power <= cores)
+    parser = argparse.ArgumentParser(description="Measure how forecast fitting scales with worker processes")
+    parser.add_argument('--series', type=int, default=400000, help="Series fitted per measurement")
+    parser.add_argument('--chunk-size', type=int, default=FORECAST_CHUNK_SIZE, help="Series per chunk")
+    parser.add_argument('--days', type=int, default=DEMAND_WINDOW_DAYS, help="Days per series")
+    parser.add_argument('--density', type=float, default=0.3, help="Share of days with a sale")
+    parser.add_argument('--workers', default=default_workers, help="Comma-separated worker counts")
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(0)
+    chunks = [
+        synthetic_chunk(rng, min(args.chunk_size, args.series - start), args.days, args.density)
+        for start in range(0, args.series, args.chunk_size)
+    ]
+
+    print(f"{len(chunks)} chunks of up to {args.chunk_size} series, {args.days} days, {cores} cores")
+    print(f"{'workers':>8} {'seconds':>9} {'series/s':>10} {'speedup':>8} {'efficiency':>11}")
+    baseline = None
+    for workers in (int(value) for value in args.workers.split(',')):
+        elapsed = measure(chunks, workers)
+        if baseline is None:
+            # Single-worker time, assuming the first count scaled linearly
+            baseline = elapsed * workers
+        speedup = baseline / elapsed
+        print(
+            f"{workers:>8} {elapsed:>9.2f} {args.series / elapsed:>10.0f} "
+            f"{speedup:>8.2f} {speedup / workers:>10.0%}"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""Reorder suggestion benchmark.
+
+Seeds products x stores inventory pairs with a sale per pair and day,
+runs :func:`calculate_reorder_suggestions` over them and reports the
+pairs considered, the queries sent and the wall time at each size. The
+query count stays flat as the pairs grow. Everything is seeded inside a
+transaction that is rolled back afterwards, so existing data is left
+alone, though it is included in the unscoped runs::
+
+    python -m scripts.bench_reorder [--sizes 100x10,1000x40,5000x100] [--days 30]
+"""
+import argparse
+import time
+import uuid
+
+from sqlalchemy import event, text
+
+from iaps.data.reorder import calculate_reorder_suggestions
+from iaps.db.database import SessionLocal, engine
+
+SEED = """
+WITH products AS (
+    INSERT INTO products (sku, name)
+    SELECT :run || '-' || i, 'Bench product ' || i FROM generate_series(1, :products) i
+    RETURNING id
+), stores AS (
+    INSERT INTO stores (name, location)
+    SELECT :run || '-' || i, 'Bench' FROM generate_series(1, :stores) i
+    RETURNING id
+), pairs AS (
+    INSERT INTO inventory (product_id, store_id, quantity, reorder_point)
+    SELECT products.id, stores.id, 5, 1 FROM products CROSS JOIN stores
+    RETURNING product_id, store_id
+)
+INSERT INTO sales_history (product_id, store_id, quantity_sold, sale_date, transaction_id, line_number)
+SELECT product_id, store_id, 2, now() - d * interval '1 day', :run || '-' || product_id || '-' || d, 1
+FROM pairs CROSS JOIN generate_series(1, :days) d
+"""
+
+
+def parse_size(value: str):
+    products, _, stores = value.partition('x')
+    return int(products), int(stores)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure reorder suggestion queries and time by size")
+    parser.add_argument('--sizes', default='100x10,1000x40,5000x100', help="Comma-separated PRODUCTSxSTORES")
+    parser.add_argument('--days', type=int, default=30, help="Days of sales seeded and considered")
+    args = parser.parse_args(argv)
+
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    print(f"{'pairs':>10} {'suggestions':>12} {'queries':>8} {'seconds':>8}")
+    for products, stores in map(parse_size, args.sizes.split(',')):
+        db = SessionLocal()
+        try:
+            db.execute(text(SEED), {
+                'run': uuid.uuid4().hex[:8], 'products': products, 'stores': stores, 'days': args.days
+            })
+            db.execute(text("ANALYZE inventory, sales_history"))
+            statements.clear()
+            event.listen(engine, "before_cursor_execute", count)
+            started = time.perf_counter()
+            try:
+                suggestions = calculate_reorder_suggestions(db, args.days)
+            finally:
+                event.remove(engine, "before_cursor_execute", count)
+            elapsed = time.perf_counter() - started
+            print(f"{products * stores:>10} {len(suggestions):>12} {len(statements):>8} {elapsed:>8.2f}")
+        finally:
+            db.rollback()
+            db.close()
+
+
+if __name__ == '__main__':
+    main()
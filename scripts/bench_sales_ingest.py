@@ -0,0 +1,86 @@
+"""Sales ingestion throughput benchmark.
+
+Generates synthetic sale lines for existing products and stores, streams
+them through the ingest pipeline and reports rows per second. Every run
+uses fresh transaction ids, so the lines are inserted rather than skipped
+as duplicates; a share of deliberately broken lines exercises the reject
+path. Run against a disposable database::
+
+    python -m scripts.bench_sales_ingest --rows 1000000 [--format ndjson] [--invalid 0.01]
+"""
+import argparse
+import csv
+import io
+import json
+import random
+import tempfile
+import uuid
+from datetime import datetime, timedelta
+
+from iaps.data.sales_ingest import SALES_BATCH_SIZE, ingest_sales, open_sales_stream, read_sales_rows
+from iaps.db.database import SessionLocal
+from iaps.db.models import Product, Store
+
+FIELDS = ('sku', 'store', 'quantity_sold', 'sale_date', 'transaction_id', 'line_number')
+
+
+def write_lines(upload, format: str, rows: int, skus, stores, invalid: float) -> None:
+    run = uuid.uuid4().hex[:8]
+    start = datetime(2024, 1, 1)
+    text = io.TextIOWrapper(upload, encoding='utf-8', newline='')
+    writer = csv.writer(text)
+    if format == 'csv':
+        writer.writerow(FIELDS)
+    for index in range(rows):
+        if random.random() < invalid:
+            text.flush()
+            upload.write(b'{"sku": "\xff\xfe broken\n')
+            continue
+        line = (
+            random.choice(skus),
+            random.choice(stores),
+            random.randint(1, 5),
+            (start + timedelta(minutes=index)).isoformat(),
+            f"bench-{run}-{index // 3}",
+            index % 3 + 1
+        )
+        if format == 'csv':
+            writer.writerow(line)
+        else:
+            text.write(json.dumps(dict(zip(FIELDS, line))) + '\n')
+    text.flush()
+    text.detach()
+    upload.seek(0)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure bulk sales ingestion throughput")
+    parser.add_argument('--rows', type=int, default=200000, help="Sale lines to generate")
+    parser.add_argument('--format', choices=('csv', 'ndjson'), default='csv')
+    parser.add_argument('--batch-size', type=int, default=SALES_BATCH_SIZE)
+    parser.add_argument('--invalid', type=float, default=0.0, help="Share of lines written broken")
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        skus = [sku for sku, in db.query(Product.sku).limit(1000)]
+        stores = [name for name, in db.query(Store.name).limit(100)]
+        if not skus or not stores:
+            parser.error("the database needs at least one product and one store")
+
+        with tempfile.TemporaryFile() as upload:
+            write_lines(upload, args.format, args.rows, skus, stores, args.invalid)
+            stats = ingest_sales(
+                db, read_sales_rows(open_sales_stream(upload), args.format), args.batch_size
+            )
+    finally:
+        db.close()
+
+    print(
+        f"{stats['read']} lines in {stats['seconds']:.2f}s: {stats['rows_per_second']} rows/s "
+        f"({stats['inserted']} inserted, {stats['duplicates']} duplicates, {stats['rejected']} rejected)"
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""Shared fixtures.
+
+Tests that touch the database run against the Postgres named by
+``TEST_DATABASE_URL`` and are skipped when it is unset. The database is
+migrated to head once per run and every table is truncated before each
+test, so point it at a disposable database. ``TEST_REPLICA_URL`` names a
+second instance with the same schema for the replica routing tests.
+"""
+import os
+from contextlib import contextmanager
+from pathlib import Path
+
+import pytest
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+TEST_REPLICA_URL = os.getenv("TEST_REPLICA_URL")
+
+# The engines are built when iaps.db.database is first imported
+if TEST_DATABASE_URL:
+    os.environ["DB_CONNECTION"] = TEST_DATABASE_URL
+    os.environ.pop("DB_ASYNC_CONNECTION", None)
+    os.environ["DB_REPLICA_URLS"] = TEST_REPLICA_URL or ""
+    os.environ.pop("CACHE_URL", None)
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def _migrate(url: str) -> None:
+    from alembic import command
+    from alembic.config import Config
+
+    config = Config(str(ROOT / "alembic.ini"))
+    config.set_main_option("script_location", str(ROOT / "alembic"))
+    previous = os.environ["DB_CONNECTION"]
+    os.environ["DB_CONNECTION"] = url
+    try:
+        command.upgrade(config, "head")
+    finally:
+        os.environ["DB_CONNECTION"] = previous
+
+
+def _truncate(engine) -> None:
+    from iaps.db.database import Base
+
+    tables = ", ".join(table.name for table in Base.metadata.sorted_tables)
+    with engine.begin() as connection:
+        connection.exec_driver_sql(f"TRUNCATE {tables} RESTART IDENTITY CASCADE")
+
+
+@pytest.fixture(scope="session")
+def database():
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    _migrate(TEST_DATABASE_URL)
+    if TEST_REPLICA_URL:
+        _migrate(TEST_REPLICA_URL)
+
+    from iaps.db.database import engine
+    return engine
+
+
+@pytest.fixture
+def db(database):
+    """Session on the emptied test database"""
+    from iaps.api.cache import response_cache
+    from iaps.db.database import SessionLocal, replicas
+
+    _truncate(database)
+    for replica in replicas.replicas:
+        _truncate(replica.engine)
+    response_cache.backend.entries.clear()
+
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture(scope="session")
+def client(database):
+    """API client shared by the run, so async engines stay on one event loop"""
+    from fastapi.testclient import TestClient
+    from iaps.api.main import app
+
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def api(client, db, monkeypatch):
+    """The shared client with reads routed to the primary, which holds the test's data"""
+    from iaps.db.database import replicas
+
+    monkeypatch.setattr(replicas, "replicas", [])
+    client.cookies.clear()
+    return client
+
+
+class QueryCounter:
+    """Statements and their parameters, in execution order"""
+
+    def __init__(self):
+        self.statements = []
+        self.parameters = []
+
+    def __len__(self):
+        return len(self.statements)
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+        self.parameters.append(parameters)
+
+
+@contextmanager
+def _counting():
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    counter = QueryCounter()
+    event.listen(Engine, "before_cursor_execute", counter)
+    try:
+        yield counter
+    finally:
+        event.remove(Engine, "before_cursor_execute", counter)
+
+
+@pytest.fixture
+def count_queries():
+    """Context manager collecting every statement sent to any engine while it is open"""
+    return _counting
@@ -0,0 +1,145 @@
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from iaps.data.adjustments import APPLIED, INSUFFICIENT_STOCK, adjust_inventory
+from iaps.data.ledger import ledger_drift_query, ledger_query, record_movements
+from iaps.data.rollups import refresh_rollups
+from iaps.db.database import SessionLocal
+from iaps.db.models import Inventory, MovementType, Product, Store, StoreRollup
+
+# Below the primary pool's 5 + 10 connections, so workers wait on row locks
+# rather than on the pool
+WORKERS = 12
+CHANGES_PER_WORKER = 60
+START_QUANTITY = 10000
+
+
+def seed_row(db, quantity: int) -> Inventory:
+    product = Product(sku="SKU-1", name="Widget")
+    store = Store(name="Main", location="Downtown", region="North")
+    db.add_all([product, store])
+    db.flush()
+    inventory = Inventory(product_id=product.id, store_id=store.id, quantity=quantity, reorder_point=10)
+    db.add(inventory)
+    db.flush()
+    record_movements(db, [{
+        'product_id': product.id,
+        'store_id': store.id,
+        'movement_type': MovementType.COUNT,
+        'quantity_change': quantity
+    }])
+    db.commit()
+    refresh_rollups(db)
+    db.commit()
+    return inventory
+
+
+def run_concurrently(changes_per_worker, apply):
+    start = threading.Barrier(len(changes_per_worker))
+
+    def worker(changes):
+        session = SessionLocal()
+        try:
+            start.wait()
+            outcomes = []
+            for change in changes:
+                outcomes.extend(apply(session, change))
+                session.commit()
+            return outcomes
+        finally:
+            session.close()
+
+    with ThreadPoolExecutor(len(changes_per_worker)) as pool:
+        return [outcome for outcomes in pool.map(worker, changes_per_worker) for outcome in outcomes]
+
+
+def test_concurrent_adjustments_lose_no_updates(db):
+    inventory = seed_row(db, START_QUANTITY)
+    rng = random.Random(7)
+    changes = [
+        [rng.choice([-1, 1]) * rng.randint(1, 5) for _ in range(CHANGES_PER_WORKER)]
+        for _ in range(WORKERS)
+    ]
+
+    def apply(session, change):
+        return adjust_inventory(
+            session, [{'inventory_id': inventory.id, 'quantity_change': change}], restock=change > 0
+        )
+
+    outcomes = run_concurrently(changes, apply)
+
+    assert [outcome['status'] for outcome in outcomes] == [APPLIED] * WORKERS * CHANGES_PER_WORKER
+    expected = START_QUANTITY + sum(map(sum, changes))
+    restocks = sum(change > 0 for worker in changes for change in worker)
+
+    db.expire_all()
+    assert db.query(Inventory.quantity).filter(Inventory.id == inventory.id).scalar() == expected
+    ledger = ledger_query(db).one()
+    assert ledger.quantity == expected
+    assert ledger.restock_count == restocks
+    assert ledger_drift_query(db).all() == []
+    rollup = db.query(StoreRollup).one()
+    assert (rollup.total_quantity, rollup.restock_count) == (expected, restocks)
+
+
+def test_concurrent_sales_never_oversell(db):
+    inventory = seed_row(db, 100)
+    changes = [[-1] * 10 for _ in range(WORKERS)]
+
+    def apply(session, change):
+        return adjust_inventory(session, [{'inventory_id': inventory.id, 'quantity_change': change}])
+
+    outcomes = run_concurrently(changes, apply)
+
+    statuses = [outcome['status'] for outcome in outcomes]
+    assert statuses.count(APPLIED) == 100
+    assert statuses.count(INSUFFICIENT_STOCK) == WORKERS * 10 - 100
+    db.expire_all()
+    assert db.query(Inventory.quantity).filter(Inventory.id == inventory.id).scalar() == 0
+    assert ledger_query(db).one().quantity == 0
+    assert ledger_drift_query(db).all() == []
+
+
+def test_changes_to_one_row_are_checked_one_at_a_time(db):
+    inventory = seed_row(db, 16)
+
+    outcomes = adjust_inventory(db, [
+        {'inventory_id': inventory.id, 'quantity_change': -100},
+        {'inventory_id': inventory.id, 'quantity_change': 2},
+        {'inventory_id': inventory.id, 'quantity_change': -18},
+        {'inventory_id': inventory.id, 'quantity_change': -1}
+    ])
+    db.commit()
+
+    assert [outcome['status'] for outcome in outcomes] == [INSUFFICIENT_STOCK, APPLIED, APPLIED, INSUFFICIENT_STOCK]
+    assert outcomes[0]['detail'] == "Only 16 in stock"
+    assert [outcome['inventory']['quantity'] for outcome in outcomes[1:3]] == [18, 0]
+    assert outcomes[3]['detail'] == "Only 0 in stock"
+    db.expire_all()
+    assert db.query(Inventory.quantity).filter(Inventory.id == inventory.id).scalar() == 0
+    assert ledger_query(db).one().quantity == 0
+    assert ledger_drift_query(db).all() == []
+
+
+def test_repeated_rows_keep_input_order_across_rows(db):
+    first = seed_row(db, 5)
+    product = Product(sku="SKU-2", name="Gadget")
+    db.add(product)
+    db.flush()
+    second = Inventory(product_id=product.id, store_id=first.store_id, quantity=0, reorder_point=1)
+    db.add(second)
+    db.commit()
+
+    outcomes = adjust_inventory(db, [
+        {'inventory_id': second.id, 'quantity_change': 3},
+        {'inventory_id': first.id, 'quantity_change': -5},
+        {'inventory_id': second.id, 'quantity_change': -3},
+        {'inventory_id': first.id, 'quantity_change': 1},
+        {'inventory_id': second.id, 'quantity_change': -1}
+    ])
+
+    assert [(outcome['index'], outcome['status']) for outcome in outcomes] == [
+        (0, APPLIED), (1, APPLIED), (2, APPLIED), (3, APPLIED), (4, INSUFFICIENT_STOCK)
+    ]
+    assert [outcome['inventory']['quantity'] for outcome in outcomes[:4]] == [3, 0, 0, 1]
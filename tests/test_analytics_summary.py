@@ -0,0 +1,55 @@
+import pytest
+from sqlalchemy import text
+
+from iaps.api.cache import response_cache
+from iaps.data.rollups import refresh_rollups
+
+
+def seed(db, products: int, stores: int) -> None:
+    """Every product stocked at every store, with one low-stock pair per store"""
+    db.execute(text("""
+        INSERT INTO products (sku, name) SELECT 'SKU-' || i, 'Product ' || i FROM generate_series(1, :products) i;
+        INSERT INTO stores (name, location, region)
+            SELECT 'Store ' || i, 'Location ' || i, 'Region ' || i % 3 FROM generate_series(1, :stores) i;
+        INSERT INTO inventory (product_id, store_id, quantity, reorder_point)
+            SELECT p, s, CASE WHEN p = s THEN 1 ELSE 10 END, 5
+            FROM generate_series(1, :products) p, generate_series(1, :stores) s;
+    """), {'products': products, 'stores': stores})
+    db.commit()
+    refresh_rollups(db)
+    db.commit()
+
+
+def summary(api, count_queries):
+    response_cache.backend.entries.clear()
+    with count_queries() as queries:
+        response = api.get("/analytics/summary")
+    assert response.status_code == 200
+    return response.json(), queries
+
+
+@pytest.mark.parametrize('products, stores', [(3, 3), (400, 40)])
+def test_summary_is_one_query_at_any_size(api, db, count_queries, products, stores):
+    seed(db, products, stores)
+    summary(api, count_queries)  # the first request on a connection may run dialect setup
+
+    body, queries = summary(api, count_queries)
+
+    assert len(queries) == 1, queries.statements
+    assert body['total_products'] == products
+    assert body['total_stores'] == stores
+    assert body['total_inventory'] == stores * (10 * products - 9)
+    assert body['low_stock_items'] == stores
+    assert len(body['top_performing_stores']) == min(stores, 5)
+    assert sum(body['regional_distribution'].values()) == stores
+
+
+def test_cached_summary_runs_no_queries(api, db, count_queries):
+    seed(db, 3, 3)
+    first, _ = summary(api, count_queries)
+
+    with count_queries() as queries:
+        response = api.get("/analytics/summary")
+
+    assert len(queries) == 0
+    assert response.json() == first
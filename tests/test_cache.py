@@ -0,0 +1,58 @@
+import asyncio
+import json
+
+from starlette.requests import Request
+
+from iaps.api import cache as cache_module
+from iaps.api.cache import MemoryBackend, ResponseCache
+from iaps.db.database import READ_REPLICA_STATE
+
+TABLES = ("inventory",)
+
+
+def request(replica=None) -> Request:
+    scope = {"type": "http", "method": "GET", "path": "/analytics/summary", "query_string": b"", "headers": []}
+    incoming = Request(scope)
+    setattr(incoming.state, READ_REPLICA_STATE, replica)
+    return incoming
+
+
+def respond(cache, incoming, value):
+    async def build():
+        return {"value": value}
+
+    response = asyncio.run(cache.respond(incoming, TABLES, build))
+    return json.loads(response.body)["value"]
+
+
+def test_primary_reads_never_see_replica_filled_entries():
+    cache = ResponseCache(MemoryBackend(30, 16), 30, replica_ttl=5)
+
+    assert respond(cache, request(replica="replica0"), "stale") == "stale"
+    assert respond(cache, request(), "fresh") == "fresh"
+    assert respond(cache, request(replica="replica0"), "recomputed") == "stale"
+    assert respond(cache, request(), "recomputed") == "fresh"
+
+
+def test_replica_filled_entries_expire_within_the_lag_budget(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now[0])
+    cache = ResponseCache(MemoryBackend(30, 16), 30, replica_ttl=5)
+
+    respond(cache, request(replica="replica0"), "replica")
+    respond(cache, request(), "primary")
+    now[0] += 6
+
+    assert respond(cache, request(replica="replica0"), "refilled") == "refilled"
+    assert respond(cache, request(), "recomputed") == "primary"
+
+
+def test_writes_invalidate_both_sources():
+    cache = ResponseCache(MemoryBackend(30, 16), 30, replica_ttl=5)
+    respond(cache, request(replica="replica0"), "before")
+    respond(cache, request(), "before")
+
+    cache.invalidate(TABLES)
+
+    assert respond(cache, request(replica="replica0"), "after") == "after"
+    assert respond(cache, request(), "after") == "after"
@@ -0,0 +1,150 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import text
+
+from iaps.db.models import DemandForecast
+from iaps.ml.demand import POOLED
+from iaps.ml.forecasting import DRIFT_THRESHOLD, fit_series, run_forecasts, stale_series
+
+RUN_END = date(2026, 10, 17)
+
+
+def series(daily_demand=None, window_end=None, late_sales=None, sold=None):
+    return {'daily_demand': daily_demand, 'window_end': window_end, 'late_sales': late_sales, 'sold': sold}
+
+
+def stale(*rows, threshold=DRIFT_THRESHOLD):
+    return stale_series(pd.DataFrame(list(rows)), RUN_END, threshold).tolist()
+
+
+def test_stable_selling_series_is_not_refit():
+    # Fitted two days ago at 3 units a day and has sold 6 since
+    assert stale(series(3.0, date(2026, 10, 15), None, 6)) == [False]
+
+
+def test_small_differences_stay_under_the_threshold():
+    assert stale(series(1.4, date(2026, 10, 16), None, 1), series(1.4, date(2026, 10, 16), None, 2)) == [False, False]
+
+
+@pytest.mark.parametrize("daily_demand", [1.0, 3.0, 50.0])
+@pytest.mark.parametrize("days", [1, 7])
+def test_accurate_forecast_with_noisy_sales_is_rarely_refit(daily_demand, days):
+    fitted = date.fromordinal(RUN_END.toordinal() - days)
+    sold = np.random.default_rng(0).poisson(daily_demand * days, 10000)
+    refit = stale(*(series(daily_demand, fitted, None, units) for units in sold))
+    assert np.mean(refit) < 0.01
+
+
+@pytest.mark.parametrize("daily_demand, actual, days", [(1.0, 3.0, 14), (50.0, 100.0, 1), (3.0, 0.5, 14)])
+def test_forecast_off_by_a_multiple_is_refit(daily_demand, actual, days):
+    fitted = date.fromordinal(RUN_END.toordinal() - days)
+    sold = np.random.default_rng(0).poisson(actual * days, 1000)
+    refit = stale(*(series(daily_demand, fitted, None, units) for units in sold))
+    assert np.mean(refit) > 0.99
+
+
+def test_series_selling_less_than_forecast_drifts():
+    assert stale(series(3.0, date(2026, 10, 7), None, 8)) == [True]
+
+
+def test_series_selling_more_than_forecast_drifts():
+    assert stale(series(0.5, date(2026, 10, 13), None, 9)) == [True]
+
+
+def test_forecast_without_any_sales_since_fit_drifts():
+    assert stale(series(2.0, date(2026, 10, 12), None, None)) == [True]
+
+
+def test_idle_series_is_not_refit():
+    assert stale(series(0.0, date(2026, 9, 1), None, None)) == [False]
+
+
+def test_refit_on_the_day_it_was_fitted_is_skipped():
+    assert stale(series(5.0, RUN_END, None, None)) == [False]
+
+
+def test_unfitted_and_late_sales_are_refit():
+    assert stale(
+        series(None, None, None, None),
+        series(3.0, date(2026, 10, 15), True, 6)
+    ) == [True, True]
+
+
+def test_threshold_is_configurable():
+    row = series(3.0, date(2026, 10, 15), None, 1)
+    assert stale(row, threshold=1.0) == [True]
+    assert stale(row, threshold=DRIFT_THRESHOLD) == [False]
+
+
+DAYS = 90
+
+
+def fit(sales, created_offset, prior, holdout_days=0):
+    """Fit series given as {series: {day: quantity}}"""
+    triples = [(index, day, quantity) for index, days in sales.items() for day, quantity in days.items()]
+    series_index, day_index, quantity = (np.array(values) for values in zip(*triples))
+    return fit_series(
+        len(created_offset), DAYS, series_index, day_index, quantity.astype(float), holdout_days,
+        created_offset=np.array(created_offset), prior=np.array(prior)
+    )
+
+
+def test_new_series_is_pooled_with_its_category():
+    # Stocked 7 days ago, selling 4 a day, in a category averaging 2 a day
+    result = fit({0: {day: 4 for day in range(83, 90)}}, [83], [2.0])
+    assert result['model'].tolist() == [POOLED]
+    assert result['daily_demand'][0] == pytest.approx(7 / 28 * 4 + 21 / 28 * 2)
+
+
+def test_unpooled_new_series_is_underestimated():
+    unpooled = fit_series(1, DAYS, np.arange(83, 90) * 0, np.arange(83, 90), np.full(7, 4.0), 0)
+    assert unpooled['daily_demand'][0] < 2
+
+
+def test_series_with_full_history_is_fitted_on_its_own():
+    sales = {0: {day: 3 for day in range(DAYS)}, 1: {}}
+    pooled = fit(sales, [-200, -200], [10.0, 10.0])
+    alone = fit_series(2, DAYS, np.zeros(DAYS, dtype=int), np.arange(DAYS), np.full(DAYS, 3.0), 0)
+    assert pooled['model'].tolist() == alone['model'].tolist()
+    assert np.allclose(pooled['daily_demand'], alone['daily_demand'])
+    # Stocked long ago without a sale is dead stock, not a short series
+    assert pooled['daily_demand'][1] == 0
+
+
+def test_sales_before_the_stock_date_extend_the_history():
+    # Inventory loaded today with sales going back the whole window
+    result = fit({0: {day: 3 for day in range(DAYS)}}, [DAYS - 1], [10.0])
+    assert result['model'].tolist() != [POOLED]
+
+
+def test_holdout_fit_is_pooled_on_the_days_before_the_holdout():
+    result = fit({0: {day: 4 for day in range(76, 90)}}, [76], [2.0], holdout_days=7)
+    # Seven observed days before the holdout: a quarter own rate, three quarters prior
+    assert result['bias'][0] == pytest.approx(4 - (7 / 28 * 4 + 21 / 28 * 2))
+
+
+def test_run_pools_a_newly_stocked_pair(db):
+    # Three pairs stocked long ago sell 2 a day; a fourth stocked 4 days ago sells 6
+    db.execute(text("""
+        INSERT INTO products (sku, name, category) SELECT 'SKU-' || i, 'Product ' || i, 'Tools' FROM generate_series(1, 4) i;
+        INSERT INTO stores (name, location) VALUES ('Main', 'Downtown');
+        INSERT INTO inventory (product_id, store_id, quantity, created_at)
+            SELECT i, 1, 50, CASE WHEN i = 4 THEN now() - interval '4 days' ELSE now() - interval '1 year' END
+            FROM generate_series(1, 4) i;
+        INSERT INTO sales_history (product_id, store_id, quantity_sold, sale_date, transaction_id, line_number)
+            SELECT i, 1, CASE WHEN i = 4 THEN 6 ELSE 2 END, now() - d * interval '1 day', i || '-' || d, 1
+            FROM generate_series(1, 4) i, generate_series(0, 89) d
+            WHERE i < 4 OR d < 5;
+    """))
+    db.commit()
+
+    run_forecasts(db, workers=1, incremental=False)
+
+    forecasts = {row.product_id: row for row in db.query(DemandForecast)}
+    assert [forecasts[product_id].model for product_id in (1, 2, 3)] == ['ewma'] * 3
+    category_rate = (3 * 2 * 90 + 6 * 5) / (4 * 90)
+    assert forecasts[4].model == POOLED
+    assert forecasts[4].daily_demand == pytest.approx(5 / 28 * 6 + 23 / 28 * category_rate)
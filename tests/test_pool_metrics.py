@@ -0,0 +1,44 @@
+from sqlalchemy import create_engine
+
+from iaps.db import pool as pool_module
+from iaps.db.pool import InstrumentedQueuePool, render_pool_metrics
+
+
+def engines(monkeypatch, *names):
+    registered = {name: create_engine("sqlite://", poolclass=InstrumentedQueuePool) for name in names}
+    monkeypatch.setattr(pool_module, "_engines", registered)
+    for engine in registered.values():
+        engine.connect().close()
+    return registered
+
+
+def family(sample: str) -> str:
+    name = sample.split("{")[0]
+    for suffix in ("_bucket", "_sum", "_count"):
+        if name.endswith(suffix) and name.startswith("iaps_db_pool_checkout_wait_seconds"):
+            return name[:-len(suffix)]
+    return name
+
+
+def test_samples_follow_their_own_help_and_type(monkeypatch):
+    engines(monkeypatch, "primary", "replica0")
+    current = None
+    seen = set()
+    for line in render_pool_metrics().splitlines():
+        if line.startswith("# HELP "):
+            current = line.split()[2]
+            assert current not in seen, f"{current} declared twice"
+            seen.add(current)
+        elif line.startswith("# TYPE "):
+            assert line.split()[2] == current
+        else:
+            assert family(line) == current, line
+
+
+def test_every_pool_reports_every_family(monkeypatch):
+    engines(monkeypatch, "primary", "replica0")
+    text = render_pool_metrics()
+    for name in ("primary", "replica0"):
+        assert f'iaps_db_pool_size{{pool="{name}"}} 5' in text
+        assert f'iaps_db_pool_checkout_wait_seconds_count{{pool="{name}"}} 1' in text
+        assert f'iaps_db_pool_checkout_wait_seconds_bucket{{pool="{name}",le="+Inf"}} 1' in text
@@ -0,0 +1,67 @@
+from sqlalchemy import text
+
+
+def seed_orders(db, orders: int, items: int) -> None:
+    db.execute(text("""
+        INSERT INTO products (sku, name) SELECT 'SKU-' || i, 'Product ' || i FROM generate_series(1, 50) i;
+        INSERT INTO stores (name, location) VALUES ('Main', 'Downtown');
+        INSERT INTO purchase_orders (store_id, status) SELECT 1, 'DRAFT' FROM generate_series(1, :orders);
+        INSERT INTO purchase_order_items (purchase_order_id, product_id, quantity)
+            SELECT o, n, o + n FROM generate_series(1, :orders) o, generate_series(1, :items) n;
+    """), {'orders': orders, 'items': items})
+    db.commit()
+
+
+def request_queries(count_queries, call):
+    with count_queries() as queries:
+        response = call()
+    assert response.status_code < 300, response.text
+    return response.json(), len(queries)
+
+
+def test_listing_cost_does_not_grow_with_orders_or_items(api, db, count_queries):
+    seed_orders(db, 2, 1)
+    api.get("/purchase-orders/")
+    orders, few = request_queries(count_queries, lambda: api.get("/purchase-orders/"))
+    assert [len(order['items']) for order in orders] == [1, 1]
+
+    db.execute(text("TRUNCATE purchase_orders, purchase_order_items, products, stores RESTART IDENTITY CASCADE"))
+    db.commit()
+    seed_orders(db, 100, 10)
+    orders, many = request_queries(count_queries, lambda: api.get("/purchase-orders/", params={'limit': 100}))
+
+    assert len(orders) == 100
+    assert all(len(order['items']) == 10 for order in orders)
+    assert orders[5]['total_items'] == sum(6 + n for n in range(1, 11))
+    assert orders[5]['items'][0]['product_sku'] == 'SKU-1'
+    assert many == few == 2
+
+
+def test_get_order_is_two_queries(api, db, count_queries):
+    seed_orders(db, 3, 20)
+    api.get("/purchase-orders/1")
+
+    order, queries = request_queries(count_queries, lambda: api.get("/purchase-orders/2"))
+
+    assert queries == 2
+    assert order['id'] == 2
+    assert [item['product_id'] for item in order['items']] == list(range(1, 21))
+
+
+def test_create_cost_does_not_grow_with_items(api, db, count_queries):
+    seed_orders(db, 0, 0)
+
+    def create(items):
+        return api.post("/purchase-orders/", json={
+            'store_id': 1,
+            'items': [{'product_id': product_id, 'quantity': 2} for product_id in range(1, items + 1)]
+        })
+
+    create(1)
+    small, few = request_queries(count_queries, lambda: create(1))
+    large, many = request_queries(count_queries, lambda: create(40))
+
+    assert len(small['items']) == 1
+    assert len(large['items']) == 40
+    assert large['total_items'] == 80
+    assert many == few
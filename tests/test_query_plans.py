@@ -0,0 +1,135 @@
+"""EXPLAIN checks for the hot read paths.
+
+Each test runs a real code path against a few hundred thousand rows, then
+plans every statement it sent with ``EXPLAIN (FORMAT JSON)`` and the same
+parameters. The index the path was built for has to show up, and neither
+``inventory`` nor ``sales_history`` may be read by a sequential scan.
+"""
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import text
+
+from iaps.data.reorder import load_reorder_frame
+from iaps.ml.demand import daily_sales_query
+
+LARGE_TABLES = {'inventory', 'sales_history'}
+
+SEED = """
+INSERT INTO products (sku, name, category)
+    SELECT 'SKU-' || i, 'Product ' || i, 'Category ' || i % 10 FROM generate_series(1, 200) i;
+INSERT INTO stores (name, location, region)
+    SELECT 'Store ' || i, 'Location ' || i, 'Region ' || i % 5 FROM generate_series(1, 50) i;
+INSERT INTO inventory (product_id, store_id, quantity, reorder_point)
+    SELECT p, s, CASE WHEN (p + s) % 50 = 0 THEN 1 ELSE 100 END, 10
+    FROM generate_series(1, 200) p, generate_series(1, 50) s;
+INSERT INTO sales_history (product_id, store_id, quantity_sold, sale_date, transaction_id, line_number)
+    SELECT 1 + i % 200, 1 + i / 200 % 50, 1 + i % 3, now() - i * interval '5 minutes', 'T' || i, 1
+    FROM generate_series(100000, 1, -1) i;
+INSERT INTO purchase_orders (store_id, status)
+    SELECT 1 + i % 50, 'DRAFT' FROM generate_series(1, 2000) i;
+INSERT INTO purchase_order_items (purchase_order_id, product_id, quantity)
+    SELECT o, 1 + (o * 7 + n) % 200, 5 FROM generate_series(1, 2000) o, generate_series(1, 5) n;
+ANALYZE;
+"""
+
+
+@pytest.fixture
+def volume(db):
+    db.execute(text(SEED))
+    db.commit()
+    return db
+
+
+def plan_nodes(plan):
+    yield plan
+    for child in plan.get('Plans', []):
+        yield from plan_nodes(child)
+
+
+def explain(db, queries):
+    """Plan nodes of every statement collected by ``count_queries``"""
+    cursor = db.connection().connection.cursor()
+    try:
+        nodes = []
+        for statement, parameters in zip(queries.statements, queries.parameters):
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {statement}", parameters)
+            plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            nodes.extend(plan_nodes(plan[0]['Plan']))
+        return nodes
+    finally:
+        cursor.close()
+
+
+def assert_indexed(nodes, *indexes):
+    used = {node['Index Name'] for node in nodes if 'Index Name' in node}
+    assert set(indexes) <= used, f"{sorted(set(indexes) - used)} unused, plans used {sorted(used)}"
+    scanned = {node.get('Relation Name') for node in nodes if node['Node Type'] == 'Seq Scan'}
+    assert not scanned & LARGE_TABLES, f"sequential scan on {sorted(scanned & LARGE_TABLES)}"
+
+
+def test_pair_reorder_reads_sales_index_only(volume, count_queries):
+    with count_queries() as queries:
+        load_reorder_frame(volume, 30, store_id=3, product_id=7)
+
+    nodes = explain(volume, queries)
+    assert_indexed(nodes, 'ix_sales_history_product_store_date', 'uix_product_store')
+    assert any(
+        node['Node Type'] == 'Index Only Scan' and node['Index Name'] == 'ix_sales_history_product_store_date'
+        for node in nodes if 'Index Name' in node
+    )
+
+
+def test_product_reorder_uses_sales_composite_index(volume, count_queries):
+    with count_queries() as queries:
+        load_reorder_frame(volume, 30, product_id=7)
+
+    assert_indexed(explain(volume, queries), 'ix_sales_history_product_store_date', 'uix_product_store')
+
+
+def test_store_reorder_uses_store_index(volume, count_queries):
+    with count_queries() as queries:
+        load_reorder_frame(volume, 30, store_id=3)
+
+    assert_indexed(explain(volume, queries), 'ix_inventory_store_id')
+
+
+def test_short_window_reorder_uses_sale_date_brin(volume, count_queries):
+    with count_queries() as queries:
+        load_reorder_frame(volume, 1)
+
+    assert_indexed(explain(volume, queries), 'ix_sales_history_sale_date')
+
+
+def test_product_demand_series_uses_sales_composite_index(volume, count_queries):
+    end = datetime.utcnow()
+    with count_queries() as queries:
+        daily_sales_query(volume, end - timedelta(days=90), end, product_id=7).all()
+
+    assert_indexed(explain(volume, queries), 'ix_sales_history_product_store_date')
+
+
+def test_low_stock_summary_uses_partial_index(api, volume, count_queries):
+    with count_queries() as queries:
+        assert api.get("/inventory/low-stock/summary").status_code == 200
+
+    assert_indexed(explain(volume, queries), 'ix_inventory_low_stock')
+
+
+def test_store_inventory_listing_uses_store_index(api, volume, count_queries):
+    with count_queries() as queries:
+        assert api.get("/inventory/", params={'store_id': 3}).status_code == 200
+
+    assert_indexed(explain(volume, queries), 'ix_inventory_store_id')
+
+
+def test_purchase_order_listing_uses_store_and_item_indexes(api, volume, count_queries):
+    with count_queries() as queries:
+        assert api.get("/purchase-orders/", params={'store_id': 3, 'status': 'draft'}).status_code == 200
+
+    assert_indexed(
+        explain(volume, queries), 'ix_purchase_orders_store_status', 'ix_purchase_order_items_purchase_order_id'
+    )
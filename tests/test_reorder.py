@@ -0,0 +1,48 @@
+import pytest
+from sqlalchemy import text
+
+
+def seed(db, products: int, stores: int) -> None:
+    """Every pair holds 5 units and sold 2 a day over the last 10 days"""
+    db.execute(text("""
+        INSERT INTO products (sku, name) SELECT 'SKU-' || i, 'Product ' || i FROM generate_series(1, :products) i;
+        INSERT INTO stores (name, location) SELECT 'Store ' || i, 'Location ' || i FROM generate_series(1, :stores) i;
+        INSERT INTO inventory (product_id, store_id, quantity, reorder_point)
+            SELECT p, s, 5, 1 FROM generate_series(1, :products) p, generate_series(1, :stores) s;
+        INSERT INTO sales_history (product_id, store_id, quantity_sold, sale_date, transaction_id, line_number)
+            SELECT p, s, 2, now() - d * interval '1 day', p || '-' || d, 1
+            FROM generate_series(1, :products) p, generate_series(1, :stores) s, generate_series(1, 10) d;
+    """), {'products': products, 'stores': stores})
+    db.commit()
+
+
+def calculate(api, count_queries, **scope):
+    with count_queries() as queries:
+        response = api.post("/purchase-orders/calculate-reorder", json=dict(days_of_sales=30, **scope))
+    assert response.status_code == 200, response.text
+    return response.json(), len(queries)
+
+
+@pytest.mark.parametrize('products, stores', [(2, 2), (200, 25)])
+def test_calculate_reorder_is_one_query_at_any_size(api, db, count_queries, products, stores):
+    seed(db, products, stores)
+    calculate(api, count_queries)
+
+    suggestions, queries = calculate(api, count_queries)
+
+    assert queries == 1
+    assert len(suggestions) == products * stores
+    assert {suggestion['suggested_order'] for suggestion in suggestions} == {15}
+
+
+def test_scoped_reorder_is_one_query(api, db, count_queries):
+    seed(db, 20, 5)
+    calculate(api, count_queries)
+
+    by_store, store_queries = calculate(api, count_queries, store_id=3)
+    by_pair, pair_queries = calculate(api, count_queries, store_id=3, product_id=7)
+
+    assert store_queries == pair_queries == 1
+    assert {suggestion['store_id'] for suggestion in by_store} == {3}
+    assert len(by_store) == 20
+    assert [(row['product_id'], row['store_id']) for row in by_pair] == [(7, 3)]
@@ -0,0 +1,131 @@
+"""Read routing against two Postgres instances.
+
+The instance behind ``TEST_REPLICA_URL`` is not fed by replication, so the
+real lag probe rightly finds it unhealthy; the routing tests stub the probe
+with the lag to report. Giving each instance different rows shows which
+one answered a request.
+"""
+import os
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from iaps.api.cache import response_cache
+from iaps.db.database import READ_YOUR_WRITES_COOKIE, replicas
+from iaps.db import replicas as replicas_module
+from iaps.db.models import Product
+
+pytestmark = pytest.mark.skipif(not os.getenv("TEST_REPLICA_URL"), reason="TEST_REPLICA_URL is not set")
+
+CONFIGURED_REPLICAS = list(replicas.replicas)
+MEASURED_LAG_SQL = replicas_module.REPLICATION_LAG_SQL
+
+
+@pytest.fixture
+def instances(api, db, monkeypatch):
+    """Primary holds SKU-PRIMARY, the replica SKU-REPLICA-1 and SKU-REPLICA-2"""
+    report_lag(monkeypatch, "0")
+    monkeypatch.setattr(replicas, "replicas", CONFIGURED_REPLICAS)
+    replica, = CONFIGURED_REPLICAS
+    replica.record(None)
+    replica.checked_at = 0.0
+    monkeypatch.setattr(replicas, "check_interval", 0.0)
+
+    db.add(Product(sku="SKU-PRIMARY", name="On the primary"))
+    db.commit()
+    session = replica.session_factory()
+    try:
+        session.add_all([Product(sku=f"SKU-REPLICA-{index}", name="On the replica") for index in (1, 2)])
+        session.commit()
+    finally:
+        session.close()
+    return replica
+
+
+def report_lag(monkeypatch, lag: str) -> None:
+    monkeypatch.setattr(replicas_module, "REPLICATION_LAG_SQL", text(f"SELECT {lag}"))
+
+
+def listed_skus(api):
+    response = api.get("/products/")
+    assert response.status_code == 200
+    return {product['sku'] for product in response.json()}
+
+
+def summary_products(api):
+    response_cache.backend.entries.clear()
+    response = api.get("/analytics/summary")
+    assert response.status_code == 200
+    return response.json()['total_products']
+
+
+def test_reads_are_served_by_the_replica(api, instances):
+    assert listed_skus(api) == {"SKU-REPLICA-1", "SKU-REPLICA-2"}
+    assert summary_products(api) == 2
+    assert instances.lag == 0
+
+
+def test_reads_follow_a_write_to_the_primary(api, db, instances):
+    response = api.post("/products/", json={"sku": "SKU-NEW", "name": "Written"})
+    assert response.status_code == 201
+    assert READ_YOUR_WRITES_COOKIE in response.cookies
+
+    assert db.query(Product.sku).filter(Product.sku == "SKU-NEW").scalar() == "SKU-NEW"
+    assert listed_skus(api) == {"SKU-PRIMARY", "SKU-NEW"}
+    assert summary_products(api) == 2
+
+    api.cookies.clear()
+    assert listed_skus(api) == {"SKU-REPLICA-1", "SKU-REPLICA-2"}
+
+
+def test_lagging_replica_falls_back_to_the_primary(api, instances, monkeypatch):
+    report_lag(monkeypatch, "60")
+
+    assert listed_skus(api) == {"SKU-PRIMARY"}
+    assert summary_products(api) == 1
+    assert instances.lag == 60
+
+    report_lag(monkeypatch, "0")
+    assert listed_skus(api) == {"SKU-REPLICA-1", "SKU-REPLICA-2"}
+
+
+def test_replica_cut_off_from_the_primary_falls_back(api, instances, monkeypatch):
+    report_lag(monkeypatch, "NULL")
+
+    assert listed_skus(api) == {"SKU-PRIMARY"}
+    assert summary_products(api) == 1
+    assert instances.lag is None
+
+
+def test_server_that_is_not_a_standby_is_never_used(api, instances, monkeypatch):
+    monkeypatch.setattr(replicas_module, "REPLICATION_LAG_SQL", MEASURED_LAG_SQL)
+
+    assert listed_skus(api) == {"SKU-PRIMARY"}
+    assert summary_products(api) == 1
+    assert instances.lag is None
+
+
+def test_unreachable_replica_falls_back_to_the_primary(api, instances, monkeypatch):
+    # Nothing listens on port 1
+    monkeypatch.setattr(instances, "engine", create_engine("postgresql://postgres@localhost:1/iaps"))
+    monkeypatch.setattr(
+        instances, "async_engine", create_async_engine("postgresql+asyncpg://postgres@localhost:1/iaps")
+    )
+
+    assert listed_skus(api) == {"SKU-PRIMARY"}
+    assert summary_products(api) == 1
+    assert instances.lag is None
+
+
+def test_pinned_writer_is_not_served_a_replica_filled_summary(api, instances):
+    for sku in ("SKU-NEW-1", "SKU-NEW-2"):
+        written = api.post("/products/", json={"sku": sku, "name": "Written"})
+    pinned_until = written.cookies[READ_YOUR_WRITES_COOKIE]
+
+    # Another client fills the entry for the new versions from the replica
+    api.cookies.clear()
+    assert api.get("/analytics/summary").json()['total_products'] == 2
+
+    api.cookies.set(READ_YOUR_WRITES_COOKIE, pinned_until)
+    assert api.get("/analytics/summary").json()['total_products'] == 3
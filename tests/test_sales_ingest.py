@@ -0,0 +1,55 @@
+import csv
+import io
+
+from iaps.data.sales_ingest import ingest_sales, open_sales_stream, read_sales_rows, _parse_line
+
+GOOD_JSON = b'{"sku": "SKU-1", "store": "Main", "quantity_sold": 2, "sale_date": "2024-01-05T10:00:00Z", "transaction_id": "T1", "line_number": 1}\n'
+GOOD_CSV = b"SKU-1,Main,2,2024-01-05T10:00:00Z,T1,1\n"
+CSV_HEADER = b"sku,store,quantity_sold,sale_date,transaction_id,line_number\n"
+
+
+def rows(payload: bytes, format: str):
+    return list(read_sales_rows(open_sales_stream(io.BytesIO(payload)), format))
+
+
+def test_malformed_json_line_does_not_stop_the_read():
+    parsed = rows(GOOD_JSON + b'{"sku": "SKU-1", \n' + GOOD_JSON, 'ndjson')
+    assert len(parsed) == 3
+    assert parsed[1] is None
+    assert [_parse_line(row) is not None for row in parsed] == [True, False, True]
+
+
+def test_invalid_utf8_line_is_rejected_alone():
+    bad = GOOD_JSON.replace(b'"T1"', b'"T\xff\xfe"')
+    parsed = rows(GOOD_JSON + bad + GOOD_JSON, 'ndjson')
+    assert [_parse_line(row) is not None for row in parsed] == [True, False, True]
+
+
+def test_invalid_utf8_csv_row_is_rejected_alone():
+    bad = GOOD_CSV.replace(b"Main", b"Ma\xe9n")
+    parsed = rows(CSV_HEADER + GOOD_CSV + bad + GOOD_CSV, 'csv')
+    assert [_parse_line(row) is not None for row in parsed] == [True, False, True]
+
+
+def test_csv_error_rejects_the_row():
+    long_row = b"SKU-1,Main,2,2024-01-05T10:00:00Z," + b"T" * 100 + b",1\n"
+    limit = csv.field_size_limit(64)
+    try:
+        parsed = rows(CSV_HEADER + GOOD_CSV + long_row + GOOD_CSV, 'csv')
+    finally:
+        csv.field_size_limit(limit)
+    assert [_parse_line(row) is not None for row in parsed] == [True, False, True]
+
+
+def test_non_object_json_lines_are_rejected():
+    assert _parse_line([1, 2]) is None
+    assert _parse_line("sale") is None
+    assert _parse_line(None) is None
+
+
+def test_unparseable_lines_are_counted_as_rejected():
+    payload = b'not json\n' + GOOD_JSON.replace(b'"T1"', b'"\xc3\x28"') + b'[]\n'
+    stats = ingest_sales(None, read_sales_rows(open_sales_stream(io.BytesIO(payload)), 'ndjson'))
+    assert stats['read'] == 3
+    assert stats['rejected'] == 3
+    assert stats['inserted'] == 0
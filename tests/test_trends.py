@@ -0,0 +1,36 @@
+import threading
+import time
+
+import pytest
+from sqlalchemy.orm import Session
+
+from iaps.api.routers import analytics
+
+# Stands in for the CPU-bound fold and model building of a large catalog
+WORK_SECONDS = 1.0
+
+
+def slowly(function):
+    def slow(*args, **kwargs):
+        time.sleep(WORK_SECONDS)
+        return function(*args, **kwargs)
+    return slow
+
+
+@pytest.mark.parametrize('path', ["/analytics/trends?time_range=day", "/analytics/trends/daily-summary"])
+def test_trend_routes_leave_the_event_loop_free(api, monkeypatch, path):
+    monkeypatch.setattr(analytics, "load_trend_aggregates", slowly(analytics.load_trend_aggregates))
+    monkeypatch.setattr(Session, "query", slowly(Session.query))
+
+    responses = []
+    trends = threading.Thread(target=lambda: responses.append(api.get(path)))
+    trends.start()
+    time.sleep(WORK_SECONDS / 4)
+    started = time.perf_counter()
+    health = api.get("/health")
+    waited = time.perf_counter() - started
+    trends.join()
+
+    assert health.status_code == 200
+    assert responses[0].status_code == 200
+    assert waited < WORK_SECONDS / 2